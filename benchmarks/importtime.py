@@ -0,0 +1,80 @@
+"""
+Benchmark del tiempo de importación al arrancar
+
+Ejecuta python -X importtime en un proceso nuevo por cada repetición y reporta la mediana del total,
+los paquetes con más tiempo propio y si se importaron los paquetes pesados que deben cargarse al usarse.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --modulo portal_notarias.blueprints.edictos.tasks --repeticiones 7
+
+Las variables de entorno de desarrollo (.env) deben estar definidas, como para ejecutar la aplicación.
+"""
+
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+import click
+
+# Paquetes que solo deben importarse en el primer uso
+PAQUETES_DIFERIDOS = [
+    "google.auth.transport.requests",
+    "google.cloud.secretmanager",
+    "google.cloud.storage",
+    "google.oauth2.id_token",
+    "google_crc32c",
+    "grpc",
+    "sendgrid",
+]
+
+RENGLON = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def medir(modulo: str) -> dict:
+    """Importar el módulo en un proceso nuevo, entrega el total, el tiempo propio por paquete y los importados"""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True,
+        text=True,
+        check=False,
+        env=os.environ,
+    )
+    if resultado.returncode != 0:
+        raise click.ClickException(resultado.stderr.strip().splitlines()[-1])
+    total = 0
+    propios = defaultdict(int)
+    importados = set()
+    for renglon in resultado.stderr.splitlines():
+        coincidencia = RENGLON.match(renglon)
+        if coincidencia is None:
+            continue
+        propio, acumulado, sangria, nombre = coincidencia.groups()
+        if len(sangria) == 1:  # Solo los de primer nivel para no sumar dos veces
+            total += int(acumulado)
+        propios[nombre.split(".")[0]] += int(propio)
+        importados.add(nombre)
+    return {"total": total / 1000, "propios": propios, "importados": importados}
+
+
+@click.command()
+@click.option("--modulo", default="portal_notarias.app", help="Módulo a importar")
+@click.option("--repeticiones", default=5, help="Procesos a medir")
+@click.option("--top", default=12, help="Paquetes a mostrar")
+def main(modulo, repeticiones, top):
+    """Reportar el tiempo de importación de un módulo"""
+    mediciones = sorted((medir(modulo) for _ in range(repeticiones)), key=lambda medicion: medicion["total"])
+    mediana = mediciones[len(mediciones) // 2]
+    click.echo(f"Importar {modulo}: mediana {mediana['total']:.1f} ms de {repeticiones} procesos")
+    click.echo("Paquetes con más tiempo propio:")
+    for paquete, microsegundos in sorted(mediana["propios"].items(), key=lambda par: -par[1])[:top]:
+        click.echo(f"  {microsegundos / 1000:8.1f} ms  {paquete}")
+    click.echo("Paquetes que deben importarse al usarse:")
+    for paquete in PAQUETES_DIFERIDOS:
+        estado = "IMPORTADO" if paquete in mediana["importados"] else "diferido"
+        click.echo(f"  {estado:10s} {paquete}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark de la carga de secretos al arrancar
+
+Compara la forma anterior (un cliente nuevo y una llamada tras otra por cada secreto)
+con config/secret_manager.py (un solo cliente, todos a la vez y el cache local cifrado)
+para los 16 secretos de config.settings y config.firebase.
+
+Sin conexión simula la latencia de Secret Manager
+
+    python -m benchmarks.secret_manager --latencia-ms 60 --cliente-ms 40
+
+Con PROJECT_ID y credenciales de Google Cloud usa Secret Manager de verdad
+
+    PROJECT_ID=... python -m benchmarks.secret_manager --real
+"""
+
+import os
+import tempfile
+import time
+
+import click
+from cryptography.fernet import Fernet
+
+from config import secret_manager
+
+SETTINGS_SECRETOS = [
+    "cloud_storage_deposito",
+    "cloud_storage_deposito_edictos",
+    "host",
+    "redis_url",
+    "salt",
+    "secret_key",
+    "sqlalchemy_database_uri",
+    "task_queue",
+]
+FIREBASE_SECRETOS = [
+    "apikey",
+    "appid",
+    "authdomain",
+    "databaseurl",
+    "measurementid",
+    "messagingsenderid",
+    "projectid",
+    "storagebucket",
+]
+
+
+class ClienteSimulado:
+    """Cliente de Secret Manager con latencia simulada"""
+
+    def __init__(self, latencia: float, creacion: float):
+        time.sleep(creacion)  # Canal gRPC y credenciales
+        self.latencia = latencia
+
+    @staticmethod
+    def secret_version_path(project, secret, version):
+        return f"projects/{project}/secrets/{secret}/versions/{version}"
+
+    def access_secret_version(self, name):
+        time.sleep(self.latencia)
+        return type("Respuesta", (), {"payload": type("Payload", (), {"data": name.encode("UTF-8")})()})()
+
+
+def forma_anterior(nuevo_cliente) -> None:
+    """Un cliente nuevo y una llamada por cada secreto, uno tras otro"""
+    for prefijo, secretos in (("pjecz_portal_notarias", SETTINGS_SECRETOS), ("firebase", FIREBASE_SECRETOS)):
+        for secret_id in secretos:
+            cliente = nuevo_cliente()
+            nombre = cliente.secret_version_path(secret_manager.PROJECT_ID, f"{prefijo}_{secret_id}", "latest")
+            cliente.access_secret_version(name=nombre).payload.data.decode("UTF-8")
+
+
+def forma_nueva(nuevo_cliente) -> None:
+    """Un solo cliente y todos a la vez, como lo hacen config.settings y config.firebase en un proceso nuevo"""
+    clientes = []
+
+    def get_client():
+        if not clientes:
+            clientes.append(nuevo_cliente())
+        return clientes[0]
+
+    secret_manager.get_client = get_client
+    secret_manager.get_secrets(SETTINGS_SECRETOS, "pjecz_portal_notarias")
+    secret_manager.get_secrets(FIREBASE_SECRETOS, "firebase", ignore_errors=True)
+
+
+def medir(funcion, repeticiones: int) -> float:
+    """Entregar la mediana en milisegundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return sorted(tiempos)[len(tiempos) // 2]
+
+
+@click.command()
+@click.option("--latencia-ms", default=60, help="Latencia simulada de cada llamada")
+@click.option("--cliente-ms", default=40, help="Tiempo simulado para crear un cliente")
+@click.option("--repeticiones", default=5, help="Repeticiones de cada medición")
+@click.option("--real", is_flag=True, default=False, help="Usar Secret Manager de verdad")
+def main(latencia_ms, cliente_ms, repeticiones, real):
+    """Comparar los tiempos de carga de los secretos"""
+    if real:
+        if os.getenv("PROJECT_ID", "") == "":
+            raise click.ClickException("Para --real defina PROJECT_ID")
+        from google.cloud import secretmanager
+
+        nuevo_cliente = secretmanager.SecretManagerServiceClient
+    else:
+        secret_manager.PROJECT_ID = "benchmark"
+
+        def nuevo_cliente():
+            return ClienteSimulado(latencia_ms / 1000, cliente_ms / 1000)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        secret_manager.SECRETS_CACHE_DIRECTORIO = directorio
+        secret_manager.SECRETS_CACHE_KEY = ""
+        anterior = medir(lambda: forma_anterior(nuevo_cliente), repeticiones)
+        nueva = medir(lambda: forma_nueva(nuevo_cliente), repeticiones)
+        secret_manager.SECRETS_CACHE_KEY = Fernet.generate_key().decode()
+        forma_nueva(nuevo_cliente)  # Llenar el cache
+        con_cache = medir(lambda: forma_nueva(nuevo_cliente), repeticiones)
+
+    click.echo(f"Secretos: {len(SETTINGS_SECRETOS) + len(FIREBASE_SECRETOS)}, mediana de {repeticiones} repeticiones")
+    click.echo(f"  Anterior, un cliente por secreto en serie: {anterior:8.1f} ms")
+    click.echo(f"  Un solo cliente, en paralelo:              {nueva:8.1f} ms  ({anterior / nueva:.1f}x)")
+    click.echo(f"  Con el cache local cifrado:                {con_cache:8.1f} ms  ({anterior / con_cache:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+CLI Bitácoras
+"""
+
+import socket
+import time
+
+import click
+
+from portal_notarias.app import create_app
+from portal_notarias.blueprints.bitacoras.auditoria import consumir_auditoria, crear_grupo_auditoria, reprocesar_muertos
+from portal_notarias.extensions import database
+
+app = create_app()
+app.app_context().push()
+database.app = app
+
+
+@click.group()
+def cli():
+    """Bitácoras"""
+
+
+@click.command()
+@click.option("--consumidor", default=socket.gethostname(), type=str, help="Nombre de este consumidor en el grupo")
+@click.option("--lote", default=500, type=int, help="Cantidad máxima de eventos por INSERT")
+@click.option("--una-vez", is_flag=True, help="Procesar lo que haya y terminar")
+def consumir(consumidor, lote, una_vez):
+    """Consumir los eventos de auditoría del stream de Redis e insertarlos por lotes"""
+    click.echo(f"Consumiendo auditoría como {consumidor}")
+    crear_grupo_auditoria()
+    while True:
+        inicio = time.perf_counter()
+        cantidad = consumir_auditoria(consumidor, lote=lote, bloquear_ms=None if una_vez else 5000)
+        if cantidad > 0:
+            click.echo(f"{cantidad} eventos procesados en {time.perf_counter() - inicio:.3f} s")
+        elif una_vez:
+            break
+
+
+@click.command()
+def reprocesar():
+    """Regresar los eventos de auditoría que fallaron al stream para volver a insertarlos"""
+    cantidad = reprocesar_muertos()
+    click.echo(f"{cantidad} eventos regresados al stream")
+
+
+cli.add_command(consumir)
+cli.add_command(reprocesar)
@@ -2,18 +2,30 @@
 CLI Edictos
 """
 
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
 
 import click
-import sys
 
 from lib.exceptions import MyAnyError
-
+from lib.indexes import create_index
+from lib.unit_of_work import unit_of_work
 from portal_notarias.app import create_app
+from portal_notarias.blueprints.edictos.models import Edicto
+from portal_notarias.blueprints.edictos.republicacion import (
+    REPUBLICACIONES_INDICE,
+    autoridades_con_acuses,
+    depurar_republicaciones,
+    preparar_proceso,
+    republicar_edictos,
+    republicar_rango,
+)
 from portal_notarias.blueprints.edictos.tasks import enviar_email_acuse_recibido as enviar_email_acuse_recibido_task
 from portal_notarias.blueprints.edictos.tasks import enviar_email_republicacion as enviar_email_republicacion_task
-from portal_notarias.blueprints.edictos.models import Edicto
-from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
 from portal_notarias.extensions import database
 
 app = create_app()
@@ -28,11 +40,20 @@ def cli():
 
 @click.command()
 @click.option("--fecha", default="", type=str, help="Fecha para consultar en edictos_acuses")
+@click.option("--desde", default="", type=str, help="Fecha inicial de un rango a republicar")
+@click.option("--hasta", default="", type=str, help="Fecha final de un rango a republicar, por defecto hoy")
+@click.option("--procesos", default=1, type=int, help="Cantidad de procesos para repartir el rango")
+@click.option("--en-el-fondo", is_flag=True, help="Repartir el rango en tareas de RQ")
 @click.option("--probar", is_flag=True, help="Probar sin cambiar la BD")
-def republicar(fecha, probar):
+def republicar(fecha, desde, hasta, procesos, en_el_fondo, probar):
     """Republicar Edictos, toma los registros de edictos_acuses para insertar Edictos"""
     click.echo("Republicando Edictos: ", nl=False)
 
+    # Si viene desde, republicar el rango de fechas repartido por autoridad
+    if desde != "":
+        republicar_rango_fechas(desde, hasta, procesos, en_el_fondo, probar)
+        return
+
     # Si NO viene la fecha, por defecto se usa la fecha de hoy
     fecha_dt = datetime.now().date()
 
@@ -44,68 +65,87 @@ def republicar(fecha, probar):
             click.echo("Error: El formato de la fecha debe ser YYYY-MM-DD.")
             sys.exit(1)
 
-    # Consultar edictos_acuses, filtrados por la fecha
-    edictos_acuses = EdictoAcuse.query.filter(EdictoAcuse.fecha == fecha_dt).filter(EdictoAcuse.estatus == "A").all()
-
-    # Inicializar listado de mensajes
-    mensajes = []
-
-    # Bucle por edictos_acuses
-    for edicto_acuse in edictos_acuses:
-        click.echo(".", nl=False)
-
-        # El Edicto original es el que se subio
-        edicto_original = edicto_acuse.edicto
-
-        # Si en edicto_original, edicto_id_original es CERO, se va actualizar con su mismo id
-        if edicto_original.edicto_id_original == 0:
-            edicto_original.edicto_id_original = edicto_original.id
-            edicto_original.save()
-            click.echo("@", nl=False)
-
-        # Puede que ya este publicado, asi que consultamos
-        edicto_ya_republicado = (
-            Edicto.query.filter(Edicto.edicto_id_original == edicto_original.id)
-            .filter(Edicto.fecha == fecha_dt)
-            .filter(Edicto.estatus == "A")
-            .first()
-        )
-
-        # Si existe el Edicto, con ese id original y fecha, se omite
-        if edicto_ya_republicado:
-            continue
-
-        # Determinar la cantidad de Edictos que tienen edicto_id_original
-        edictos_ya_publicados_cantidad = (
-            Edicto.query.filter(Edicto.edicto_id_original == edicto_original.id).filter(Edicto.estatus == "A").count()
-        )
-
-        # Crear Edicto
-        edicto = Edicto(
-            autoridad=edicto_original.autoridad,
-            fecha=fecha_dt,  # Fecha de republicacion
-            descripcion=edicto_original.descripcion,
-            expediente=edicto_original.expediente,
-            numero_publicacion=int(edictos_ya_publicados_cantidad) + 1,
-            archivo=edicto_original.archivo,
-            url=edicto_original.url,
-            acuse_num=0,
-            edicto_id_original=edicto_original.id,
-        )
-
-        # Si probar es falso, insertar el edicto
-        if probar is False:
-            edicto.save()
-
-        # Poner un + en pantalla
-        click.echo("+", nl=False)
-
-        # Agregar el mensaje
-        mensajes.append(f"{edicto.autoridad.clave} {edicto.fecha} {edicto.descripcion}")
-
-    # Mostrar mensaje final
+    # Republicar en una sola transacción, si probar es verdadero se revierte al final
+    inicio = time.perf_counter()
+    with unit_of_work(commit=not probar):
+        resultado = republicar_edictos(fecha_dt)
+    segundos = time.perf_counter() - inicio
+
+    # Mostrar los edictos insertados
     click.echo()
-    click.echo("\n".join(mensajes))
+    for insertado in resultado["insertados"]:
+        click.echo(f"{insertado['autoridad_clave']} {insertado['fecha']} {insertado['descripcion']}")
+
+    # Mostrar el rendimiento
+    cantidad = len(resultado["insertados"])
+    click.echo(
+        f"{cantidad} insertados, {resultado['omitidos']} ya republicados, "
+        f"{resultado['actualizados']} originales actualizados en {segundos:.3f} s "
+        f"({cantidad / segundos if segundos > 0 else 0:.1f} edictos/s)"
+    )
+    if probar:
+        click.echo("Prueba: no se cambió la BD.")
+
+
+def republicar_rango_fechas(desde: str, hasta: str, procesos: int, en_el_fondo: bool, probar: bool):
+    """Republicar un rango de fechas, cada autoridad es un trozo que va a un proceso o a una tarea de RQ"""
+
+    # Validar las fechas
+    try:
+        desde_dt = datetime.strptime(desde, "%Y-%m-%d").date()
+        hasta_dt = datetime.strptime(hasta, "%Y-%m-%d").date() if hasta != "" else datetime.now().date()
+    except ValueError:
+        click.echo("Error: El formato de las fechas debe ser YYYY-MM-DD.")
+        sys.exit(1)
+    if hasta_dt < desde_dt:
+        click.echo("Error: La fecha hasta debe ser igual o posterior a desde.")
+        sys.exit(1)
+
+    # Consultar las autoridades con acuses en el rango y soltar la conexión antes de repartir
+    autoridades_ids = autoridades_con_acuses(desde_dt, hasta_dt)
+    database.session.remove()
+    click.echo(f"{len(autoridades_ids)} autoridades de {desde_dt} a {hasta_dt}")
+
+    # En el fondo, encolar una tarea de RQ por autoridad
+    if en_el_fondo:
+        if probar:
+            click.echo("Error: No se puede probar en el fondo.")
+            sys.exit(1)
+        for autoridad_id in autoridades_ids:
+            app.task_queue.enqueue(
+                "portal_notarias.blueprints.edictos.tasks.republicar_rango_edictos",
+                desde_dt,
+                hasta_dt,
+                autoridad_id,
+            )
+        click.echo(f"Se encolaron {len(autoridades_ids)} tareas en {app.config['TASK_QUEUE']}.")
+        return
+
+    # Republicar por autoridad, en varios procesos si se piden
+    inicio = time.perf_counter()
+    cantidad = len(autoridades_ids)
+    if procesos > 1 and cantidad > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(procesos, cantidad),
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=preparar_proceso,
+        ) as ejecutor:
+            resultados = list(
+                ejecutor.map(republicar_rango, repeat(desde_dt), repeat(hasta_dt), autoridades_ids, repeat(probar))
+            )
+    else:
+        resultados = [republicar_rango(desde_dt, hasta_dt, autoridad_id, probar) for autoridad_id in autoridades_ids]
+    segundos = time.perf_counter() - inicio
+
+    # Mostrar el rendimiento
+    insertados = sum(resultado["insertados"] for resultado in resultados)
+    omitidos = sum(resultado["omitidos"] for resultado in resultados)
+    click.echo(
+        f"{insertados} insertados, {omitidos} ya republicados en {segundos:.3f} s "
+        f"({insertados / segundos if segundos > 0 else 0:.1f} edictos/s)"
+    )
+    if probar:
+        click.echo("Prueba: no se cambió la BD.")
 
 
 @click.command()
@@ -140,6 +180,28 @@ def enviar_email_republicacion(edicto_id: int):
     click.echo(mensaje)
 
 
+@click.command()
+@click.option("--probar", is_flag=True, help="Probar sin cambiar la BD")
+def crear_indice_republicaciones(probar):
+    """Dar de baja las republicaciones duplicadas y crear el índice único que las evita"""
+
+    # Primero depurar, con duplicados el índice único no se puede crear
+    with unit_of_work(commit=not probar):
+        depurados = depurar_republicaciones()
+    click.echo(f"-- Republicaciones duplicadas dadas de baja: {depurados}")
+
+    # Crear el índice sin bloquear las escrituras, si ya existe no hace nada
+    indice = next(indice for indice in Edicto.__table__.indexes if indice.name == REPUBLICACIONES_INDICE)
+    sentencias = create_index(database.engine, indice, probar)
+    if len(sentencias) == 0:
+        click.echo(f"-- Ya existe {REPUBLICACIONES_INDICE}")
+    for sentencia in sentencias:
+        click.echo(f"{sentencia};")
+    if probar:
+        click.echo("-- Prueba: no se cambió la BD.")
+
+
+cli.add_command(crear_indice_republicaciones)
 cli.add_command(enviar_email_acuse_recibido)
 cli.add_command(enviar_email_republicacion)
 cli.add_command(republicar)
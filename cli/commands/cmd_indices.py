@@ -0,0 +1,38 @@
+"""
+CLI Índices
+"""
+
+import click
+
+from lib.indexes import create_index
+from portal_notarias.app import create_app
+from portal_notarias.extensions import database
+
+app = create_app()
+app.app_context().push()
+database.app = app
+
+
+@click.group()
+def cli():
+    """Índices"""
+
+
+@click.command()
+@click.option("--probar", is_flag=True, help="Solo mostrar las sentencias SQL, sin ejecutarlas")
+def crear(probar):
+    """Crear los índices de los modelos que falten, sin bloquear las escrituras"""
+    for tabla in database.metadata.sorted_tables:
+        for indice in sorted(tabla.indexes, key=lambda indice: indice.name):
+            if indice.unique:
+                # Con datos duplicados fallaría, por ejemplo cli edictos crear-indice-republicaciones primero depura
+                click.echo(f"-- Se omite el índice único {indice.name}")
+                continue
+            sentencias = create_index(database.engine, indice, probar)
+            if len(sentencias) == 0:
+                click.echo(f"-- Ya existe {indice.name}")
+            for sentencia in sentencias:
+                click.echo(f"{sentencia};")
+
+
+cli.add_command(crear)
@@ -16,49 +16,38 @@ Configure los siguientes secretos en google cloud secret manager:
 import os
 from functools import lru_cache
 
-from google.cloud import secretmanager
 from pydantic_settings import BaseSettings
 
-PROJECT_ID = os.getenv("PROJECT_ID", "")  # Por defecto esta vacio, esto significa estamos en modo local
+from config.secret_manager import get_secrets
+
 PREFIX = os.getenv("PREFIX", "firebase")  # Es comun a todos los sistemas web
 
+# All the secrets are fetched at once with the same client, if one fails it is an empty string
+SECRETS = get_secrets(
+    ["apikey", "appid", "authdomain", "databaseurl", "measurementid", "messagingsenderid", "projectid", "storagebucket"],
+    PREFIX,
+    ignore_errors=True,
+)
+
 
 def get_secret(secret_id: str) -> str:
     """Get secret from google cloud secret manager"""
-
-    # If not in google cloud, return environment variable
-    if PROJECT_ID == "":
-        return os.getenv(secret_id.upper(), "")
-
-    # Create the secret manager client
-    client = secretmanager.SecretManagerServiceClient()
-
-    # Build the resource name of the secret version
-    if PREFIX != "":
-        secret = f"{PREFIX}_{secret_id}"
-    else:
-        secret = secret_id
-    name = client.secret_version_path(PROJECT_ID, secret, "latest")
-
-    # Access the secret version and return the decoded payload
-    try:
-        response = client.access_secret_version(name=name)
-        return response.payload.data.decode("UTF-8")
-    except Exception as error:
-        return ""  # If fail return empty string
+    if secret_id in SECRETS:
+        return SECRETS[secret_id]
+    return get_secrets([secret_id], PREFIX, ignore_errors=True)[secret_id]
 
 
 class FirebaseSettings(BaseSettings):
     """Settings"""
 
-    APIKEY: str = get_secret("apikey")
-    APPID: str = get_secret("appid")
-    AUTHDOMAIN: str = get_secret("authdomain")
-    DATABASEURL: str = get_secret("databaseurl")
-    MEASUREMENTID: str = get_secret("measurementid")
-    MESSAGINGSENDERID: str = get_secret("messagingsenderid")
-    PROJECTID: str = get_secret("projectid")
-    STORAGEBUCKET: str = get_secret("storagebucket")
+    APIKEY: str = SECRETS["apikey"]
+    APPID: str = SECRETS["appid"]
+    AUTHDOMAIN: str = SECRETS["authdomain"]
+    DATABASEURL: str = SECRETS["databaseurl"]
+    MEASUREMENTID: str = SECRETS["measurementid"]
+    MESSAGINGSENDERID: str = SECRETS["messagingsenderid"]
+    PROJECTID: str = SECRETS["projectid"]
+    STORAGEBUCKET: str = SECRETS["storagebucket"]
 
     class Config:
         """Load configuration"""
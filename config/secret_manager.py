@@ -0,0 +1,114 @@
+"""
+Secret Manager
+
+Carga los secretos de Google Cloud Secret Manager con un solo cliente y todos a la vez en hilos,
+en lugar de crear un cliente y hacer una llamada tras otra por cada secreto.
+
+Opcional, un cache local cifrado y de vida corta para que los arranques seguidos
+(instancias nuevas, tareas de RQ, comandos del CLI) no los vuelvan a pedir:
+
+- SECRETS_CACHE_KEY: llave Fernet, sin ella no hay cache, genérela con
+  python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+- SECRETS_CACHE_DIRECTORIO: directorio del cache, por defecto /tmp
+- SECRETS_CACHE_SEGUNDOS: vigencia del cache, por defecto 300
+
+El archivo se escribe con permisos 0600 y Fernet rechaza el token cuando ya venció.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+PROJECT_ID = os.getenv("PROJECT_ID", "")  # Por defecto esta vacio, esto significa estamos en modo local
+SECRETS_CACHE_KEY = os.getenv("SECRETS_CACHE_KEY", "")
+SECRETS_CACHE_DIRECTORIO = os.getenv("SECRETS_CACHE_DIRECTORIO", "/tmp")
+SECRETS_CACHE_SEGUNDOS = int(os.getenv("SECRETS_CACHE_SEGUNDOS", "300"))
+SECRETS_MAX_WORKERS = 8
+
+
+@lru_cache()
+def get_client():
+    """Get one secret manager client shared by all the secrets"""
+    from google.cloud import secretmanager  # Only needed in google cloud
+
+    return secretmanager.SecretManagerServiceClient()
+
+
+def access_secret(client, name: str, ignore_errors: bool):
+    """Access the latest version of a secret, None if it fails and errors are ignored"""
+    try:
+        response = client.access_secret_version(name=name)
+    except Exception:
+        if ignore_errors:
+            return None
+        raise
+    return response.payload.data.decode("UTF-8")
+
+
+def cache_path(names: list) -> str:
+    """Path of the local cache file for these secret names"""
+    digest = hashlib.sha256("\n".join(names).encode("UTF-8")).hexdigest()[:16]
+    return os.path.join(SECRETS_CACHE_DIRECTORIO, f"secrets-{digest}.bin")
+
+
+def read_cache(path: str):
+    """Read and decrypt the local cache, None if there is no key, no file or it has expired"""
+    if SECRETS_CACHE_KEY == "":
+        return None
+    from cryptography.fernet import Fernet, InvalidToken  # Only needed with the cache
+
+    try:
+        with open(path, "rb") as archivo:
+            token = archivo.read()
+        return json.loads(Fernet(SECRETS_CACHE_KEY).decrypt(token, ttl=SECRETS_CACHE_SEGUNDOS))
+    except (OSError, InvalidToken, ValueError):
+        return None
+
+
+def write_cache(path: str, secrets: dict) -> None:
+    """Encrypt and write the local cache, readable only by this user"""
+    if SECRETS_CACHE_KEY == "":
+        return
+    from cryptography.fernet import Fernet  # Only needed with the cache
+
+    temporal = f"{path}.{os.getpid()}"
+    try:
+        token = Fernet(SECRETS_CACHE_KEY).encrypt(json.dumps(secrets).encode("UTF-8"))
+        descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(token)
+        os.replace(temporal, path)
+    except (OSError, ValueError):
+        pass  # Without cache the secrets are fetched again next time
+
+
+def get_secrets(secret_ids: list, prefix: str, ignore_errors: bool = False, client=None) -> dict:
+    """Get many secrets at once from google cloud secret manager, as a dict by secret_id"""
+
+    # If not in google cloud, return environment variables
+    if PROJECT_ID == "":
+        return {secret_id: os.getenv(secret_id.upper(), "") for secret_id in secret_ids}
+
+    # Build the resource names of the secret versions, same as client.secret_version_path()
+    names = [f"{prefix}_{secret_id}" if prefix != "" else secret_id for secret_id in secret_ids]
+    paths = [f"projects/{PROJECT_ID}/secrets/{name}/versions/latest" for name in names]
+
+    # Use the local cache if it is still valid, without creating the client
+    path = cache_path(paths)
+    cached = read_cache(path)
+    if cached is not None:
+        return cached
+
+    # Access all the secret versions at the same time with the same client
+    if client is None:
+        client = get_client()
+    with ThreadPoolExecutor(max_workers=min(SECRETS_MAX_WORKERS, len(paths))) as executor:
+        values = list(executor.map(lambda name: access_secret(client, name, ignore_errors), paths))
+
+    # Only cache when all of them were found, so the failed ones are retried on the next start
+    secrets = {secret_id: value or "" for secret_id, value in zip(secret_ids, values)}
+    if None not in values:
+        write_cache(path, secrets)
+    return secrets
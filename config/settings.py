@@ -24,50 +24,74 @@ Para desarrollo, debe crear un archivo .env con las variables de entorno:
 - SECRET_KEY
 - SQLALCHEMY_DATABASE_URI
 - TASK_QUEUE
+
+Opcionales, con valores por defecto:
+
+- AUDITORIA_EN_EL_FONDO: si es verdadero, las bitácoras y entradas-salidas van a un stream de Redis
+  y las inserta por lotes el comando cli bitacoras consumir, ver portal_notarias/blueprints/bitacoras/auditoria.py
+- CLOUD_STORAGE_BACKEND: GCS (por defecto), LOCAL en CLOUD_STORAGE_LOCAL_DIRECTORIO o MEMORIA, ver lib/storage_backends.py
+- CLOUD_STORAGE_CACHE_DIRECTORIO: si se da, cache en el disco de los archivos más usados (en App Engine /tmp usa la memoria)
+- CLOUD_STORAGE_CACHE_MAX_MB: tamaño máximo de ese cache
+- CLOUD_STORAGE_ENTREGA: PROXY entrega los archivos en partes desde el worker, FIRMADO redirige a un URL firmado V4
+- CLOUD_STORAGE_URL_FIRMADO_SEGUNDOS: vigencia de los URL firmados
+- EDICTOS_SUBIDA_DIRECTORIO: si se da, los edictos nuevos se guardan ahí y se suben en el fondo con RQ,
+  el worker de RQ debe compartir ese directorio
+- SECRETS_CACHE_KEY, SECRETS_CACHE_DIRECTORIO y SECRETS_CACHE_SEGUNDOS: cache local cifrado de los secretos,
+  ver config/secret_manager.py
+- STORAGE_EMULATOR_HOST: para trabajar sin conexión con fake-gcs-server, por ejemplo http://127.0.0.1:4443
 """
 
 import os
 from functools import lru_cache
 
-from google.cloud import secretmanager
 from pydantic_settings import BaseSettings
 
-PROJECT_ID = os.getenv("PROJECT_ID", "")  # Por defecto esta vacio, esto significa estamos en modo local
+from config.secret_manager import get_secrets
+
 SERVICE_PREFIX = os.getenv("SERVICE_PREFIX", "pjecz_portal_notarias")
 
+# All the secrets are fetched at once with the same client, see config/secret_manager.py
+SECRETS = get_secrets(
+    [
+        "cloud_storage_deposito",
+        "cloud_storage_deposito_edictos",
+        "host",
+        "redis_url",
+        "salt",
+        "secret_key",
+        "sqlalchemy_database_uri",
+        "task_queue",
+    ],
+    SERVICE_PREFIX,
+)
+
 
 def get_secret(secret_id: str) -> str:
     """Get secret from google cloud secret manager"""
-
-    # If not in google cloud, return environment variable
-    if PROJECT_ID == "":
-        return os.getenv(secret_id.upper(), "")
-
-    # Create the secret manager client
-    client = secretmanager.SecretManagerServiceClient()
-
-    # Build the resource name of the secret version
-    secret = f"{SERVICE_PREFIX}_{secret_id}"
-    name = client.secret_version_path(PROJECT_ID, secret, "latest")
-
-    # Access the secret version
-    response = client.access_secret_version(name=name)
-
-    # Return the decoded payload
-    return response.payload.data.decode("UTF-8")
+    if secret_id in SECRETS:
+        return SECRETS[secret_id]
+    return get_secrets([secret_id], SERVICE_PREFIX)[secret_id]
 
 
 class Settings(BaseSettings):
     """Settings"""
 
-    CLOUD_STORAGE_DEPOSITO: str = get_secret("cloud_storage_deposito")
-    CLOUD_STORAGE_DEPOSITO_EDICTOS: str = get_secret("cloud_storage_deposito_edictos")
-    HOST: str = get_secret("host")
-    REDIS_URL: str = get_secret("redis_url")
-    SALT: str = get_secret("salt")
-    SECRET_KEY: str = get_secret("secret_key")
-    SQLALCHEMY_DATABASE_URI: str = get_secret("sqlalchemy_database_uri")
-    TASK_QUEUE: str = get_secret("task_queue")
+    CLOUD_STORAGE_DEPOSITO: str = SECRETS["cloud_storage_deposito"]
+    CLOUD_STORAGE_DEPOSITO_EDICTOS: str = SECRETS["cloud_storage_deposito_edictos"]
+    HOST: str = SECRETS["host"]
+    REDIS_URL: str = SECRETS["redis_url"]
+    SALT: str = SECRETS["salt"]
+    SECRET_KEY: str = SECRETS["secret_key"]
+    SQLALCHEMY_DATABASE_URI: str = SECRETS["sqlalchemy_database_uri"]
+    TASK_QUEUE: str = SECRETS["task_queue"]
+    AUDITORIA_EN_EL_FONDO: bool = False
+    CLOUD_STORAGE_BACKEND: str = "GCS"
+    CLOUD_STORAGE_LOCAL_DIRECTORIO: str = ""
+    CLOUD_STORAGE_CACHE_DIRECTORIO: str = ""
+    CLOUD_STORAGE_CACHE_MAX_MB: int = 64
+    CLOUD_STORAGE_ENTREGA: str = "PROXY"
+    CLOUD_STORAGE_URL_FIRMADO_SEGUNDOS: int = 300
+    EDICTOS_SUBIDA_DIRECTORIO: str = ""
 
     class Config:
         """Load configuration"""
@@ -1,8 +1,29 @@
 """
 Datatables
+
+Los conteos de get_datatable_total se guardan por COUNT_CACHE_TTL segundos en conteos_cache,
+por endpoint y firma de filtros. El cache es de cada proceso: invalidate_datatable_totals() solo
+limpia el del proceso que confirmó el cambio, en los demás el conteo puede quedar atrasado hasta el TTL.
 """
 
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import date
+
 from flask import request
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+
+COUNT_CACHE_MAX = 1024  # Cantidad máxima de firmas en el cache de conteos
+COUNT_CACHE_TTL = 30  # Segundos que se conserva un conteo
+COUNT_ESTIMATE_MIN = 10000  # Si el estimado es menor, se cuenta exacto
+PARAMETROS_NO_FILTROS = ("draw", "start", "length", "cursor", "columns", "order", "search")
+
+conteos_cache = {}
+conteos_cache_candado = threading.Lock()
 
 
 def get_datatable_parameters():
@@ -18,11 +39,125 @@ def get_datatable_parameters():
     return draw, start, rows_per_page
 
 
-def output_datatable_json(draw, total, data):
+def encode_cursor(fecha: date, registro_id: int) -> str:
+    """Codificar el cursor (fecha, id) del último renglón entregado"""
+    texto = f"{fecha.isoformat()}:{registro_id}"
+    return base64.urlsafe_b64encode(texto.encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """Decodificar el cursor, entrega la tupla (fecha, id) o None si no es válido"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii")
+        fecha_str, registro_id_str = texto.split(":")
+        return date.fromisoformat(fecha_str), int(registro_id_str)
+    except (AttributeError, binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def get_datatable_cursor():
+    """Tomar el cursor para paginar por llave, si no viene o no es válido entrega None"""
+    if "cursor" not in request.form:
+        return None
+    return decode_cursor(request.form["cursor"])
+
+
+def paginate_datatable(consulta, start, rows_per_page, columna_fecha, columna_id, cursor=None):
+    """Ordenar por (fecha, id) descendente y paginar, por llave si viene el cursor o por desplazamiento"""
+    consulta = consulta.order_by(columna_fecha.desc(), columna_id.desc())
+    if cursor is None:
+        registros = consulta.offset(start).limit(rows_per_page).all()
+    else:
+        registros = consulta.filter(tuple_(columna_fecha, columna_id) < tuple_(*cursor)).limit(rows_per_page).all()
+    siguiente_cursor = None
+    if len(registros) == rows_per_page:
+        ultimo = registros[-1]
+        siguiente_cursor = encode_cursor(getattr(ultimo, columna_fecha.key), getattr(ultimo, columna_id.key))
+    return registros, siguiente_cursor
+
+
+def eager_load_datatable(consulta, *relaciones):
+    """Cargar las relaciones en la misma consulta con JOIN para evitar un SELECT por cada renglón"""
+    return consulta.options(*[joinedload(relacion) for relacion in relaciones])
+
+
+def project_datatable(consulta, columnas, uniones=()):
+    """Unir las tablas relacionadas y consultar solo las columnas, entrega tuplas en lugar de objetos del ORM"""
+    for union in uniones:
+        consulta = consulta.join(union)
+    return consulta.with_entities(*columnas)
+
+
+def get_datatable_filters():
+    """Tomar los filtros normalizados, son los parametros que no son de paginación de Datatables"""
+    filtros = set()
+    for llave, valor in request.form.items(multi=True):
+        if llave.split("[")[0] not in PARAMETROS_NO_FILTROS:
+            filtros.add((llave, valor.strip()))
+    return tuple(sorted(filtros))
+
+
+def estimate_count(consulta) -> int:
+    """Estimar la cantidad de registros con EXPLAIN, el planeador de PostgreSQL usa reltuples y las estadísticas"""
+    compilado = consulta.order_by(None).statement.compile(dialect=consulta.session.get_bind().dialect)
+    renglon = consulta.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compilado}", compilado.params).first()
+    plan = renglon[0] if isinstance(renglon[0], list) else json.loads(renglon[0])
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def guardar_conteo(firma: tuple, vence: float, total: int, es_exacto: bool) -> None:
+    """Guardar un conteo, si el cache está lleno quitar los vencidos y si no alcanza el más antiguo"""
+    with conteos_cache_candado:
+        if firma not in conteos_cache and len(conteos_cache) >= COUNT_CACHE_MAX:
+            ahora = time.monotonic()
+            for vencida in [llave for llave, guardado in conteos_cache.items() if guardado[0] <= ahora]:
+                del conteos_cache[vencida]
+            if len(conteos_cache) >= COUNT_CACHE_MAX:
+                del conteos_cache[next(iter(conteos_cache))]  # El diccionario conserva el orden de inserción
+        conteos_cache.pop(firma, None)
+        conteos_cache[firma] = (vence, total, es_exacto)
+
+
+def invalidate_datatable_totals(blueprint: str) -> None:
+    """Olvidar los conteos de los endpoints del blueprint, solo en este proceso"""
+    prefijo = f"{blueprint}."
+    with conteos_cache_candado:
+        for firma in [firma for firma in conteos_cache if (firma[0] or "").startswith(prefijo)]:
+            del conteos_cache[firma]
+
+
+def get_datatable_total(consulta):
+    """Entregar la cantidad total de registros y si es exacta, con cache por firma de filtros"""
+    filtros = get_datatable_filters()
+    firma = (request.endpoint, filtros)
+    ahora = time.monotonic()
+    with conteos_cache_candado:
+        guardado = conteos_cache.get(firma)
+    if guardado is not None and guardado[0] > ahora:
+        return guardado[1], guardado[2]
+    total = None
+    es_exacto = True
+    # Sin más filtros que el estatus, en PostgreSQL se usa el estimado si es grande
+    if all(llave == "estatus" for llave, _ in filtros) and consulta.session.get_bind().dialect.name == "postgresql":
+        estimado = estimate_count(consulta)
+        if estimado >= COUNT_ESTIMATE_MIN:
+            total = estimado
+            es_exacto = False
+    if total is None:
+        total = consulta.order_by(None).count()
+    guardar_conteo(firma, ahora + COUNT_CACHE_TTL, total, es_exacto)
+    return total, es_exacto
+
+
+def output_datatable_json(draw, total, data, next_cursor=None, total_is_exact=True):
     """Entregar JSON"""
-    return {
+    salida = {
         "draw": draw,
         "iTotalRecords": total,
         "iTotalDisplayRecords": total,
         "aaData": data,
+        "total_is_exact": total_is_exact,
     }
+    if next_cursor is not None:
+        salida["next_cursor"] = next_cursor
+    return salida
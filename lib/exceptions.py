@@ -75,6 +75,10 @@ class MyResponseError(MyAnyError):
     """Excepción porque falló la respuesta"""
 
 
+class MySignedURLError(MyAnyError):
+    """Excepción porque no se pudo firmar el URL"""
+
+
 class MyStatusCodeError(MyAnyError):
     """Excepción porque el status code no es 200"""
 
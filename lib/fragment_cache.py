@@ -0,0 +1,81 @@
+"""
+Fragment Cache
+
+Extensión de Jinja2 que guarda en Redis el HTML de un bloque de la plantilla.
+
+1) Registre la extensión en la app
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+2) En la plantilla, el primer argumento es el espacio y los demás forman la llave explícita
+
+    {% cache "edictos", "otras_autoridades", fecha, current_user.autoridad_id, "A" %}
+        ...
+    {% endcache %}
+
+3) Al cambiar los datos, invalide todo el espacio
+
+    invalidate_fragments("edictos")
+
+La llave es fragmentos:{espacio}:{generacion}:{argumentos}, invalidar incrementa la generación.
+No ponga dentro del bloque datos propios del usuario como el token CSRF.
+Si Redis no responde el bloque se genera como siempre.
+"""
+
+from flask import current_app, has_app_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from redis.exceptions import RedisError
+
+FRAGMENTOS_CACHE_TTL = 600  # Segundos
+
+
+def fragment_key(espacio: str, argumentos: list) -> str:
+    """Llave en Redis con la generación vigente del espacio"""
+    generacion = current_app.redis.get(f"fragmentos:{espacio}:generacion")
+    partes = ":".join(str(argumento) for argumento in argumentos)
+    return f"fragmentos:{espacio}:{int(generacion or 0)}:{partes}"
+
+
+def invalidate_fragments(espacio: str) -> None:
+    """Invalidar todos los fragmentos de un espacio"""
+    if not has_app_context():
+        return
+    try:
+        current_app.redis.incr(f"fragmentos:{espacio}:generacion")
+    except RedisError:
+        pass
+
+
+class FragmentCacheExtension(Extension):
+    """Etiqueta {% cache espacio, llave... %} ... {% endcache %}"""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        """Leer los argumentos y el cuerpo del bloque"""
+        lineno = next(parser.stream).lineno
+        argumentos = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            argumentos.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(["name:endcache"], drop_needle=True)
+        llamada = self.call_method("_cache_support", [nodes.List(argumentos)])
+        return nodes.CallBlock(llamada, [], [], cuerpo).set_lineno(lineno)
+
+    def _cache_support(self, argumentos, caller):
+        """Entregar el fragmento desde Redis, o generarlo y guardarlo"""
+        espacio, *llave = argumentos
+        try:
+            clave = fragment_key(espacio, llave)
+            guardado = current_app.redis.get(clave)
+            if guardado is not None:
+                return Markup(guardado.decode("utf-8"))
+        except RedisError:
+            return caller()
+        fragmento = caller()
+        try:
+            current_app.redis.set(clave, str(fragmento), ex=FRAGMENTOS_CACHE_TTL)
+        except RedisError:
+            pass
+        return fragmento
@@ -5,22 +5,35 @@ Functions to get and upload files from Google Cloud Storage
 
 For develpment you need the environment variable GOOGLE_APPLICATION_CREDENTIALS
 
+The storage client and the bucket objects are created once per process and reused,
+the bucket is not requested (no metadata GET), so a missing bucket is reported as a missing file.
+After a fork (gunicorn workers, RQ work horses) the child process creates its own client.
+
 """
 
+import base64
+import hashlib
+import os
+import threading
+from datetime import timedelta
+from functools import lru_cache
 from pathlib import Path
-from urllib.parse import unquote, urlparse
-
-from google.cloud import storage
-from google.cloud.exceptions import NotFound
+from typing import TYPE_CHECKING
+from urllib.parse import quote, unquote, urlparse
 
 from lib.exceptions import (
-    MyBucketNotFoundError,
     MyFileNotAllowedError,
     MyFileNotFoundError,
     MyNotValidParamError,
+    MySignedURLError,
     MyUploadError,
 )
 
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+CHUNK_SIZE = 1024 * 1024  # Bytes que se descargan o suben por parte, múltiplo de 256 KiB
+
 EXTENSIONS_MEDIA_TYPES = {
     "doc": "application/msword",
     "docx": "application/msword",
@@ -33,6 +46,51 @@ EXTENSIONS_MEDIA_TYPES = {
     "xlsx": "xapplication/vnd.ms-excel",
 }
 
+storage_pool = {"pid": None, "client": None, "buckets": {}}
+storage_pool_lock = threading.Lock()
+
+
+def reset_storage_pool() -> None:
+    """
+    Forget the storage client and buckets, the child process after a fork must create its own
+    """
+    global storage_pool_lock
+    storage_pool_lock = threading.Lock()
+    storage_pool.update(pid=None, client=None, buckets={})
+
+
+os.register_at_fork(after_in_child=reset_storage_pool)
+
+
+def get_storage_client() -> "storage.Client":
+    """
+    Get the storage client of this process, it is created on the first use
+
+    :return: Storage client
+    """
+    with storage_pool_lock:
+        if storage_pool["pid"] != os.getpid() or storage_pool["client"] is None:
+            from google.cloud import storage  # Imported on the first use, it is slow to import
+
+            storage_pool.update(pid=os.getpid(), client=storage.Client(), buckets={})
+        return storage_pool["client"]
+
+
+def get_bucket_from_gcs(bucket_name: str) -> "storage.Bucket":
+    """
+    Get the bucket object of this process, without requesting its metadata
+
+    :param bucket_name: Name of the bucket
+    :return: Bucket
+    """
+    storage_client = get_storage_client()
+    with storage_pool_lock:
+        bucket = storage_pool["buckets"].get(bucket_name)
+        if bucket is None:
+            bucket = storage_client.bucket(bucket_name)
+            storage_pool["buckets"][bucket_name] = bucket
+        return bucket
+
 
 def get_media_type_from_filename(filename: str) -> str:
     """
@@ -92,11 +150,7 @@ def check_file_exists_from_gcs(
     """
 
     # Get bucket
-    storage_client = storage.Client()
-    try:
-        bucket = storage_client.get_bucket(bucket_name)
-    except NotFound as error:
-        raise MyBucketNotFoundError("Bucket not found") from error
+    bucket = get_bucket_from_gcs(bucket_name)
 
     # Get file
     blob = bucket.get_blob(blob_name)
@@ -120,11 +174,7 @@ def get_public_url_from_gcs(
     """
 
     # Get bucket
-    storage_client = storage.Client()
-    try:
-        bucket = storage_client.get_bucket(bucket_name)
-    except NotFound as error:
-        raise MyBucketNotFoundError("Bucket not found") from error
+    bucket = get_bucket_from_gcs(bucket_name)
 
     # Get file
     blob = bucket.get_blob(blob_name)
@@ -135,32 +185,136 @@ def get_public_url_from_gcs(
     return blob.public_url
 
 
-def get_file_from_gcs(
+def get_blob_from_gcs(
     bucket_name: str,
     blob_name: str,
-) -> bytes:
+) -> "storage.Blob":
     """
-    Get file from Google Cloud Storage
+    Get blob with its metadata (size, etag, updated, generation) without downloading its content
 
     :param bucket_name: Name of the bucket
     :param blob_name: Path to the file
-    :return: File content
+    :return: Blob
     """
 
     # Get bucket
-    storage_client = storage.Client()
-    try:
-        bucket = storage_client.get_bucket(bucket_name)
-    except NotFound as error:
-        raise MyBucketNotFoundError("Bucket not found") from error
+    bucket = get_bucket_from_gcs(bucket_name)
 
     # Get file
     blob = bucket.get_blob(blob_name)
     if blob is None:
         raise MyFileNotFoundError("File not found")
 
+    # Return blob
+    return blob
+
+
+def get_file_from_gcs(
+    bucket_name: str,
+    blob_name: str,
+) -> bytes:
+    """
+    Get file from Google Cloud Storage
+
+    :param bucket_name: Name of the bucket
+    :param blob_name: Path to the file
+    :return: File content
+    """
+
     # Return file content
-    return blob.download_as_string()
+    return get_blob_from_gcs(bucket_name, blob_name).download_as_string()
+
+
+def iter_blob_chunks(
+    blob: "storage.Blob",
+    start: int,
+    stop: int,
+    chunk_size: int = CHUNK_SIZE,
+):
+    """
+    Iterate over the content of a blob in chunks, each chunk is a ranged download
+
+    :param blob: Blob from get_blob_from_gcs
+    :param start: First byte
+    :param stop: Byte after the last one
+    :param chunk_size: Size of each chunk
+    :return: Generator of bytes
+    """
+
+    # Download each chunk from the same generation, in case the file is replaced meanwhile
+    while start < stop:
+        end = min(start + chunk_size, stop)
+        yield blob.download_as_bytes(start=start, end=end - 1, if_generation_match=blob.generation)
+        start = end
+
+
+@lru_cache()
+def get_signing_credentials():
+    """
+    Get default credentials, they are kept to refresh the token only when it expires
+
+    :return: Credentials
+    """
+    import google.auth  # Imported on the first use, it is slow to import
+
+    credentials, _ = google.auth.default()
+    return credentials
+
+
+def get_signed_url_from_gcs(
+    bucket_name: str,
+    blob_name: str,
+    expiration_seconds: int = 300,
+    content_type: str = None,
+    download_name: str = None,
+) -> str:
+    """
+    Get a short-lived V4 signed URL, no request is made to the bucket
+
+    With STORAGE_EMULATOR_HOST (fake-gcs-server) there are no signatures, the download URL of the emulator is returned
+
+    :param bucket_name: Name of the bucket
+    :param blob_name: Path to the file
+    :param expiration_seconds: Seconds the URL is valid
+    :param content_type: Content type for the response
+    :param download_name: If given, the response is an attachment with this filename
+    :return: Signed URL
+    """
+
+    # Emulator for offline work
+    emulator_host = os.getenv("STORAGE_EMULATOR_HOST", "")
+    if emulator_host != "":
+        return f"{emulator_host.rstrip('/')}/download/storage/v1/b/{bucket_name}/o/{quote(blob_name, safe='')}?alt=media"
+
+    # Imported on the first use, they are slow to import
+    import google.auth.transport.requests
+    from google.auth.credentials import Signing
+    from google.auth.exceptions import GoogleAuthError
+
+    # Credentials without private key (App Engine, Cloud Run) sign with the IAM API using the access token
+    credentials = get_signing_credentials()
+    signing_kwargs = {"credentials": credentials}
+    if not isinstance(credentials, Signing):
+        try:
+            if not credentials.valid:
+                credentials.refresh(google.auth.transport.requests.Request())
+        except GoogleAuthError as error:
+            raise MySignedURLError("Error refreshing credentials") from error
+        signing_kwargs = {"service_account_email": credentials.service_account_email, "access_token": credentials.token}
+
+    # Sign, the blob object is local and does not need the bucket metadata
+    blob = get_bucket_from_gcs(bucket_name).blob(blob_name)
+    try:
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=expiration_seconds),
+            method="GET",
+            response_type=content_type,
+            response_disposition=f'attachment; filename="{download_name}"' if download_name else None,
+            **signing_kwargs,
+        )
+    except (GoogleAuthError, ValueError) as error:
+        raise MySignedURLError("Error signing URL") from error
 
 
 def upload_file_to_gcs(
@@ -184,11 +338,7 @@ def upload_file_to_gcs(
     #     raise MyFileNotAllowedError("File not allowed")
 
     # Get bucket
-    storage_client = storage.Client()
-    try:
-        bucket = storage_client.get_bucket(bucket_name)
-    except NotFound as error:
-        raise MyBucketNotFoundError("Bucket not found") from error
+    bucket = get_bucket_from_gcs(bucket_name)
 
     # Create blob
     blob = bucket.blob(blob_name)
@@ -201,3 +351,115 @@ def upload_file_to_gcs(
 
     # Return public URL
     return blob.public_url
+
+
+def delete_file_from_gcs(
+    bucket_name: str,
+    blob_name: str,
+) -> None:
+    """
+    Delete file from Google Cloud Storage, if it does not exist nothing happens
+
+    :param bucket_name: Name of the bucket
+    :param blob_name: Path to the file
+    """
+    from google.api_core.exceptions import NotFound  # Imported on the first use, it is slow to import
+
+    # Get bucket
+    bucket = get_bucket_from_gcs(bucket_name)
+
+    # Delete blob
+    try:
+        bucket.blob(blob_name).delete()
+    except NotFound:
+        pass
+    except Exception as error:
+        raise MyUploadError("Error deleting file") from error
+
+
+class HashingReader:
+    """
+    File-like wrapper that computes MD5 and CRC32C while the content is read
+
+    If the uploader seeks back to retry a chunk, the bytes already hashed are not hashed again
+    """
+
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        import google_crc32c  # Imported on the first use, it is slow to import
+
+        self.md5 = hashlib.md5()
+        self.crc32c = google_crc32c.Checksum()
+        self.hashed_until = file_obj.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        """Read and hash the bytes not hashed before"""
+        position = self.file_obj.tell()
+        data = self.file_obj.read(size)
+        if position <= self.hashed_until < position + len(data):
+            new_data = data[self.hashed_until - position :]
+            self.md5.update(new_data)
+            self.crc32c.update(new_data)
+            self.hashed_until += len(new_data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """Seek in the wrapped file"""
+        return self.file_obj.seek(offset, whence)
+
+    def tell(self) -> int:
+        """Position in the wrapped file"""
+        return self.file_obj.tell()
+
+    @property
+    def md5_hash(self) -> str:
+        """MD5 in base64, as in the blob metadata"""
+        return base64.b64encode(self.md5.digest()).decode("ascii")
+
+    @property
+    def crc32c_hash(self) -> str:
+        """CRC32C in base64, as in the blob metadata"""
+        return base64.b64encode(self.crc32c.digest()).decode("ascii")
+
+
+def upload_stream_to_gcs(
+    bucket_name: str,
+    blob_name: str,
+    content_type: str,
+    file_obj,
+    chunk_size: int = CHUNK_SIZE,
+) -> str:
+    """
+    Upload a file-like object to Google Cloud Storage with a resumable upload in chunks
+
+    Only one chunk is in memory at a time. MD5 and CRC32C are computed while reading
+    and compared with the uploaded blob, if they differ the blob is deleted.
+
+    :param bucket_name: Name of the bucket
+    :param blob_name: Path to the file
+    :param content_type: Content type of the file
+    :param file_obj: File-like object, read from its current position
+    :param chunk_size: Size of each chunk, multiple of 256 KiB
+    :return: Public URL
+    """
+
+    # Create blob with chunk size, this makes the upload resumable
+    bucket = get_bucket_from_gcs(bucket_name)
+    blob = bucket.blob(blob_name, chunk_size=chunk_size)
+
+    # Upload file, the library also sends the CRC32C so a corrupted upload is not finalized
+    reader = HashingReader(file_obj)
+    try:
+        blob.upload_from_file(reader, content_type=content_type, checksum="crc32c")
+    except Exception as error:
+        raise MyUploadError("Error uploading file") from error
+
+    # Check integrity
+    if (blob.md5_hash is not None and blob.md5_hash != reader.md5_hash) or (
+        blob.crc32c is not None and blob.crc32c != reader.crc32c_hash
+    ):
+        blob.delete()
+        raise MyUploadError("Uploaded file does not match its checksums")
+
+    # Return public URL
+    return blob.public_url
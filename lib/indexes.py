@@ -0,0 +1,68 @@
+"""
+Indexes
+
+Crear los índices declarados en los modelos, este proyecto no usa create_all ni migraciones.
+
+- En PostgreSQL cada índice se crea con CREATE INDEX CONCURRENTLY IF NOT EXISTS, sin bloquear las escrituras,
+  por eso se ejecuta fuera de una transacción (AUTOCOMMIT)
+- Si un CREATE INDEX CONCURRENTLY anterior falló, el índice quedó INVALID, se elimina y se vuelve a crear
+- Antes de un índice con gin_trgm_ops se crea la extensión pg_trgm
+
+Desde el CLI
+
+    cli indices crear --probar  # Solo muestra las sentencias, sirve como script SQL
+    cli indices crear
+"""
+
+import re
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+PG_TRGM_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+
+def index_is_valid(conexion, nombre: str):
+    """Entregar True si el índice existe y es válido, False si existe pero quedó INVALID, None si no existe"""
+    if conexion.dialect.name == "postgresql":
+        return conexion.execute(
+            text("SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :nombre"),
+            {"nombre": nombre},
+        ).scalar()
+    existe = conexion.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :nombre"),
+        {"nombre": nombre},
+    ).scalar()
+    return True if existe else None
+
+
+def index_exists(conexion, nombre: str) -> bool:
+    """Verificar que el índice existe y se puede usar"""
+    return index_is_valid(conexion, nombre) is True
+
+
+def create_index_statements(conexion, indice) -> list:
+    """Sentencias para crear el índice, vacía si ya existe y es válido"""
+    valido = index_is_valid(conexion, indice.name)
+    if valido:
+        return []
+    crear = str(CreateIndex(indice, if_not_exists=True).compile(dialect=conexion.dialect)).strip()
+    if conexion.dialect.name != "postgresql":
+        return [crear]
+    sentencias = []
+    if valido is False:
+        sentencias.append(f"DROP INDEX CONCURRENTLY IF EXISTS {indice.name}")
+    if "gin_trgm_ops" in indice.dialect_kwargs.get("postgresql_ops", {}).values():
+        sentencias.append(PG_TRGM_EXTENSION)
+    sentencias.append(re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", crear))
+    return sentencias
+
+
+def create_index(engine, indice, probar: bool = False) -> list:
+    """Crear el índice si falta, entrega las sentencias, con probar solo las entrega sin ejecutarlas"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        sentencias = create_index_statements(conexion, indice)
+        if not probar:
+            for sentencia in sentencias:
+                conexion.exec_driver_sql(sentencia)
+    return sentencias
@@ -0,0 +1,167 @@
+"""
+Reference Cache
+
+Instantánea por proceso de una tabla de referencia pequeña y casi estática (módulos, autoridades, distritos, roles).
+
+1) Defina la instantánea con el modelo, las columnas, las columnas únicas y las columnas con índice de búsqueda
+
+    autoridades_referencia = ReferenceCache(Autoridad, columnas, unicos=("clave",), buscables=("clave",))
+
+2) Consulte en memoria, cada renglón es un dict
+
+    autoridades_referencia.get(autoridad_id)
+    autoridades_referencia.get_por("clave", "SLT-J1-CIV")
+    autoridades_referencia.buscar("clave", "J1")  # Como contains(), ordenados por id
+
+La instantánea se carga completa la primera vez que se usa. Su versión vive en Redis con la llave
+referencias:{tabla}:version y cada proceso la lee a lo sumo una vez cada REFERENCIAS_VERIFICAR_SEGUNDOS,
+si cambió vuelve a cargar la tabla. Al confirmar una transacción que inserta, edita o elimina renglones
+de la tabla, aunque sea en bloque, se incrementa la versión. Si Redis no responde se conserva lo cargado.
+
+El índice de búsqueda tiene los prefijos de cada sufijo del valor, así buscar() equivale a contains()
+con un solo acceso a un dict.
+"""
+
+import time
+from itertools import chain
+
+from flask import current_app, has_app_context
+from redis.exceptions import RedisError
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from portal_notarias.extensions import database
+
+REFERENCIAS_VERIFICAR_SEGUNDOS = 5
+
+# Instantáneas definidas, por nombre de la tabla
+REFERENCIAS = {}
+
+
+class ReferenceCache:
+    """Instantánea en memoria de una tabla, se vuelve a cargar cuando cambia su versión en Redis"""
+
+    def __init__(self, modelo, columnas: tuple, unicos: tuple = (), buscables: tuple = ()):
+        self.modelo = modelo
+        self.tabla = modelo.__tablename__
+        self.columnas = columnas
+        self.unicos = unicos
+        self.buscables = buscables
+        self.version = None
+        self.verificado = 0.0
+        self.por_id = {}
+        self.indices = {}
+        REFERENCIAS[self.tabla] = self
+
+    @property
+    def version_llave(self) -> str:
+        """Llave en Redis con la versión de la tabla"""
+        return f"referencias:{self.tabla}:version"
+
+    def consultar(self) -> list:
+        """Consultar todos los renglones de la tabla con una sola consulta, como dicts ordenados por id"""
+        columnas = [getattr(self.modelo, columna) for columna in self.columnas]
+        renglones = database.session.execute(select(*columnas).order_by(self.modelo.id)).all()
+        return [dict(renglon._mapping) for renglon in renglones]
+
+    def cargar(self, version: int) -> None:
+        """Cargar la tabla y elaborar los índices"""
+        renglones = self.consultar()
+        indices = {}
+        for columna in self.unicos:
+            indices[columna] = {renglon[columna]: renglon for renglon in renglones}
+        for columna in self.buscables:
+            indice = {}
+            for renglon in renglones:
+                valor = renglon[columna] or ""
+                subcadenas = {valor[i:j] for i in range(len(valor)) for j in range(i + 1, len(valor) + 1)}
+                for subcadena in subcadenas:
+                    indice.setdefault(subcadena, []).append(renglon)
+            indices[f"buscar:{columna}"] = indice
+        self.por_id = {renglon["id"]: renglon for renglon in renglones}
+        self.indices = indices
+        self.version = version
+
+    def leer_version(self):
+        """Leer la versión vigente en Redis, o None si no responde"""
+        try:
+            return int(current_app.redis.get(self.version_llave) or 0)
+        except RedisError:
+            return None
+
+    def vigente(self) -> None:
+        """Cargar la tabla si aún no se ha cargado o si cambió su versión en Redis"""
+        ahora = time.monotonic()
+        if self.version is not None and ahora - self.verificado < REFERENCIAS_VERIFICAR_SEGUNDOS:
+            return
+        version = self.leer_version()
+        self.verificado = ahora
+        if version is None:
+            if self.version is None:
+                self.cargar(-1)  # Redis no responde y no hay nada cargado
+            return
+        if version != self.version:
+            self.cargar(version)
+
+    def get_todos(self) -> dict:
+        """Entregar todos los renglones por id, en orden de id"""
+        self.vigente()
+        return self.por_id
+
+    def get(self, renglon_id):
+        """Entregar un renglón por su id, o None si no existe"""
+        self.vigente()
+        return self.por_id.get(renglon_id)
+
+    def get_por(self, columna: str, valor):
+        """Entregar un renglón por el valor de una columna única, o None si no existe"""
+        self.vigente()
+        return self.indices[columna].get(valor)
+
+    def buscar(self, columna: str, texto: str) -> list:
+        """Entregar los renglones cuya columna contiene el texto, ordenados por id"""
+        self.vigente()
+        if texto == "":
+            return list(self.por_id.values())
+        return self.indices[f"buscar:{columna}"].get(texto, [])
+
+    def invalidate(self) -> None:
+        """Incrementar la versión para que todos los procesos vuelvan a cargar la tabla"""
+        self.version = None  # Este proceso la carga en la siguiente consulta
+        if not has_app_context():
+            return
+        try:
+            current_app.redis.incr(self.version_llave)
+        except RedisError:
+            pass
+
+
+@event.listens_for(Session, "after_flush")
+def recolectar_cambios_referencias(session, flush_context):
+    """Tomar nota de las tablas de referencia que cambiaron"""
+    for registro in chain(session.new, session.dirty, session.deleted):
+        tabla = getattr(registro, "__tablename__", None)
+        if tabla in REFERENCIAS:
+            session.info.setdefault("referencias_tablas", set()).add(tabla)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def recolectar_cambios_referencias_en_bloque(orm_execute_state):
+    """Tomar nota de los INSERT, UPDATE y DELETE en bloque sobre tablas de referencia"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        tabla = getattr(orm_execute_state.statement, "table", None)
+        if tabla is not None and tabla.name in REFERENCIAS:
+            orm_execute_state.session.info.setdefault("referencias_tablas", set()).add(tabla.name)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidar_cambios_referencias(session):
+    """Al confirmar la transacción, dar la señal de volver a cargar las tablas que cambiaron"""
+    for tabla in session.info.pop("referencias_tablas", set()):
+        REFERENCIAS[tabla].invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def descartar_cambios_referencias(session):
+    """Al revertir la transacción, descartar las notas"""
+    session.info.pop("referencias_tablas", None)
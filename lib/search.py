@@ -0,0 +1,72 @@
+"""
+Search
+
+Búsquedas de texto "contiene" servidas por índices GIN de trigramas (pg_trgm) de PostgreSQL.
+
+La columna se normaliza igual que safe_string(..., save_enie=True): en mayúsculas y sin acentos, conservando la Ñ.
+Se usa translate(upper(...)) porque ambas funciones son IMMUTABLE y pueden indexarse, a diferencia de unaccent().
+
+1) Declare el índice después del modelo
+
+    search_index("edictos_descripcion_trgm_idx", Edicto.descripcion)
+
+2) Filtre con la misma expresión para que el planeador use el índice
+
+    consulta = consulta.filter(search_contains(Edicto.descripcion, request.form["descripcion"]))
+
+3) Este proyecto no usa create_all, cree la extensión y los índices en la base de datos con
+
+    cli indices crear
+
+Sin los índices el filtro translate(upper(...)) LIKE recorre toda la tabla y es más lento que un LIKE simple.
+"""
+
+from sqlalchemy import DDL, Index, String, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from lib.safe_string import safe_string
+
+ACENTOS = "ÁÀÂÄÉÈÊËÍÌÎÏÓÒÔÖÚÙÛÜ"
+SIN_ACENTOS = "AAAAEEEEIIIIOOOOUUUU"
+
+PG_TRGM_DDL = DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+
+
+class search_normalized(FunctionElement):
+    """Expresión SQL de la columna normalizada para búsquedas"""
+
+    inherit_cache = True
+    name = "search_normalized"
+    type = String()
+
+
+@compiles(search_normalized)
+def compile_search_normalized(element, compiler, **kw):
+    """En otras bases de datos solo se convierte a mayúsculas"""
+    return f"upper({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(search_normalized, "postgresql")
+def compile_search_normalized_postgresql(element, compiler, **kw):
+    """En PostgreSQL se convierte a mayúsculas y se quitan los acentos"""
+    return f"translate(upper({compiler.process(element.clauses, **kw)}), '{ACENTOS}', '{SIN_ACENTOS}')"
+
+
+def search_index(nombre: str, columna) -> Index:
+    """Índice GIN de trigramas sobre la columna normalizada, crea la extensión pg_trgm si hace falta"""
+    etiqueta = f"{columna.key}_busqueda"
+    indice = Index(
+        nombre,
+        search_normalized(columna).label(etiqueta),
+        postgresql_using="gin",
+        postgresql_ops={etiqueta: "gin_trgm_ops"},
+    )
+    if not event.contains(indice.table, "before_create", PG_TRGM_DDL):
+        event.listen(indice.table, "before_create", PG_TRGM_DDL)
+    return indice
+
+
+def search_contains(columna, texto: str):
+    """Filtro que contiene el texto, normalizado de ambos lados para usar el índice de trigramas"""
+    return search_normalized(columna).contains(safe_string(texto, save_enie=True))
@@ -60,7 +60,7 @@ Defina el nombre guardado en el depósito y suba
             # Subir el archivo a la nube
             try:
                 storage.set_filename(hashed_id=cid_formato.encode_id(), description=descripcion)
-                storage.upload(archivo.stream.read())
+                storage.upload_stream(archivo.stream)
                 cid_formato.archivo = archivo.filename  # Conservar el nombre original
                 cid_formato.url = storage.url
                 cid_formato.save()
@@ -111,17 +111,20 @@ Tenga en cuenta que...
 
 import datetime
 import locale
+import os
 import re
+import shutil
+import uuid
 from datetime import date, datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO
 
 from flask import current_app
-from google.cloud import storage
 from unidecode import unidecode
 from werkzeug.utils import secure_filename
 
-from lib.exceptions import MyFilenameError, MyNotAllowedExtensionError, MyUnknownExtensionError
+from lib.exceptions import MyFilenameError, MyNotAllowedExtensionError, MyUnknownExtensionError, MyUploadError
+from lib.storage_backends import get_storage_backend
 
 locale.setlocale(locale.LC_TIME, "es_MX.utf8")
 
@@ -142,6 +145,20 @@ class NotConfiguredError(Exception):
     """Exception raised when a environment variable is not configured"""
 
 
+def stage_upload(file_obj: BinaryIO, directory: str, extension: str) -> str:
+    """Save a file-like object in a local directory to upload it later in a task, returns its path"""
+    path = Path(directory, f"{uuid.uuid4().hex}.{extension}")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "xb") as archivo:
+            shutil.copyfileobj(file_obj, archivo, 1024 * 1024)
+    except OSError as error:
+        if path.exists():
+            os.remove(path)
+        raise MyUploadError("Error staging file") from error
+    return str(path)
+
+
 class GoogleCloudStorage:
     """Google Cloud Storage"""
 
@@ -243,9 +260,8 @@ class GoogleCloudStorage:
                 self.filename = f"{description}-{hashed_id}.{self.extension}"
         return self.filename
 
-    def upload(self, data: Any) -> str:
-        """Upload to the cloud, returns the public URL"""
-        self.url = None
+    def get_blob_name(self) -> str:
+        """Path of the file in the bucket, /base_directory/year/month/filename"""
         if self.filename is None:
             raise MyFilenameError
         if self.content_type is None:
@@ -255,10 +271,23 @@ class GoogleCloudStorage:
             month_str = self.upload_date.strftime("%B")
         else:
             month_str = self.upload_date.strftime("%m")
-        path_str = str(Path(self.base_directory, year_str, month_str, self.filename))
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.bucket_name)
-        blob = bucket.blob(path_str)
-        blob.upload_from_string(data, self.content_type)
-        self.url = blob.public_url
+        return str(Path(self.base_directory, year_str, month_str, self.filename))
+
+    def upload(self, data: Any) -> str:
+        """Upload to the storage backend (GCS, LOCAL or MEMORIA), returns the public URL"""
+        self.url = None
+        path_str = self.get_blob_name()
+        self.url = get_storage_backend().write(self.bucket_name, path_str, data, self.content_type)
+        return self.url
+
+    def upload_stream(self, file_obj: BinaryIO) -> str:
+        """Upload a file-like object in chunks with integrity checks, returns the public URL"""
+        self.url = None
+        path_str = self.get_blob_name()
+        self.url = get_storage_backend().write_stream(self.bucket_name, path_str, file_obj, self.content_type)
         return self.url
+
+    def delete(self) -> None:
+        """Delete the uploaded file from the storage backend"""
+        get_storage_backend().delete(self.bucket_name, self.get_blob_name())
+        self.url = None
@@ -0,0 +1,443 @@
+"""
+Storage Backends
+
+Depósitos de archivos intercambiables, se elige con CLOUD_STORAGE_BACKEND en Settings:
+
+- GCS: Google Cloud Storage, por defecto
+- LOCAL: un directorio en el disco (CLOUD_STORAGE_LOCAL_DIRECTORIO), las lecturas usan mmap
+- MEMORIA: en la memoria del proceso, para pruebas y mediciones sin red (no se comparte entre workers)
+
+Con CLOUD_STORAGE_CACHE_DIRECTORIO se antepone un cache en el disco (CachedBackend) con límite de
+CLOUD_STORAGE_CACHE_MAX_MB, así los archivos más usados se entregan sin consultar al depósito.
+
+- Cada archivo se guarda con la llave del bucket, el nombre y la generación, al reemplazarlo cambia la llave
+- Se llena al entregar un archivo completo, escribiendo en un temporal que se renombra al terminar
+- La fecha de modificación marca el último uso, al pasar del máximo se borran los menos usados
+- El directorio se revisa solo cuando lo guardado desde la última revisión pasa del máximo,
+  o cada CACHE_EVICT_INTERVAL segundos para notar lo que guardan los otros workers
+- Los metadatos se conservan en memoria CACHE_INFO_TTL segundos, un reemplazo tarda eso en notarse
+
+Los URL públicos siempre tienen la forma https://storage.googleapis.com/bucket/blob,
+así get_blob_name_from_url funciona igual y los registros sirven con cualquier depósito.
+
+    backend = get_storage_backend()
+    url = backend.write(bucket_name, "edictos/2024/05/archivo.pdf", contenido, "application/pdf")
+    info = backend.get_info(bucket_name, "edictos/2024/05/archivo.pdf")
+    for parte in backend.iter_chunks(bucket_name, info, 0, info.size):
+        ...
+
+"""
+
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+from flask import current_app
+
+from lib.exceptions import MyFileNotFoundError, MyMissingConfigurationError, MyNotValidParamError, MyUploadError
+from lib.google_cloud_storage import (
+    CHUNK_SIZE,
+    delete_file_from_gcs,
+    get_blob_from_gcs,
+    get_file_from_gcs,
+    get_signed_url_from_gcs,
+    iter_blob_chunks,
+    upload_file_to_gcs,
+    upload_stream_to_gcs,
+)
+
+CACHE_EVICT_INTERVAL = 60  # Segundos entre revisiones del directorio aunque este proceso no llegue al máximo
+CACHE_INFO_MAX = 4096  # Cantidad máxima de metadatos en memoria en el cache
+CACHE_INFO_TTL = 60  # Segundos que se confía en los metadatos sin consultar al depósito
+CACHE_LOW_WATER = 0.9  # Al desalojar se deja el cache en esta fracción del máximo
+PUBLIC_URL_BASE = "https://storage.googleapis.com"
+
+storage_backends = {}
+
+
+def iter_mmap_chunks(archivo, start: int, stop: int, chunk_size: int = CHUNK_SIZE):
+    """Leer de un archivo ya abierto con mmap en partes, al terminar lo cierra"""
+    with archivo:
+        if start >= stop:
+            return
+        with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as contenido:
+            for posicion in range(start, stop, chunk_size):
+                yield contenido[posicion : min(posicion + chunk_size, stop)]
+
+
+class BlobInfo:
+    """Metadatos de un archivo en el depósito"""
+
+    def __init__(self, name: str, size: int, etag: str, updated: datetime, generation: int, handle=None):
+        self.name = name
+        self.size = size
+        self.etag = etag
+        self.updated = updated
+        self.generation = generation
+        self.handle = handle  # Lo que necesite el depósito para leer, por ejemplo el blob de GCS
+
+    def __repr__(self):
+        """Representación"""
+        return f"<BlobInfo {self.name} {self.size}>"
+
+
+class StorageBackend(ABC):
+    """Depósito de archivos, las clases hijas implementan los métodos abstractos"""
+
+    can_sign = False
+
+    @abstractmethod
+    def get_info(self, bucket_name: str, blob_name: str) -> BlobInfo:
+        """Entregar los metadatos sin leer el contenido, causa MyFileNotFoundError si no existe"""
+
+    @abstractmethod
+    def iter_chunks(self, bucket_name: str, info: BlobInfo, start: int, stop: int, chunk_size: int = CHUNK_SIZE):
+        """Entregar un generador con el contenido de start a stop (sin incluirlo) en partes"""
+
+    @abstractmethod
+    def read(self, bucket_name: str, blob_name: str) -> bytes:
+        """Leer el contenido completo"""
+
+    @abstractmethod
+    def write(self, bucket_name: str, blob_name: str, data: bytes, content_type: str) -> str:
+        """Escribir el contenido, entrega el URL público"""
+
+    @abstractmethod
+    def write_stream(self, bucket_name: str, blob_name: str, file_obj, content_type: str) -> str:
+        """Escribir desde un objeto tipo archivo en partes, entrega el URL público"""
+
+    @abstractmethod
+    def delete(self, bucket_name: str, blob_name: str) -> None:
+        """Eliminar el archivo, si no existe no hace nada"""
+
+    def get_signed_url(self, bucket_name: str, blob_name: str, expiration_seconds: int, content_type=None, download_name=None):
+        """Entregar un URL firmado, solo si can_sign es verdadero"""
+        raise MyNotValidParamError("Este depósito no puede firmar URL")
+
+    def exists(self, bucket_name: str, blob_name: str) -> bool:
+        """¿Existe el archivo?"""
+        try:
+            self.get_info(bucket_name, blob_name)
+        except MyFileNotFoundError:
+            return False
+        return True
+
+    def public_url(self, bucket_name: str, blob_name: str) -> str:
+        """URL público con la forma de Google Cloud Storage"""
+        return f"{PUBLIC_URL_BASE}/{bucket_name}/{quote(blob_name)}"
+
+
+class GCSBackend(StorageBackend):
+    """Depósito en Google Cloud Storage"""
+
+    can_sign = True
+
+    def get_info(self, bucket_name, blob_name):
+        blob = get_blob_from_gcs(bucket_name, blob_name)
+        return BlobInfo(blob_name, blob.size, blob.etag, blob.updated, blob.generation, handle=blob)
+
+    def iter_chunks(self, bucket_name, info, start, stop, chunk_size=CHUNK_SIZE):
+        return iter_blob_chunks(info.handle, start, stop, chunk_size)
+
+    def read(self, bucket_name, blob_name):
+        return get_file_from_gcs(bucket_name, blob_name)
+
+    def write(self, bucket_name, blob_name, data, content_type):
+        return upload_file_to_gcs(bucket_name, blob_name, content_type, data)
+
+    def write_stream(self, bucket_name, blob_name, file_obj, content_type):
+        return upload_stream_to_gcs(bucket_name, blob_name, content_type, file_obj)
+
+    def delete(self, bucket_name, blob_name):
+        delete_file_from_gcs(bucket_name, blob_name)
+
+    def get_signed_url(self, bucket_name, blob_name, expiration_seconds, content_type=None, download_name=None):
+        return get_signed_url_from_gcs(bucket_name, blob_name, expiration_seconds, content_type, download_name)
+
+
+class LocalBackend(StorageBackend):
+    """Depósito en un directorio del disco, cada bucket es un subdirectorio"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory).resolve()
+
+    def get_path(self, bucket_name: str, blob_name: str) -> Path:
+        """Ruta del archivo, no se permite salir del directorio"""
+        raiz = Path(self.directory, bucket_name).resolve()
+        path = Path(raiz, blob_name).resolve()
+        if not raiz.is_relative_to(self.directory) or not path.is_relative_to(raiz):
+            raise MyNotValidParamError("Not valid blob name")
+        return path
+
+    def get_info(self, bucket_name, blob_name):
+        path = self.get_path(bucket_name, blob_name)
+        try:
+            stat = path.stat()
+        except FileNotFoundError as error:
+            raise MyFileNotFoundError("File not found") from error
+        return BlobInfo(
+            name=blob_name,
+            size=stat.st_size,
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            updated=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            generation=stat.st_mtime_ns,
+            handle=path,
+        )
+
+    def iter_chunks(self, bucket_name, info, start, stop, chunk_size=CHUNK_SIZE):
+        try:
+            archivo = open(info.handle, "rb")
+        except FileNotFoundError as error:
+            raise MyFileNotFoundError("File not found") from error
+        return iter_mmap_chunks(archivo, start, stop, chunk_size)
+
+    def read(self, bucket_name, blob_name):
+        info = self.get_info(bucket_name, blob_name)
+        return b"".join(self.iter_chunks(bucket_name, info, 0, info.size, chunk_size=max(info.size, 1)))
+
+    def write(self, bucket_name, blob_name, data, content_type):
+        return self.write_stream(bucket_name, blob_name, io.BytesIO(data), content_type)
+
+    def write_stream(self, bucket_name, blob_name, file_obj, content_type):
+        path = self.get_path(bucket_name, blob_name)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        except OSError as error:
+            raise MyUploadError("Error writing file") from error
+        # Copiar en partes a un temporal del mismo directorio y reemplazar, así nunca se lee un archivo a medias
+        try:
+            with os.fdopen(descriptor, "wb") as archivo:
+                shutil.copyfileobj(file_obj, archivo, CHUNK_SIZE)
+            os.replace(temporal, path)
+        except OSError as error:
+            Path(temporal).unlink(missing_ok=True)
+            raise MyUploadError("Error writing file") from error
+        return self.public_url(bucket_name, blob_name)
+
+    def delete(self, bucket_name, blob_name):
+        self.get_path(bucket_name, blob_name).unlink(missing_ok=True)
+
+
+class MemoryBackend(StorageBackend):
+    """Depósito en la memoria del proceso"""
+
+    def __init__(self):
+        self.blobs = {}
+        self.lock = threading.Lock()
+
+    def get_info(self, bucket_name, blob_name):
+        with self.lock:
+            try:
+                contenido, actualizado, generacion = self.blobs[(bucket_name, blob_name)]
+            except KeyError as error:
+                raise MyFileNotFoundError("File not found") from error
+        return BlobInfo(
+            name=blob_name,
+            size=len(contenido),
+            etag=hashlib.md5(contenido).hexdigest(),
+            updated=actualizado,
+            generation=generacion,
+            handle=contenido,
+        )
+
+    def iter_chunks(self, bucket_name, info, start, stop, chunk_size=CHUNK_SIZE):
+        contenido = memoryview(info.handle)
+        for posicion in range(start, stop, chunk_size):
+            yield bytes(contenido[posicion : min(posicion + chunk_size, stop)])
+
+    def read(self, bucket_name, blob_name):
+        return self.get_info(bucket_name, blob_name).handle
+
+    def write(self, bucket_name, blob_name, data, content_type):
+        with self.lock:
+            self.blobs[(bucket_name, blob_name)] = (bytes(data), datetime.now(timezone.utc), time.time_ns())
+        return self.public_url(bucket_name, blob_name)
+
+    def write_stream(self, bucket_name, blob_name, file_obj, content_type):
+        return self.write(bucket_name, blob_name, file_obj.read(), content_type)  # En memoria queda completo
+
+    def delete(self, bucket_name, blob_name):
+        with self.lock:
+            self.blobs.pop((bucket_name, blob_name), None)
+
+
+class CachedBackend(StorageBackend):
+    """Cache en el disco delante de otro depósito, compartido entre los workers del mismo nodo"""
+
+    def __init__(self, origin: StorageBackend, directory: str, max_bytes: int):
+        self.origin = origin
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_bytes // 4  # Un archivo no puede ocupar más de la cuarta parte
+        self.can_sign = origin.can_sign
+        self.lock = threading.Lock()
+        self.infos = {}
+        self.cached_bytes = 0  # Ocupado según la última revisión más lo guardado después por este proceso
+        self.evicted_at = None  # Hora de la última revisión, None para revisar al guardar el primero
+        self.evicting = False
+
+    def get_cache_path(self, bucket_name: str, info: BlobInfo) -> Path:
+        """Ruta del archivo en el cache"""
+        llave = hashlib.sha256(f"{bucket_name}/{info.name}".encode("utf-8")).hexdigest()
+        return self.directory / llave[:2] / f"{llave}-{info.generation}"
+
+    def get_info(self, bucket_name, blob_name):
+        ahora = time.monotonic()
+        with self.lock:
+            guardado = self.infos.get((bucket_name, blob_name))
+        if guardado is not None and guardado[0] > ahora:
+            return guardado[1]
+        info = self.origin.get_info(bucket_name, blob_name)
+        with self.lock:
+            self.infos.pop((bucket_name, blob_name), None)
+            if len(self.infos) >= CACHE_INFO_MAX:
+                del self.infos[next(iter(self.infos))]  # El más antiguo, el diccionario conserva el orden de inserción
+            self.infos[(bucket_name, blob_name)] = (ahora + CACHE_INFO_TTL, info)
+        return info
+
+    def forget_info(self, bucket_name: str, blob_name: str) -> None:
+        """Olvidar los metadatos en memoria de un archivo"""
+        with self.lock:
+            self.infos.pop((bucket_name, blob_name), None)
+
+    def iter_chunks(self, bucket_name, info, start, stop, chunk_size=CHUNK_SIZE):
+        path = self.get_cache_path(bucket_name, info)
+        try:
+            archivo = open(path, "rb")
+        except FileNotFoundError:
+            archivo = None
+        if archivo is not None:
+            try:
+                os.utime(path)  # Marcar el último uso
+            except FileNotFoundError:
+                pass  # Otro worker lo desalojó, pero ya está abierto
+            return iter_mmap_chunks(archivo, start, stop, chunk_size)
+        # Solo se guarda al entregar el archivo completo, los rangos se piden al depósito
+        if start == 0 and stop == info.size and info.size <= self.max_file_bytes:
+            return self.iter_and_store(bucket_name, info, path, chunk_size)
+        return self.origin.iter_chunks(bucket_name, info, start, stop, chunk_size)
+
+    def iter_and_store(self, bucket_name: str, info: BlobInfo, path: Path, chunk_size: int):
+        """Entregar las partes del depósito y a la vez guardarlas en el cache"""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+            archivo = os.fdopen(descriptor, "wb")
+        except OSError:
+            yield from self.origin.iter_chunks(bucket_name, info, 0, info.size, chunk_size)
+            return
+        try:
+            for parte in self.origin.iter_chunks(bucket_name, info, 0, info.size, chunk_size):
+                if archivo is not None:
+                    try:
+                        archivo.write(parte)
+                    except OSError:
+                        archivo.close()
+                        archivo = None  # Si no se puede escribir, se sigue entregando sin guardar
+                yield parte
+            if archivo is not None:
+                archivo.close()
+                os.replace(temporal, path)
+                archivo = None
+                self.stored(info.size)
+        finally:
+            if archivo is not None:
+                archivo.close()
+            Path(temporal).unlink(missing_ok=True)
+
+    def stored(self, size: int) -> None:
+        """Sumar lo guardado y revisar el directorio solo si pasa del máximo o ya toca, un hilo a la vez"""
+        with self.lock:
+            self.cached_bytes += size
+            toca = self.evicted_at is None or time.monotonic() - self.evicted_at >= CACHE_EVICT_INTERVAL
+            if self.evicting or (self.cached_bytes <= self.max_bytes and not toca):
+                return
+            self.evicting = True
+        try:
+            total = self.evict()
+        finally:
+            with self.lock:
+                self.evicting = False
+        with self.lock:
+            self.cached_bytes = total
+            self.evicted_at = time.monotonic()
+
+    def evict(self) -> int:
+        """Si el cache pasa del máximo, borrar los archivos menos usados, entrega lo que queda ocupado"""
+        archivos = []
+        total = 0
+        for path in self.directory.glob("*/*"):
+            if path.name.startswith("."):
+                continue  # Temporales que se están escribiendo
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Otro worker lo borró
+            archivos.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return total
+        for _, tamano, path in sorted(archivos):
+            path.unlink(missing_ok=True)  # Quien lo tenga abierto lo termina de leer
+            total -= tamano
+            if total <= self.max_bytes * CACHE_LOW_WATER:
+                break
+        return total
+
+    def read(self, bucket_name, blob_name):
+        info = self.get_info(bucket_name, blob_name)
+        return b"".join(self.iter_chunks(bucket_name, info, 0, info.size))
+
+    def write(self, bucket_name, blob_name, data, content_type):
+        url = self.origin.write(bucket_name, blob_name, data, content_type)
+        self.forget_info(bucket_name, blob_name)
+        return url
+
+    def write_stream(self, bucket_name, blob_name, file_obj, content_type):
+        url = self.origin.write_stream(bucket_name, blob_name, file_obj, content_type)
+        self.forget_info(bucket_name, blob_name)
+        return url
+
+    def delete(self, bucket_name, blob_name):
+        self.origin.delete(bucket_name, blob_name)
+        self.forget_info(bucket_name, blob_name)
+
+    def get_signed_url(self, bucket_name, blob_name, expiration_seconds, content_type=None, download_name=None):
+        return self.origin.get_signed_url(bucket_name, blob_name, expiration_seconds, content_type, download_name)
+
+
+def get_storage_backend() -> StorageBackend:
+    """Entregar el depósito configurado, se crea uno por proceso"""
+    tipo = current_app.config.get("CLOUD_STORAGE_BACKEND", "GCS").upper()
+    directorio = current_app.config.get("CLOUD_STORAGE_LOCAL_DIRECTORIO", "")
+    cache_directorio = current_app.config.get("CLOUD_STORAGE_CACHE_DIRECTORIO", "")
+    cache_max_mb = current_app.config.get("CLOUD_STORAGE_CACHE_MAX_MB", 0)
+    llave = (tipo, directorio, cache_directorio, cache_max_mb)
+    backend = storage_backends.get(llave)
+    if backend is not None:
+        return backend
+    if tipo == "GCS":
+        backend = GCSBackend()
+    elif tipo == "LOCAL":
+        if directorio == "":
+            raise MyMissingConfigurationError("Falta CLOUD_STORAGE_LOCAL_DIRECTORIO para el depósito LOCAL")
+        backend = LocalBackend(directorio)
+    elif tipo == "MEMORIA":
+        backend = MemoryBackend()
+    else:
+        raise MyMissingConfigurationError(f"CLOUD_STORAGE_BACKEND no válido: {tipo}")
+    if cache_directorio != "" and cache_max_mb > 0:
+        backend = CachedBackend(backend, cache_directorio, cache_max_mb * 1024 * 1024)
+    storage_backends[llave] = backend
+    return backend
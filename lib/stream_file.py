@@ -0,0 +1,94 @@
+"""
+Stream File
+
+Entregar archivos en partes con un generador, sin cargarlos completos en la memoria del worker.
+
+- Soporta peticiones Range, para que los visores de PDF de los navegadores pidan las páginas conforme las necesitan
+- Entrega ETag y Last-Modified, y contesta 304 a las peticiones condicionales sin descargar el archivo
+
+Con CLOUD_STORAGE_ENTREGA en FIRMADO se redirige a un URL firmado V4 de corta vigencia,
+así los bytes no pasan por los workers. Los depósitos que no firman (LOCAL, MEMORIA) entregan en partes.
+"""
+
+from datetime import datetime
+
+from flask import current_app, redirect, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import is_resource_modified
+
+from lib.storage_backends import get_storage_backend
+
+ENTREGA_FIRMADO = "FIRMADO"
+
+
+def if_range_matches(etag: str, last_modified: datetime) -> bool:
+    """¿El encabezado If-Range coincide con la versión del archivo? Si no viene, se considera que sí"""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return last_modified is not None and if_range.date >= last_modified.replace(microsecond=0)
+    return True
+
+
+def stream_file_response(size: int, etag: str, last_modified: datetime, mimetype: str, read_range, download_name: str = None):
+    """Elaborar la respuesta en partes, read_range(inicio, fin) entrega un generador de bytes"""
+    response = current_app.response_class(mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.accept_ranges = "bytes"
+    if download_name is not None:
+        response.headers.set("Content-Disposition", "attachment", filename=download_name)
+
+    # Si el navegador ya tiene esta versión, contestar 304 sin descargar
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response.status_code = 304
+        return response
+
+    # Por defecto se entrega completo, con Range solo la parte solicitada (no se soportan varios rangos)
+    start, stop = 0, size
+    if request.range is not None and len(request.range.ranges) == 1 and if_range_matches(etag, last_modified):
+        rango = request.range.range_for_length(size)
+        if rango is None:
+            response.status_code = 416
+            response.content_range = ContentRange("bytes", None, None, size)
+            return response
+        start, stop = rango
+        response.status_code = 206
+        response.content_range = ContentRange("bytes", start, stop, size)
+
+    # Entregar con un generador, en HEAD no se consume
+    response.response = read_range(start, stop)
+    response.content_length = stop - start
+    return response
+
+
+def send_file_from_storage(bucket_name: str, blob_name: str, mimetype: str, download_name: str = None):
+    """Entregar un archivo del depósito en partes, solo se consultan sus metadatos antes de responder"""
+    backend = get_storage_backend()
+    info = backend.get_info(bucket_name, blob_name)
+    return stream_file_response(
+        size=info.size,
+        etag=info.etag,
+        last_modified=info.updated,
+        mimetype=mimetype,
+        read_range=lambda start, stop: backend.iter_chunks(bucket_name, info, start, stop),
+        download_name=download_name,
+    )
+
+
+def deliver_file_from_storage(bucket_name: str, blob_name: str, mimetype: str, download_name: str = None):
+    """Entregar un archivo del depósito según CLOUD_STORAGE_ENTREGA, redirigiendo a un URL firmado o en partes"""
+    backend = get_storage_backend()
+    if current_app.config.get("CLOUD_STORAGE_ENTREGA", "").upper() != ENTREGA_FIRMADO or not backend.can_sign:
+        return send_file_from_storage(bucket_name, blob_name, mimetype, download_name)
+    url = backend.get_signed_url(
+        bucket_name=bucket_name,
+        blob_name=blob_name,
+        expiration_seconds=current_app.config["CLOUD_STORAGE_URL_FIRMADO_SEGUNDOS"],
+        content_type=mimetype,
+        download_name=download_name,
+    )
+    response = redirect(url)
+    response.cache_control.no_store = True  # El URL firmado caduca, no debe guardarse la redirección
+    return response
@@ -0,0 +1,50 @@
+"""
+Unit of Work
+
+Agrupa varios save(), delete() y recover() en una sola transacción con un solo commit.
+
+    with unit_of_work():
+        edicto.save()
+        for fecha in fechas:
+            EdictoAcuse(edicto=edicto, fecha=fecha).save()
+        bitacora.save()
+
+- Dentro del bloque los métodos del UniversalMixin solo agregan a la sesión, no confirman
+- Use database.session.flush() si necesita un id antes de salir del bloque
+- Al salir sin errores se hace un solo commit, si hay una excepción se hace rollback
+- Los bloques se pueden anidar, solo el exterior confirma o revierte
+- Con unit_of_work(commit=False) al salir se hace rollback, sirve para probar sin cambiar la base de datos
+- La sesión de Flask-SQLAlchemy es por contexto de aplicación, así que el bloque vale para la petición o la tarea
+"""
+
+from contextlib import contextmanager
+
+from portal_notarias.extensions import database
+
+UNIT_OF_WORK_PROFUNDIDAD = "unit_of_work_profundidad"
+
+
+def in_unit_of_work() -> bool:
+    """Verdadero si hay un bloque unit_of_work abierto en la sesión"""
+    return database.session.info.get(UNIT_OF_WORK_PROFUNDIDAD, 0) > 0
+
+
+@contextmanager
+def unit_of_work(commit: bool = True):
+    """Abrir un bloque de trabajo que confirma una sola vez al salir"""
+    session = database.session
+    profundidad = session.info.get(UNIT_OF_WORK_PROFUNDIDAD, 0)
+    session.info[UNIT_OF_WORK_PROFUNDIDAD] = profundidad + 1
+    try:
+        yield session
+    except BaseException:
+        session.info[UNIT_OF_WORK_PROFUNDIDAD] = profundidad
+        if profundidad == 0:
+            session.rollback()
+        raise
+    session.info[UNIT_OF_WORK_PROFUNDIDAD] = profundidad
+    if profundidad == 0:
+        if commit:
+            session.commit()
+        else:
+            session.rollback()
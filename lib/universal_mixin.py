@@ -10,6 +10,7 @@ from sqlalchemy.sql.functions import now
 from sqlalchemy.types import CHAR
 
 from config.settings import get_settings
+from lib.unit_of_work import in_unit_of_work
 from portal_notarias.extensions import database
 
 settings = get_settings()
@@ -23,25 +24,26 @@ class UniversalMixin:
     modificado: Mapped[datetime] = mapped_column(default=now(), onupdate=now(), server_default=now())
     estatus: Mapped[str] = mapped_column(CHAR, default="A", server_default="A")
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """Eliminar registro"""
         # Borrado lógico: Cambiar a estatus B de Borrado
         if self.estatus == "A":
             self.estatus = "B"
-            return self.save()
+            return self.save(commit)
         return None
 
-    def recover(self):
+    def recover(self, commit: bool = True):
         """Recuperar registro"""
         if self.estatus == "B":
             self.estatus = "A"
-            return self.save()
+            return self.save(commit)
         return None
 
-    def save(self):
-        """Guardar registro"""
+    def save(self, commit: bool = True):
+        """Guardar registro, con commit=False o dentro de unit_of_work() solo se agrega a la sesión"""
         database.session.add(self)
-        database.session.commit()
+        if commit and not in_unit_of_work():
+            database.session.commit()
         return self
 
     def encode_id(self) -> str:
@@ -7,6 +7,7 @@ from flask import Flask
 from redis import Redis
 
 from config.settings import Settings
+from lib.fragment_cache import FragmentCacheExtension
 from portal_notarias.blueprints.autoridades.views import autoridades
 from portal_notarias.blueprints.bitacoras.views import bitacoras
 from portal_notarias.blueprints.distritos.views import distritos
@@ -36,6 +37,9 @@ def create_app():
     app.redis = Redis.from_url(app.config["REDIS_URL"])
     app.task_queue = rq.Queue(app.config["TASK_QUEUE"], connection=app.redis, default_timeout=3000)
 
+    # Cache de fragmentos de las plantillas en Redis
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
     # Registrar blueprints
     app.register_blueprint(autoridades)
     app.register_blueprint(bitacoras)
@@ -76,4 +80,4 @@ def authentication(user_model):
 
     @login_manager.user_loader
     def load_user(uid):
-        return user_model.query.get(uid)
+        return user_model.load_user(uid)
@@ -0,0 +1,55 @@
+"""
+Autoridades, instantánea en memoria
+
+Las autoridades son pocas y casi no cambian, cada proceso las carga una vez y las consulta en memoria.
+Al cambiar una autoridad se incrementa su versión en Redis, ver lib/reference_cache.py
+"""
+
+from lib.reference_cache import ReferenceCache
+from portal_notarias.blueprints.autoridades.models import Autoridad
+
+autoridades_referencia = ReferenceCache(
+    Autoridad,
+    (
+        "id",
+        "distrito_id",
+        "clave",
+        "descripcion",
+        "descripcion_corta",
+        "es_archivo_solicitante",
+        "es_cemasc",
+        "es_defensoria",
+        "es_extinto",
+        "es_jurisdiccional",
+        "es_notaria",
+        "es_organo_especializado",
+        "es_revisor_escrituras",
+        "estatus",
+    ),
+    unicos=("clave",),
+    buscables=("clave",),
+)
+
+
+def get_autoridad(autoridad_id: int):
+    """Entregar la autoridad como dict por su id, o None si no existe"""
+    return autoridades_referencia.get(autoridad_id)
+
+
+def get_autoridad_por_clave(clave: str):
+    """Entregar la autoridad como dict por su clave, o None si no existe"""
+    return autoridades_referencia.get_por("clave", clave)
+
+
+def buscar_autoridades(clave: str = "") -> list:
+    """Entregar las autoridades activas cuya clave contiene el texto, ordenadas por id"""
+    return [autoridad for autoridad in autoridades_referencia.buscar("clave", clave) if autoridad["estatus"] == "A"]
+
+
+def get_autoridades_del_distrito(distrito_id: int) -> list:
+    """Entregar las autoridades activas de un distrito, ordenadas por id"""
+    return [
+        autoridad
+        for autoridad in autoridades_referencia.get_todos().values()
+        if autoridad["distrito_id"] == distrito_id and autoridad["estatus"] == "A"
+    ]
@@ -7,8 +7,9 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import eager_load_datatable, get_datatable_parameters, get_datatable_total, output_datatable_json
 from lib.safe_string import safe_clave, safe_message, safe_string
+from portal_notarias.blueprints.autoridades.cache import buscar_autoridades, get_autoridades_del_distrito
 from portal_notarias.blueprints.autoridades.models import Autoridad
 from portal_notarias.blueprints.distritos.models import Distrito
 from portal_notarias.blueprints.permisos.models import Permiso
@@ -57,8 +58,10 @@ def datatable_json():
         if distrito_nombre != "":
             consulta = consulta.join(Distrito).filter(Distrito.nombre.contains(distrito_nombre))
     # Ordenar y paginar
-    registros = consulta.order_by(Autoridad.clave).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = (
+        eager_load_datatable(consulta, Autoridad.distrito).order_by(Autoridad.clave).offset(start).limit(rows_per_page).all()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -75,7 +78,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @autoridades.route("/autoridades")
@@ -111,49 +114,31 @@ def detail(autoridad_id):
 @autoridades.route("/autoridades/select_json/<int:distrito_id>", methods=["GET", "POST"])
 def query_autoridades_json(distrito_id):
     """Proporcionar el JSON de autoridades para elegir con un Select"""
-    # Consultar
-    consulta = Autoridad.query.filter_by(estatus="A").filter_by(distrito_id=distrito_id)
-    # Si viene es_archivo_solicitante como parametro en el URL como true o false
-    if "es_archivo_solicitante" in request.args:
-        es_archivo_solicitante = request.args["es_archivo_solicitante"] == "true"
-        consulta = consulta.filter_by(es_archivo_solicitante=es_archivo_solicitante)
-    # Si viene es_cemasc como parametro en el URL como true o false
-    if "es_cemasc" in request.args:
-        es_cemasc = request.args["es_cemasc"] == "true"
-        consulta = consulta.filter_by(es_cemasc=es_cemasc)
-    # Si viene es_defensoria como parametro en el URL como true o false
-    if "es_defensoria" in request.args:
-        es_defensoria = request.args["es_defensoria"] == "true"
-        consulta = consulta.filter_by(es_defensoria=es_defensoria)
-    # Si viene es_extinto como parametro en el URL como true o false
-    if "es_extinto" in request.args:
-        es_extinto = request.args["es_extinto"] == "true"
-        consulta = consulta.filter_by(es_extinto=es_extinto)
-    # Si viene es_jurisdiccional como parametro en el URL como true o false
-    if "es_jurisdiccional" in request.args:
-        es_jurisdiccional = request.args["es_jurisdiccional"] == "true"
-        consulta = consulta.filter_by(es_jurisdiccional=es_jurisdiccional)
-    # Si viene es_notaria como parametro en el URL como true o false
-    if "es_notaria" in request.args:
-        es_notaria = request.args["es_notaria"] == "true"
-        consulta = consulta.filter_by(es_notaria=es_notaria)
-    # Si viene es_revisor_escrituras como parametro en el URL como true o false
-    if "es_revisor_escrituras" in request.args:
-        es_revisor_escrituras = request.args["es_revisor_escrituras"] == "true"
-        consulta = consulta.filter_by(es_revisor_escrituras=es_revisor_escrituras)
-    # Si viene es_organo_especializado como parametro en el URL como true o false
-    if "es_organo_especializado" in request.args:
-        es_organo_especializado = request.args["es_organo_especializado"] == "true"
-        consulta = consulta.filter_by(es_organo_especializado=es_organo_especializado)
+    # Consultar en la instantánea en memoria
+    consulta = get_autoridades_del_distrito(distrito_id)
+    # Si vienen las banderas como parametros en el URL como true o false, filtrar
+    for bandera in (
+        "es_archivo_solicitante",
+        "es_cemasc",
+        "es_defensoria",
+        "es_extinto",
+        "es_jurisdiccional",
+        "es_notaria",
+        "es_revisor_escrituras",
+        "es_organo_especializado",
+    ):
+        if bandera in request.args:
+            valor = request.args[bandera] == "true"
+            consulta = [autoridad for autoridad in consulta if autoridad[bandera] == valor]
     # Ordenar
-    consulta = consulta.order_by(Autoridad.descripcion_corta)
+    consulta = sorted(consulta, key=lambda autoridad: autoridad["descripcion_corta"])
     # Elaborar datos para Select
     data = []
-    for resultado in consulta.all():
+    for autoridad in consulta:
         data.append(
             {
-                "id": resultado.id,
-                "descripcion_corta": resultado.descripcion_corta,
+                "id": autoridad["id"],
+                "descripcion_corta": autoridad["descripcion_corta"],
             }
         )
     # Entregar JSON
@@ -163,24 +148,19 @@ def query_autoridades_json(distrito_id):
 @autoridades.route("/autoridades/select_json", methods=["GET", "POST"])
 def select_autoridades_json():
     """Proporcionar el JSON de autoridades para elegir con un Select"""
-    # Consultar
-    consulta = Autoridad.query.filter(Autoridad.estatus == "A")
-    if "es_archivo_solicitante" in request.form:
-        consulta = consulta.filter_by(es_archivo_solicitante=request.form["es_archivo_solicitante"] == "true")
-    if "es_extinto" in request.form:
-        consulta = consulta.filter_by(es_extinto=request.form["es_extinto"] == "true")
-    if "es_jurisdiccional" in request.form:
-        consulta = consulta.filter_by(es_jurisdiccional=request.form["es_jurisdiccional"] == "true")
-    if "clave" in request.form:
-        clave = safe_clave(request.form["clave"])
-        if clave != "":
-            consulta = consulta.filter(Autoridad.clave.contains(clave))
+    # Buscar la clave en el índice de la instantánea en memoria
+    clave = safe_clave(request.form["clave"]) if "clave" in request.form else ""
+    consulta = buscar_autoridades(clave)
+    for bandera in ("es_archivo_solicitante", "es_extinto", "es_jurisdiccional"):
+        if bandera in request.form:
+            valor = request.form[bandera] == "true"
+            consulta = [autoridad for autoridad in consulta if autoridad[bandera] == valor]
     results = []
-    for autoridad in consulta.order_by(Autoridad.id).limit(15).all():
+    for autoridad in consulta[:15]:
         results.append(
             {
-                "id": autoridad.id,
-                "text": autoridad.clave + "  : " + autoridad.descripcion_corta,
+                "id": autoridad["id"],
+                "text": autoridad["clave"] + "  : " + autoridad["descripcion_corta"],
             }
         )
     return {"results": results, "pagination": {"more": False}}
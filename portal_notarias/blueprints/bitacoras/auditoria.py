@@ -0,0 +1,226 @@
+"""
+Bitácoras, auditoría en el fondo
+
+Con AUDITORIA_EN_EL_FONDO las bitácoras y las entradas-salidas no se insertan en la petición:
+se agregan como eventos al stream de Redis AUDITORIA_STREAM y un consumidor los inserta por lotes
+con INSERT de varios renglones. Ejecute el consumidor con
+
+    cli bitacoras consumir
+
+- Dentro de unit_of_work() los eventos se envían al confirmar la transacción y se descartan si se revierte
+- El orden del stream se conserva al insertar y creado es la hora del evento, no la de la inserción
+- creado viaja en UTC y la base de datos lo convierte como convierte now(), igual que UniversalMixin.creado
+- El consumidor confirma (XACK) después del commit, si se cae vuelve a tomar sus pendientes (XCLAIM)
+- Si un lote falla se inserta de uno en uno, los eventos que fallan quedan pendientes
+- Un pendiente entregado AUDITORIA_INTENTOS veces pasa al stream AUDITORIA_MUERTOS y deja de bloquear,
+  revíselo y regréselo con cli bitacoras reprocesar
+- Si Redis no responde al enviar, los eventos se insertan en ese momento, no se pierden
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import bindparam, cast, event, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TIMESTAMP
+
+from lib.unit_of_work import in_unit_of_work
+from portal_notarias.blueprints.bitacoras.models import Bitacora
+from portal_notarias.blueprints.entradas_salidas.models import EntradaSalida
+from portal_notarias.extensions import database
+
+bitacora = logging.getLogger(__name__)
+
+AUDITORIA_STREAM = "auditoria"
+AUDITORIA_GRUPO = "auditoria"
+AUDITORIA_STREAM_MAXLEN = 100000
+AUDITORIA_MUERTOS = "auditoria:muertos"
+AUDITORIA_INTENTOS = 5
+
+# Errores de un evento en particular, no de la conexión, al insertarlo de uno en uno se aíslan
+AUDITORIA_ERRORES_EVENTO = (DataError, IntegrityError, KeyError, TypeError, ValueError)
+
+# Columnas que viajan en cada evento, por tabla
+AUDITORIA_COLUMNAS = {
+    Bitacora.__tablename__: ("modulo_id", "usuario_id", "descripcion", "url"),
+    EntradaSalida.__tablename__: ("usuario_id", "tipo", "direccion_ip"),
+}
+AUDITORIA_TABLAS = {
+    Bitacora.__tablename__: Bitacora.__table__,
+    EntradaSalida.__tablename__: EntradaSalida.__table__,
+}
+
+
+def evento_de(registro) -> dict:
+    """Convertir una Bitacora o una EntradaSalida sin guardar en un evento"""
+    evento = {"tabla": registro.__tablename__, "creado": datetime.now(timezone.utc).isoformat()}
+    for columna in AUDITORIA_COLUMNAS[registro.__tablename__]:
+        valor = getattr(registro, columna)
+        if valor is None and columna.endswith("_id"):
+            relacionado = getattr(registro, columna[:-3])  # Por ejemplo modulo para modulo_id
+            valor = relacionado.id if relacionado is not None else None
+        evento[columna] = valor
+    return evento
+
+
+def creado_utc(evento: dict) -> datetime:
+    """Hora del evento en UTC, los eventos anteriores sin zona horaria son de la hora local"""
+    return datetime.fromisoformat(evento["creado"]).astimezone(timezone.utc)
+
+
+def insertar_eventos(eventos: list, conexion) -> None:
+    """Insertar los eventos con un INSERT de varios renglones por tabla, en el orden en que llegaron"""
+    es_postgresql = conexion.dialect.name == "postgresql"
+    if es_postgresql:
+        # Un timestamptz asignado a la columna queda en la zona horaria de la sesión, como now()
+        creado = cast(bindparam("creado_utc"), TIMESTAMP(timezone=True))
+    else:
+        # SQLite guarda now() como CURRENT_TIMESTAMP, en UTC sin zona horaria
+        creado = bindparam("creado_utc")
+    for tabla, columnas in AUDITORIA_COLUMNAS.items():
+        renglones = [
+            {
+                **{columna: evento[columna] for columna in columnas},
+                "creado_utc": creado_utc(evento) if es_postgresql else creado_utc(evento).replace(tzinfo=None),
+            }
+            for evento in eventos
+            if evento["tabla"] == tabla
+        ]
+        if renglones:
+            conexion.execute(insert(AUDITORIA_TABLAS[tabla]).values(creado=creado), renglones)
+
+
+def enviar_eventos(eventos: list) -> None:
+    """Agregar los eventos al stream, si Redis no responde insertarlos de inmediato"""
+    try:
+        tuberia = current_app.redis.pipeline()
+        for evento in eventos:
+            tuberia.xadd(AUDITORIA_STREAM, {"evento": json.dumps(evento)}, maxlen=AUDITORIA_STREAM_MAXLEN, approximate=True)
+        tuberia.execute()
+    except RedisError:
+        with database.engine.begin() as conexion:
+            insertar_eventos(eventos, conexion)
+
+
+def registrar_auditoria(registro):
+    """Guardar una Bitacora o una EntradaSalida, en el fondo si AUDITORIA_EN_EL_FONDO es verdadero"""
+    if not current_app.config.get("AUDITORIA_EN_EL_FONDO", False):
+        return registro.save()
+    evento = evento_de(registro)
+    if in_unit_of_work():
+        # Sin transacción iniciada el rollback no emite after_rollback y los eventos se enviarían en el siguiente commit
+        session = database.session()
+        if not session.in_transaction():
+            session.begin()
+        session.info.setdefault("auditoria_eventos", []).append(evento)
+    else:
+        enviar_eventos([evento])
+    return registro
+
+
+def crear_grupo_auditoria() -> None:
+    """Crear el grupo de consumidores y el stream si no existen, se llama una vez al iniciar el consumidor"""
+    try:
+        current_app.redis.xgroup_create(AUDITORIA_STREAM, AUDITORIA_GRUPO, id="0", mkstream=True)
+    except ResponseError:
+        pass  # El grupo ya existe
+
+
+def confirmar_mensajes(identificadores: list) -> None:
+    """Confirmar y quitar los mensajes del stream"""
+    if identificadores:
+        current_app.redis.xack(AUDITORIA_STREAM, AUDITORIA_GRUPO, *identificadores)
+        current_app.redis.xdel(AUDITORIA_STREAM, *identificadores)
+
+
+def mover_a_muertos(identificadores: list) -> None:
+    """Copiar los mensajes al stream de muertos y quitarlos del stream, para que dejen de bloquear"""
+    redis = current_app.redis
+    for identificador in identificadores:
+        for _, campos in redis.xrange(AUDITORIA_STREAM, identificador, identificador):
+            redis.xadd(AUDITORIA_MUERTOS, {**campos, "id": identificador})
+        bitacora.error("Evento de auditoría %s movido a %s", identificador, AUDITORIA_MUERTOS)
+    confirmar_mensajes(identificadores)
+
+
+def tomar_pendientes(consumidor: str, lote: int) -> list:
+    """Tomar de nuevo los pendientes de este consumidor, cada XCLAIM cuenta una entrega más"""
+    redis = current_app.redis
+    pendientes = redis.xpending_range(AUDITORIA_STREAM, AUDITORIA_GRUPO, "-", "+", lote, consumername=consumidor)
+    muertos = [pendiente["message_id"] for pendiente in pendientes if pendiente["times_delivered"] >= AUDITORIA_INTENTOS]
+    mover_a_muertos(muertos)
+    reintentar = [pendiente["message_id"] for pendiente in pendientes if pendiente["times_delivered"] < AUDITORIA_INTENTOS]
+    if not reintentar:
+        return []
+    return redis.xclaim(AUDITORIA_STREAM, AUDITORIA_GRUPO, consumidor, 0, reintentar)
+
+
+def insertar_mensajes(mensajes: list) -> list:
+    """Insertar los eventos de los mensajes, entrega los identificadores insertados"""
+    if not mensajes:
+        return []
+    try:
+        with database.engine.begin() as conexion:
+            insertar_eventos([json.loads(campos[b"evento"]) for _, campos in mensajes], conexion)
+        return [identificador for identificador, _ in mensajes]
+    except AUDITORIA_ERRORES_EVENTO:
+        pass  # Algún evento falla, los errores de conexión sí se propagan
+    # Insertar de uno en uno, los que fallan quedan pendientes
+    insertados = []
+    for identificador, campos in mensajes:
+        try:
+            with database.engine.begin() as conexion:
+                insertar_eventos([json.loads(campos[b"evento"])], conexion)
+        except AUDITORIA_ERRORES_EVENTO as error:
+            bitacora.warning("Evento de auditoría %s no se pudo insertar: %s", identificador, error)
+            continue
+        insertados.append(identificador)
+    return insertados
+
+
+def consumir_auditoria(consumidor: str, lote: int = 500, bloquear_ms: int = 5000) -> int:
+    """Leer un lote del stream, insertarlo y confirmarlo, entrega los eventos procesados, con bloquear_ms None no espera"""
+    # Primero los pendientes de este consumidor, leídos pero no confirmados, después los nuevos
+    mensajes = tomar_pendientes(consumidor, lote)
+    if not mensajes:
+        respuesta = current_app.redis.xreadgroup(
+            AUDITORIA_GRUPO, consumidor, {AUDITORIA_STREAM: ">"}, count=lote, block=bloquear_ms
+        )
+        mensajes = respuesta[0][1] if respuesta else []
+    if not mensajes:
+        return 0
+
+    # Los pendientes que el recorte del stream (MAXLEN) ya borró llegan sin campos, solo se confirman
+    confirmar_mensajes([identificador for identificador, campos in mensajes if not campos])
+
+    # Insertar en una sola transacción y confirmar en el stream después del commit
+    confirmar_mensajes(insertar_mensajes([(identificador, campos) for identificador, campos in mensajes if campos]))
+    return len(mensajes)
+
+
+def reprocesar_muertos() -> int:
+    """Regresar los eventos del stream de muertos al stream de auditoría, entrega la cantidad"""
+    redis = current_app.redis
+    muertos = redis.xrange(AUDITORIA_MUERTOS)
+    for identificador, campos in muertos:
+        redis.xadd(AUDITORIA_STREAM, {"evento": campos[b"evento"]}, maxlen=AUDITORIA_STREAM_MAXLEN, approximate=True)
+        redis.xdel(AUDITORIA_MUERTOS, identificador)
+    return len(muertos)
+
+
+@event.listens_for(Session, "after_commit")
+def enviar_eventos_pendientes(session):
+    """Al confirmar la transacción, enviar los eventos de auditoría acumulados"""
+    eventos = session.info.pop("auditoria_eventos", [])
+    if eventos and has_app_context():
+        enviar_eventos(eventos)
+
+
+@event.listens_for(Session, "after_rollback")
+def descartar_eventos_pendientes(session):
+    """Al revertir la transacción, descartar los eventos de auditoría"""
+    session.info.pop("auditoria_eventos", None)
@@ -7,9 +7,7 @@ import os
 from datetime import datetime, timedelta
 
 import pytz
-import sendgrid
 from dotenv import load_dotenv
-from sendgrid.helpers.mail import Content, Email, Mail, To
 
 from lib.exceptions import MyAnyError, MyNotExistsError, MyNotValidParamError
 from lib.tasks import set_task_error, set_task_progress
@@ -92,7 +90,10 @@ def enviar_reporte_diario(modulo_nombre: str, to_email: str) -> str:
         logs.info(f"Se encontraron {len(bitacoras)} bitácoras del módulo {modulo_nombre} en las últimas 24 horas")
     contenido_html = "\n".join(contenidos)
 
-    # Enviar el e-mail
+    # Enviar el e-mail, SendGrid se importa hasta que se usa porque es lento de importar
+    import sendgrid
+    from sendgrid.helpers.mail import Content, Email, Mail, To
+
     send_grid = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
     remitente_email = Email(SENDGRID_FROM_EMAIL)
     destinatario_email = To(to_email)
@@ -7,7 +7,7 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import eager_load_datatable, get_datatable_parameters, get_datatable_total, output_datatable_json
 from lib.safe_string import safe_email, safe_string
 from portal_notarias.blueprints.bitacoras.models import Bitacora
 from portal_notarias.blueprints.modulos.models import Modulo
@@ -58,8 +58,14 @@ def datatable_json():
         except ValueError:
             pass
     # Ordenar y paginar
-    registros = consulta.order_by(Bitacora.id.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = (
+        eager_load_datatable(consulta, Bitacora.modulo, Bitacora.usuario)
+        .order_by(Bitacora.id.desc())
+        .offset(start)
+        .limit(rows_per_page)
+        .all()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -83,7 +89,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @bitacoras.route("/bitacoras")
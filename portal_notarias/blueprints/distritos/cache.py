@@ -0,0 +1,21 @@
+"""
+Distritos, instantánea en memoria
+
+Los distritos casi no cambian, cada proceso los carga una vez y los consulta en memoria.
+Al cambiar un distrito se incrementa su versión en Redis, ver lib/reference_cache.py
+"""
+
+from lib.reference_cache import ReferenceCache
+from portal_notarias.blueprints.distritos.models import Distrito
+
+distritos_referencia = ReferenceCache(
+    Distrito,
+    ("id", "clave", "nombre", "nombre_corto", "es_distrito_judicial", "es_distrito", "es_jurisdiccional", "estatus"),
+    unicos=("clave",),
+)
+
+
+def get_distritos_activos() -> list:
+    """Entregar los distritos activos ordenados por nombre"""
+    distritos = [distrito for distrito in distritos_referencia.get_todos().values() if distrito["estatus"] == "A"]
+    return sorted(distritos, key=lambda distrito: distrito["nombre"])
@@ -7,8 +7,9 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import get_datatable_parameters, get_datatable_total, output_datatable_json
 from lib.safe_string import safe_clave, safe_string
+from portal_notarias.blueprints.distritos.cache import get_distritos_activos
 from portal_notarias.blueprints.distritos.models import Distrito
 from portal_notarias.blueprints.permisos.models import Permiso
 from portal_notarias.blueprints.usuarios.decorators import permission_required
@@ -50,7 +51,7 @@ def datatable_json():
             consulta = consulta.filter(Distrito.nombre.contains(nombre))
     # Ordenar y paginar
     registros = consulta.order_by(Distrito.clave).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -67,7 +68,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @distritos.route("/distritos")
@@ -103,15 +104,13 @@ def detail(distrito_id):
 @distritos.route("/distritos/select_json", methods=["GET", "POST"])
 def query_distritos_json():
     """Proporcionar el JSON de distritos para elegir con un Select"""
-    # Consultar
-    consulta = Distrito.query.filter_by(estatus="A").order_by(Distrito.nombre)
-    # Elaborar datos para Select
+    # Elaborar datos para Select desde la instantánea en memoria
     data = []
-    for resultado in consulta.all():
+    for distrito in get_distritos_activos():
         data.append(
             {
-                "id": resultado.id,
-                "nombre": resultado.nombre,
+                "id": distrito["id"],
+                "nombre": distrito["nombre"],
             }
         )
     # Entregar JSON
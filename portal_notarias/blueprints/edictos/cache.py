@@ -0,0 +1,198 @@
+"""
+Edictos, cache de los edictos del día y de los acuses
+
+La página de inicio muestra los edictos activos del día, los propios y los de las demás autoridades.
+En lugar de consultarlos dos veces por cada usuario, se guarda en Redis un resumen del día con
+una sola consulta, con la llave edictos_dia:{generacion}:{fecha} por EDICTOS_DIA_CACHE_TTL segundos.
+
+- Al insertar, editar, eliminar o recuperar un edicto se borra la llave de su fecha
+- Al insertar o actualizar edictos en bloque (republicar) se incrementa la generación, lo que invalida todas
+- En ambos casos también se invalidan los fragmentos de plantillas del espacio "edictos"
+- Si Redis no responde se consulta la base de datos
+
+Los acuses (checkout y checkout_notaria) se guardan ya generados, con su ETag, en el hash acuses:{edicto_id}
+por ACUSES_CACHE_TTL segundos. Al cambiar el edicto o uno de sus acuses se borra ese hash.
+Como muestran la autoridad y su distrito, el campo del hash lleva las versiones de sus instantáneas
+(ver lib/reference_cache.py), al cambiar una autoridad o un distrito los acuses se generan de nuevo.
+
+Al confirmar cambios en edictos o acuses también se olvidan los conteos de sus listados (ver lib/datatables.py).
+"""
+
+import hashlib
+import json
+from datetime import date
+from itertools import chain
+
+from flask import Response, current_app, has_app_context, make_response, request
+from redis.exceptions import RedisError
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from lib.datatables import invalidate_datatable_totals
+from lib.fragment_cache import invalidate_fragments
+from portal_notarias.blueprints.autoridades.cache import autoridades_referencia
+from portal_notarias.blueprints.autoridades.models import Autoridad
+from portal_notarias.blueprints.distritos.cache import distritos_referencia
+from portal_notarias.blueprints.edictos.models import Edicto
+from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
+from portal_notarias.extensions import database
+
+EDICTOS_DIA_CACHE_TTL = 600  # Segundos
+EDICTOS_DIA_GENERACION_LLAVE = "edictos_dia:generacion"
+ACUSES_CACHE_TTL = 3600  # Segundos
+ACUSES_MAX_AGE = 300  # Segundos que el navegador reusa un acuse antes de revalidarlo con su ETag
+
+
+def consultar_edictos_dia(fecha: date) -> list:
+    """Consultar los edictos activos de la fecha con una sola consulta, como [id, descripcion, autoridad_id, clave]"""
+    renglones = database.session.execute(
+        select(Edicto.id, Edicto.descripcion, Edicto.autoridad_id, Autoridad.clave)
+        .join(Autoridad, Autoridad.id == Edicto.autoridad_id)
+        .where(Edicto.estatus == "A")
+        .where(Edicto.fecha == fecha)  # Sin date() para usar el índice (estatus, fecha, id)
+        .order_by(Edicto.descripcion)
+    ).all()
+    return [[renglon.id, renglon.descripcion, renglon.autoridad_id, renglon.clave] for renglon in renglones]
+
+
+def cache_llave(fecha: date) -> str:
+    """Llave en Redis con la generación vigente"""
+    generacion = current_app.redis.get(EDICTOS_DIA_GENERACION_LLAVE)
+    return f"edictos_dia:{int(generacion or 0)}:{fecha.isoformat()}"
+
+
+def get_edictos_dia(fecha: date) -> list:
+    """Entregar los edictos activos de la fecha desde Redis, o consultarlos y guardarlos"""
+    try:
+        llave = cache_llave(fecha)
+        guardado = current_app.redis.get(llave)
+        if guardado is not None:
+            return json.loads(guardado)
+    except RedisError:
+        return consultar_edictos_dia(fecha)
+    resultado = consultar_edictos_dia(fecha)
+    try:
+        current_app.redis.set(llave, json.dumps(resultado), ex=EDICTOS_DIA_CACHE_TTL)
+    except RedisError:
+        pass
+    return resultado
+
+
+def invalidate_edictos_dia(fecha: date = None) -> None:
+    """Invalidar los edictos de una fecha, o de todas si no se da la fecha"""
+    if not has_app_context():
+        return
+    try:
+        if fecha is None:
+            current_app.redis.incr(EDICTOS_DIA_GENERACION_LLAVE)
+        else:
+            current_app.redis.delete(cache_llave(fecha))
+    except RedisError:
+        pass
+
+
+def acuse_campo(edicto_acuse_id: int) -> str:
+    """Campo del hash con el id del acuse y las versiones de autoridades y distritos"""
+    versiones = current_app.redis.mget(autoridades_referencia.version_llave, distritos_referencia.version_llave)
+    return ":".join([str(edicto_acuse_id)] + [str(int(version or 0)) for version in versiones])
+
+
+def get_acuse(edicto_id: int, edicto_acuse_id: int = 0):
+    """Entregar el acuse ya generado como dict con etag y html, o None si no está en Redis"""
+    try:
+        guardado = current_app.redis.hget(f"acuses:{edicto_id}", acuse_campo(edicto_acuse_id))
+    except RedisError:
+        return None
+    if guardado is None:
+        return None
+    return json.loads(guardado)
+
+
+def set_acuse(edicto_id: int, edicto_acuse_id: int, etag: str, html: str) -> None:
+    """Guardar el acuse ya generado con su ETag"""
+    llave = f"acuses:{edicto_id}"
+    try:
+        current_app.redis.hset(llave, acuse_campo(edicto_acuse_id), json.dumps({"etag": etag, "html": html}))
+        current_app.redis.expire(llave, ACUSES_CACHE_TTL)
+    except RedisError:
+        pass
+
+
+def invalidate_acuses(edicto_id: int) -> None:
+    """Invalidar los acuses de un edicto"""
+    if not has_app_context():
+        return
+    try:
+        current_app.redis.delete(f"acuses:{edicto_id}")
+    except RedisError:
+        pass
+
+
+def entregar_acuse(edicto_id: int, edicto_acuse_id: int, generar) -> Response:
+    """Entregar el acuse desde el cache con su ETag, o generarlo, guardarlo y entregarlo"""
+    guardado = get_acuse(edicto_id, edicto_acuse_id)
+    if guardado is None:
+        guardado = generar()
+        set_acuse(edicto_id, edicto_acuse_id, guardado["etag"], guardado["html"])
+    respuesta = make_response(guardado["html"])
+    respuesta.set_etag(guardado["etag"])
+    respuesta.cache_control.private = True  # Requieren iniciar sesión, el CDN no debe compartirlos
+    respuesta.cache_control.max_age = ACUSES_MAX_AGE
+    return respuesta.make_conditional(request)
+
+
+def acuse_etag(html: str, *partes) -> str:
+    """ETag fuerte a partir de los ids, las fechas de modificación y el HTML generado"""
+    llave = ":".join(str(parte) for parte in partes)
+    return hashlib.sha256(f"{llave}:{html}".encode("utf-8")).hexdigest()[:32]
+
+
+@event.listens_for(Session, "after_flush")
+def recolectar_cambios_edictos(session, flush_context):
+    """Tomar nota de las fechas y los ids de los edictos que cambiaron, también por sus acuses"""
+    for registro in chain(session.new, session.dirty, session.deleted):
+        if isinstance(registro, Edicto):
+            if registro.fecha is not None:
+                session.info.setdefault("edictos_fechas", set()).add(registro.fecha)
+            if registro.id is not None:
+                session.info.setdefault("edictos_ids", set()).add(registro.id)
+        elif isinstance(registro, EdictoAcuse) and registro.edicto_id is not None:
+            session.info.setdefault("edictos_ids", set()).add(registro.edicto_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def recolectar_cambios_edictos_en_bloque(orm_execute_state):
+    """Tomar nota de los INSERT y UPDATE en bloque sobre edictos"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update:
+        tabla = getattr(orm_execute_state.statement, "table", None)
+        if tabla is not None and tabla.name == Edicto.__tablename__:
+            orm_execute_state.session.info["edictos_todos"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidar_cambios_edictos(session):
+    """Al confirmar la transacción, invalidar los edictos del día, los acuses afectados y los conteos de los listados"""
+    edictos_ids = session.info.pop("edictos_ids", set())
+    for edicto_id in edictos_ids:
+        invalidate_acuses(edicto_id)
+    fechas = session.info.pop("edictos_fechas", set())
+    todos = session.info.pop("edictos_todos", False)
+    if edictos_ids or fechas or todos:
+        invalidate_datatable_totals("edictos")
+        invalidate_datatable_totals("edictos_acuses")
+    if todos:
+        invalidate_edictos_dia()
+        invalidate_fragments("edictos")
+        return
+    if fechas:
+        invalidate_fragments("edictos")
+    for fecha in fechas:
+        invalidate_edictos_dia(fecha)
+
+
+@event.listens_for(Session, "after_rollback")
+def descartar_cambios_edictos(session):
+    """Al revertir la transacción, descartar las notas"""
+    session.info.pop("edictos_fechas", None)
+    session.info.pop("edictos_ids", None)
+    session.info.pop("edictos_todos", None)
@@ -4,9 +4,10 @@ Edictos, modelos
 
 from datetime import date
 
-from sqlalchemy import Date, ForeignKey, String
+from sqlalchemy import Date, ForeignKey, Index, String, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from lib.search import search_index
 from lib.universal_mixin import UniversalMixin
 from portal_notarias.extensions import database
 
@@ -17,6 +18,22 @@ class Edicto(database.Model, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "edictos"
 
+    # Índices compuestos para los filtros y la paginación por llave (fecha, id) de los listados, se crean con cli indices crear
+    __table_args__ = (
+        Index("edictos_estatus_fecha_id_idx", "estatus", "fecha", "id"),
+        Index("edictos_estatus_autoridad_id_fecha_id_idx", "estatus", "autoridad_id", "fecha", "id"),
+        # Llave de idempotencia de las republicaciones: un solo edicto activo por original y fecha,
+        # se crea con cli edictos crear-indice-republicaciones que antes da de baja los duplicados
+        Index(
+            "edictos_edicto_id_original_fecha_uidx",
+            "edicto_id_original",
+            "fecha",
+            unique=True,
+            postgresql_where=text("estatus = 'A' AND edicto_id_original > 0"),
+            sqlite_where=text("estatus = 'A' AND edicto_id_original > 0"),
+        ),
+    )
+
     # Clave primaria
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -39,6 +56,13 @@ class Edicto(database.Model, UniversalMixin):
     # Hijos
     edictos_acuses = relationship("EdictoAcuse", back_populates="edicto")
 
+    def cancelar(self, commit: bool = True):
+        """Dar de baja el edicto y sus acuses, también si estaba pendiente de subir su archivo"""
+        for edicto_acuse in self.edictos_acuses:
+            edicto_acuse.estatus = "B"
+        self.estatus = "B"
+        return self.save(commit)
+
     @property
     def descargar_url(self):
         """URL para descargar el archivo desde el sitio web"""
@@ -49,3 +73,8 @@ class Edicto(database.Model, UniversalMixin):
     def __repr__(self):
         """Representación"""
         return f"<Edicto {self.descripcion}>"
+
+
+# Índices de trigramas para las búsquedas de texto
+search_index("edictos_descripcion_trgm_idx", Edicto.descripcion)
+search_index("edictos_numero_publicacion_trgm_idx", Edicto.numero_publicacion)
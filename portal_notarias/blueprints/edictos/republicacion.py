@@ -0,0 +1,211 @@
+"""
+Edictos, republicación por conjuntos
+
+En lugar de consultar y guardar acuse por acuse, se hacen unas pocas consultas agrupadas
+y se insertan todos los edictos nuevos con un solo INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+republicar_edictos() no hace commit, debe llamarse dentro de unit_of_work() para que todo quede en una sola transacción.
+
+Para un rango de fechas el trabajo se reparte por autoridad: cada original pertenece a una sola autoridad,
+así que los trozos no comparten originales y dentro de cada uno las fechas se recorren en orden,
+lo que conserva los números de publicación. La llave de idempotencia (edicto_id_original, fecha)
+es un índice único parcial, dos procesos nunca pueden insertar la misma republicación,
+y con ON CONFLICT DO NOTHING la que ya existe simplemente se omite, sin consultarla antes.
+
+El índice no se puede crear mientras haya republicaciones duplicadas, las que dejó el código anterior.
+Para darlas de baja y crear el índice sin bloquear las escrituras ejecute
+
+    cli edictos crear-indice-republicaciones
+
+Mientras el índice no exista, ON CONFLICT no tiene contra qué comparar y PostgreSQL rechaza el INSERT,
+así que insertar_republicaciones() consulta antes las que ya existen, como lo hacía el código anterior.
+"""
+
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from lib.indexes import index_exists
+from lib.unit_of_work import unit_of_work
+from portal_notarias.blueprints.autoridades.models import Autoridad
+from portal_notarias.blueprints.edictos.models import Edicto
+from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
+from portal_notarias.extensions import database
+
+REPUBLICACIONES_INDICE = "edictos_edicto_id_original_fecha_uidx"
+
+# Una vez que el índice existe ya no se vuelve a consultar en este proceso
+republicaciones_indice = {"existe": False}
+
+
+def acuses_activos(desde: date, hasta: date):
+    """Consulta de los ids de los edictos con acuses activos en el rango de fechas"""
+    return (
+        select(EdictoAcuse.edicto_id)
+        .where(EdictoAcuse.fecha >= desde)
+        .where(EdictoAcuse.fecha <= hasta)
+        .where(EdictoAcuse.estatus == "A")
+    )
+
+
+def insert_republicaciones():
+    """INSERT de edictos que omite los que chocan con la llave de idempotencia (edicto_id_original, fecha)"""
+    dialecto = postgresql if database.session.get_bind().dialect.name == "postgresql" else sqlite
+    return dialecto.insert(Edicto).on_conflict_do_nothing(
+        index_elements=[Edicto.edicto_id_original, Edicto.fecha],
+        index_where=text("estatus = 'A' AND edicto_id_original > 0"),
+    )
+
+
+def republicaciones_indice_existe() -> bool:
+    """Verificar que existe el índice único que necesita ON CONFLICT"""
+    if not republicaciones_indice["existe"]:
+        republicaciones_indice["existe"] = index_exists(database.session.connection(), REPUBLICACIONES_INDICE)
+    return republicaciones_indice["existe"]
+
+
+def insertar_republicaciones(renglones: list) -> dict:
+    """Insertar los edictos que no estén ya republicados en su fecha, entrega los ids nuevos por edicto_id_original"""
+    session = database.session
+    if republicaciones_indice_existe():
+        return dict(session.execute(insert_republicaciones().returning(Edicto.edicto_id_original, Edicto.id), renglones).all())
+
+    # Sin el índice, omitir las que ya existen consultándolas antes
+    existentes = set(
+        session.execute(
+            select(Edicto.edicto_id_original, Edicto.fecha)
+            .where(Edicto.edicto_id_original.in_({renglon["edicto_id_original"] for renglon in renglones}))
+            .where(Edicto.fecha.in_({renglon["fecha"] for renglon in renglones}))
+            .where(Edicto.estatus == "A")
+        ).all()
+    )
+    nuevos = [renglon for renglon in renglones if (renglon["edicto_id_original"], renglon["fecha"]) not in existentes]
+    if len(nuevos) == 0:
+        return {}
+    return dict(session.execute(insert(Edicto).returning(Edicto.edicto_id_original, Edicto.id), nuevos).all())
+
+
+def republicar_edictos(fecha: date, autoridad_id: int = None) -> dict:
+    """Insertar las republicaciones de los edictos con acuses en la fecha, entrega los insertados y los omitidos"""
+    session = database.session
+
+    # Consultar los edictos originales activos que tienen acuses activos en la fecha, con la clave de su autoridad
+    # Los eliminados (B) y los pendientes de subir su archivo (P) no se republican
+    consulta = (
+        select(
+            Edicto.id,
+            Edicto.autoridad_id,
+            Edicto.descripcion,
+            Edicto.expediente,
+            Edicto.archivo,
+            Edicto.url,
+            Edicto.edicto_id_original,
+            Autoridad.clave.label("autoridad_clave"),
+        )
+        .join(Autoridad, Autoridad.id == Edicto.autoridad_id)
+        .where(Edicto.id.in_(acuses_activos(fecha, fecha)))
+        .where(Edicto.estatus == "A")
+        .order_by(Edicto.id)
+    )
+    if autoridad_id is not None:
+        consulta = consulta.where(Edicto.autoridad_id == autoridad_id)
+    originales = session.execute(consulta).all()
+    if len(originales) == 0:
+        return {"insertados": [], "omitidos": 0, "actualizados": 0}
+    originales_ids = [original.id for original in originales]
+
+    # Los originales con edicto_id_original en CERO se actualizan con su mismo id, en una sola sentencia
+    actualizados = session.execute(
+        update(Edicto)
+        .where(Edicto.id.in_(originales_ids))
+        .where(Edicto.edicto_id_original == 0)
+        .values(edicto_id_original=Edicto.id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Contar las publicaciones activas de cada original, el original ya cuenta porque tiene su mismo id
+    cantidades = dict(
+        session.execute(
+            select(Edicto.edicto_id_original, func.count(Edicto.id))
+            .where(Edicto.edicto_id_original.in_(originales_ids))
+            .where(Edicto.estatus == "A")
+            .group_by(Edicto.edicto_id_original)
+        ).all()
+    )
+
+    # Preparar los renglones de los edictos nuevos
+    renglones = [
+        {
+            "autoridad_id": original.autoridad_id,
+            "fecha": fecha,  # Fecha de republicacion
+            "descripcion": original.descripcion,
+            "expediente": original.expediente,
+            "numero_publicacion": str(cantidades.get(original.id, 0) + 1),
+            "archivo": original.archivo,
+            "url": original.url,
+            "acuse_num": 0,
+            "edicto_id_original": original.id,
+        }
+        for original in originales
+    ]
+
+    # Insertar todos en un solo viaje, RETURNING solo entrega los que no estaban ya republicados en la fecha
+    nuevos_ids = insertar_republicaciones(renglones)
+
+    # Entregar los insertados con la clave de la autoridad para los mensajes
+    insertados = []
+    for original, renglon in zip(originales, renglones):
+        if original.id in nuevos_ids:
+            insertados.append({"id": nuevos_ids[original.id], "autoridad_clave": original.autoridad_clave, **renglon})
+    return {"insertados": insertados, "omitidos": len(renglones) - len(insertados), "actualizados": actualizados}
+
+
+def depurar_republicaciones() -> int:
+    """Dar de baja las republicaciones duplicadas por (edicto_id_original, fecha), conserva la de menor id"""
+    renglones = (
+        select(
+            Edicto.id,
+            func.row_number().over(partition_by=(Edicto.edicto_id_original, Edicto.fecha), order_by=Edicto.id).label("renglon"),
+        )
+        .where(Edicto.estatus == "A")
+        .where(Edicto.edicto_id_original > 0)
+        .subquery()
+    )
+    return database.session.execute(
+        update(Edicto)
+        .where(Edicto.id.in_(select(renglones.c.id).where(renglones.c.renglon > 1)))
+        .values(estatus="B")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def autoridades_con_acuses(desde: date, hasta: date) -> list:
+    """Entregar los ids de las autoridades con acuses activos en el rango de fechas, son los trozos a repartir"""
+    return database.session.scalars(
+        select(Edicto.autoridad_id)
+        .distinct()
+        .where(Edicto.id.in_(acuses_activos(desde, hasta)))
+        .where(Edicto.estatus == "A")
+        .order_by(Edicto.autoridad_id)
+    ).all()
+
+
+def republicar_rango(desde: date, hasta: date, autoridad_id: int = None, probar: bool = False) -> dict:
+    """Republicar fecha por fecha en orden, con un commit por fecha, entrega los totales"""
+    totales = {"autoridad_id": autoridad_id, "fechas": 0, "insertados": 0, "omitidos": 0, "actualizados": 0}
+    fecha = desde
+    while fecha <= hasta:
+        with unit_of_work(commit=not probar):
+            resultado = republicar_edictos(fecha, autoridad_id)
+        totales["fechas"] += 1
+        totales["insertados"] += len(resultado["insertados"])
+        totales["omitidos"] += resultado["omitidos"]
+        totales["actualizados"] += resultado["actualizados"]
+        fecha += timedelta(days=1)
+    return totales
+
+
+def preparar_proceso() -> None:
+    """Al iniciar un proceso hijo, descartar las conexiones heredadas del padre sin cerrarlas"""
+    database.engine.dispose(close=False)
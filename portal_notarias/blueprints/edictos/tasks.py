@@ -3,18 +3,20 @@ Edictos, tareas en el fondo
 """
 
 import logging
-from datetime import datetime
 import os
+from datetime import date, datetime
+from pathlib import Path
 
 import pytz
-import sendgrid
 from dotenv import load_dotenv
-from sendgrid.helpers.mail import Email, To, Content, Mail
 
-from lib.exceptions import MyNotExistsError, MyUnknownError
+from lib.exceptions import MyAnyError, MyNotExistsError, MyUnknownError, MyUploadError
+from lib.storage import GoogleCloudStorage
 from lib.tasks import set_task_error, set_task_progress
+from lib.unit_of_work import unit_of_work
 from portal_notarias.app import create_app
 from portal_notarias.blueprints.edictos.models import Edicto
+from portal_notarias.blueprints.edictos.republicacion import insertar_republicaciones, republicar_rango
 from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
 from portal_notarias.extensions import database
 
@@ -51,20 +53,103 @@ def republicacion_edictos(edicto_id: int, nueva_fecha: datetime) -> str:
         mensaje_error = f"El edicto {edicto_id} no está activo."
         set_task_error(mensaje_error)
         raise MyNotExistsError(mensaje_error)
-    # Crear el nuevo edicto para republicación
-    nuevo_edicto = Edicto(
-        descripcion=edicto_original.descripcion,
-        expediente=edicto_original.expediente,
-        numero_publicacion=edicto_original.numero_publicacion,
-        archivo=edicto_original.archivo,
-        url=edicto_original.url,
-        acuse_num=1,  # Reiniciar el contador de acuses
-        fecha=nueva_fecha.date(),  # Nueva fecha de publicación
-        estatus="A",  # Activar el nuevo edicto
-        autoridad_id=edicto_original.autoridad_id,
-        edicto_id_original=edicto_original.id,  # Relacionar con el original
-    ).save()
-    mensaje_final = f"Terminar republicacion del {nuevo_edicto.id}."
+    # Crear el nuevo edicto para republicación, si ya existe en esa fecha no se duplica
+    with unit_of_work():
+        nuevos_ids = insertar_republicaciones(
+            [
+                {
+                    "descripcion": edicto_original.descripcion,
+                    "expediente": edicto_original.expediente,
+                    "numero_publicacion": edicto_original.numero_publicacion,
+                    "archivo": edicto_original.archivo,
+                    "url": edicto_original.url,
+                    "acuse_num": 1,  # Reiniciar el contador de acuses
+                    "fecha": nueva_fecha.date(),  # Nueva fecha de publicación
+                    "estatus": "A",  # Activar el nuevo edicto
+                    "autoridad_id": edicto_original.autoridad_id,
+                    "edicto_id_original": edicto_original.id,  # Relacionar con el original
+                }
+            ]
+        )
+    nuevo_edicto_id = nuevos_ids.get(edicto_original.id)
+    if nuevo_edicto_id is None:
+        mensaje_final = f"El edicto {edicto_id} ya estaba republicado el {nueva_fecha.date()}."
+    else:
+        mensaje_final = f"Terminar republicacion del {nuevo_edicto_id}."
+    set_task_progress(100, mensaje_final)
+    bitacora.info(mensaje_final)
+    return mensaje_final
+
+
+def republicar_rango_edictos(desde: date, hasta: date, autoridad_id: int = None) -> str:
+    """Republicar los edictos de una autoridad en un rango de fechas, es un trozo del comando republicar"""
+    set_task_progress(0, f"Iniciando republicación de {desde} a {hasta} de la autoridad {autoridad_id}.")
+    totales = republicar_rango(desde, hasta, autoridad_id)
+    mensaje_final = (
+        f"Terminó republicación de {desde} a {hasta} de la autoridad {autoridad_id}: "
+        f"{totales['insertados']} insertados, {totales['omitidos']} ya republicados."
+    )
+    set_task_progress(100, mensaje_final)
+    bitacora.info(mensaje_final)
+    return mensaje_final
+
+
+def subir_archivo_edicto(edicto_id: int, archivo_local: str) -> str:
+    """Subir el archivo de un edicto nuevo desde el directorio de subidas, verificarlo y finalizar el edicto"""
+    # Iniciar progreso
+    set_task_progress(0, f"Iniciando la subida del archivo del edicto {edicto_id}.")
+    # Obtener el edicto
+    edicto = Edicto.query.get(edicto_id)
+    if not edicto:
+        Path(archivo_local).unlink(missing_ok=True)
+        mensaje_error = set_task_error(f"El edicto {edicto_id} no existe.")
+        bitacora.error(mensaje_error)
+        raise MyNotExistsError(mensaje_error)
+    # Si ya no está pendiente, por ejemplo porque lo eliminaron, no se sube
+    if edicto.estatus != "P":
+        Path(archivo_local).unlink(missing_ok=True)
+        mensaje_final = f"El edicto {edicto_id} ya no está pendiente, no se subió su archivo."
+        set_task_progress(100, mensaje_final)
+        bitacora.info(mensaje_final)
+        return mensaje_final
+    # Subir con el mismo nombre y ruta que en la subida directa, se verifican MD5 y CRC32C
+    gcstorage = GoogleCloudStorage(
+        base_directory=edicto.autoridad.directorio_edictos,
+        upload_date=edicto.fecha,
+        allowed_extensions=["pdf"],
+        month_in_word=True,
+        bucket_name=app.config["CLOUD_STORAGE_DEPOSITO_EDICTOS"],
+    )
+    try:
+        gcstorage.set_content_type(Path(archivo_local).name)
+        gcstorage.set_filename(hashed_id=edicto.encode_id(), description=edicto.descripcion)
+        with open(archivo_local, "rb") as archivo:
+            gcstorage.upload_stream(archivo)
+    except (MyAnyError, OSError) as error:
+        with unit_of_work():
+            edicto.cancelar()
+        mensaje_error = set_task_error(f"No se pudo subir el archivo del edicto {edicto_id}: {error}")
+        bitacora.error(mensaje_error)
+        raise MyUploadError(mensaje_error) from error
+    finally:
+        Path(archivo_local).unlink(missing_ok=True)
+    # Finalizar el edicto con el archivo y el URL solo si sigue pendiente, bloqueándolo para que no lo eliminen a la vez
+    with unit_of_work():
+        edicto = database.session.get(Edicto, edicto_id, with_for_update=True, populate_existing=True)
+        finalizado = edicto.estatus == "P"
+        if finalizado:
+            edicto.archivo = gcstorage.filename
+            edicto.url = gcstorage.url
+            edicto.estatus = "A"
+            edicto.save()
+    if not finalizado:
+        # Lo eliminaron mientras se subía, borrar el archivo subido
+        gcstorage.delete()
+        mensaje_final = f"El edicto {edicto_id} se eliminó mientras se subía, se borró su archivo."
+        set_task_progress(100, mensaje_final)
+        bitacora.info(mensaje_final)
+        return mensaje_final
+    mensaje_final = f"Terminó la subida del archivo del edicto {edicto_id}."
     set_task_progress(100, mensaje_final)
     bitacora.info(mensaje_final)
     return mensaje_final
@@ -73,6 +158,10 @@ def republicacion_edictos(edicto_id: int, nueva_fecha: datetime) -> str:
 def enviar_email_acuse_recibido(edicto_id: int) -> str:
     """Enviar mensaje de acuse de recibo de un Edicto"""
 
+    # SendGrid se importa hasta que se usa, porque es lento de importar
+    import sendgrid
+    from sendgrid.helpers.mail import Content, Email, Mail, To
+
     # Consultar el edicto
     edicto = Edicto.query.get(edicto_id)
 
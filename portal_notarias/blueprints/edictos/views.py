@@ -2,40 +2,53 @@
 Edictos, vistas
 """
 
-from datetime import datetime, date, time, timedelta
 import json
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
 from urllib.parse import quote
 
-from flask import Blueprint, current_app, flash, make_response, redirect, render_template, request, url_for
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 from pytz import timezone
+from redis.exceptions import RedisError
+from sqlalchemy import select
 from werkzeug.datastructures import CombinedMultiDict
 from werkzeug.exceptions import NotFound
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import (
+    get_datatable_cursor,
+    get_datatable_parameters,
+    get_datatable_total,
+    output_datatable_json,
+    paginate_datatable,
+    project_datatable,
+)
 from lib.exceptions import (
     MyAnyError,
-    MyBucketNotFoundError,
     MyFilenameError,
-    MyFileNotFoundError,
     MyNotAllowedExtensionError,
-    MyNotValidParamError,
     MyUnknownExtensionError,
+    MyUploadError,
 )
-from lib.google_cloud_storage import get_blob_name_from_url, get_media_type_from_filename, get_file_from_gcs
+from lib.google_cloud_storage import get_blob_name_from_url, get_media_type_from_filename
 from lib.safe_string import safe_clave, safe_expediente, safe_message, safe_string
-from lib.storage import GoogleCloudStorage
+from lib.search import search_contains
+from lib.storage import GoogleCloudStorage, stage_upload
+from lib.stream_file import deliver_file_from_storage
 from lib.time_to_text import dia_mes_ano
-from portal_notarias.blueprints.usuarios.decorators import permission_required
-
+from lib.unit_of_work import unit_of_work
+from portal_notarias.blueprints.autoridades.cache import get_autoridad, get_autoridad_por_clave
 from portal_notarias.blueprints.autoridades.models import Autoridad
+from portal_notarias.blueprints.bitacoras.auditoria import registrar_auditoria
 from portal_notarias.blueprints.bitacoras.models import Bitacora
-from portal_notarias.blueprints.modulos.models import Modulo
-from portal_notarias.blueprints.permisos.models import Permiso
+from portal_notarias.blueprints.edictos.cache import acuse_etag, entregar_acuse
+from portal_notarias.blueprints.edictos.forms import EdictoEditForm, EdictoNewForm
 from portal_notarias.blueprints.edictos.models import Edicto
-from portal_notarias.blueprints.edictos.forms import EdictoNewForm, EdictoEditForm
 from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
-
+from portal_notarias.blueprints.modulos.cache import get_modulo_id
+from portal_notarias.blueprints.permisos.models import Permiso
+from portal_notarias.blueprints.usuarios.decorators import permission_required
+from portal_notarias.extensions import database
 
 # Zona horaria
 TIMEZONE = "America/Mexico_City"
@@ -55,33 +68,45 @@ edictos = Blueprint("edictos", __name__, template_folder="templates")
 @edictos.route("/edictos/acuses/<id_hashed>")
 def checkout(id_hashed):
     """Acuse del Edicto"""
-    edicto = Edicto.query.get_or_404(Edicto.decode_id(id_hashed))
-    dia, mes, anio = dia_mes_ano(edicto.creado)
-    return render_template(
-        "edictos/print.jinja2",
-        edicto=edicto,
-        dia=dia,
-        mes=mes.upper(),
-        anio=anio,
-        fecha_del_acuse=None,
-    )
+    edicto_id = Edicto.decode_id(id_hashed)
+
+    def generar():
+        edicto = Edicto.query.get_or_404(edicto_id)
+        dia, mes, anio = dia_mes_ano(edicto.creado)
+        html = render_template(
+            "edictos/print.jinja2",
+            edicto=edicto,
+            dia=dia,
+            mes=mes.upper(),
+            anio=anio,
+            fecha_del_acuse=None,
+        )
+        return {"etag": acuse_etag(html, edicto.id, edicto.modificado), "html": html}
+
+    return entregar_acuse(edicto_id, 0, generar)
 
 
-@edictos.route("/edictos/acuses/<id_hashed>/<edicto_acuse_id>")
+@edictos.route("/edictos/acuses/<id_hashed>/<int:edicto_acuse_id>")
 def checkout_notaria(id_hashed, edicto_acuse_id):
     """Acuse de las republicaciones del Edicto para notarias"""
-    edicto = Edicto.query.get_or_404(Edicto.decode_id(id_hashed))
-    edicto_acuse = EdictoAcuse.query.get_or_404(edicto_acuse_id)
-    dia, mes, anio = dia_mes_ano(edicto.creado)
-    fecha_del_acuse = edicto_acuse.fecha
-    return render_template(
-        "edictos/print.jinja2",
-        edicto=edicto,
-        dia=dia,
-        mes=mes.upper(),
-        anio=anio,
-        fecha_del_acuse=fecha_del_acuse,
-    )
+    edicto_id = Edicto.decode_id(id_hashed)
+
+    def generar():
+        edicto = Edicto.query.get_or_404(edicto_id)
+        edicto_acuse = EdictoAcuse.query.get_or_404(edicto_acuse_id)
+        dia, mes, anio = dia_mes_ano(edicto.creado)
+        fecha_del_acuse = edicto_acuse.fecha
+        html = render_template(
+            "edictos/print.jinja2",
+            edicto=edicto,
+            dia=dia,
+            mes=mes.upper(),
+            anio=anio,
+            fecha_del_acuse=fecha_del_acuse,
+        )
+        return {"etag": acuse_etag(html, edicto.id, edicto.modificado, edicto_acuse.id, edicto_acuse.modificado), "html": html}
+
+    return entregar_acuse(edicto_id, edicto_acuse_id, generar)
 
 
 @edictos.before_request
@@ -104,20 +129,25 @@ def datatable_json():
     else:
         consulta = consulta.filter_by(estatus="A")
     if "autoridad_id" in request.form:
-        autoridad = Autoridad.query.get(request.form["autoridad_id"])
+        try:
+            autoridad = get_autoridad(int(request.form["autoridad_id"]))
+        except ValueError:
+            autoridad = None
         if autoridad:
-            consulta = consulta.filter_by(autoridad=autoridad)
+            consulta = consulta.filter_by(autoridad_id=autoridad["id"])
     if "fecha_desde" in request.form:
         consulta = consulta.filter(Edicto.fecha >= request.form["fecha_desde"])
     if "fecha_hasta" in request.form:
         consulta = consulta.filter(Edicto.fecha <= request.form["fecha_hasta"])
     if "descripcion" in request.form:
-        consulta = consulta.filter(Edicto.descripcion.contains(safe_string(request.form["descripcion"])))
+        consulta = consulta.filter(search_contains(Edicto.descripcion, request.form["descripcion"]))
     if "numero_publicacion" in request.form:
-        consulta = consulta.filter(Edicto.numero_publicacion.contains(request.form["numero_publicacion"]))
-    # Ordenar y paginar
-    registros = consulta.order_by(Edicto.fecha.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+        consulta = consulta.filter(search_contains(Edicto.numero_publicacion, request.form["numero_publicacion"]))
+    # Ordenar y paginar, por llave (fecha, id) si viene el cursor
+    registros, siguiente_cursor = paginate_datatable(
+        consulta, start, rows_per_page, Edicto.fecha, Edicto.id, get_datatable_cursor()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -141,7 +171,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, siguiente_cursor, total_is_exact=es_exacto)
 
 
 @edictos.route("/edictos/admin_datatable_json", methods=["GET", "POST"])
@@ -149,42 +179,56 @@ def admin_datatable_json():
     """DataTable JSON para listado de edictos administradores"""
     # Tomar parámetros de Datatables
     draw, start, rows_per_page = get_datatable_parameters()
-    # Consultar
-    consulta = Edicto.query
+    # Consultar, con la unión a autoridades para tomar su clave
+    consulta = Edicto.query.join(Autoridad)
     if "estatus" in request.form:
-        consulta = consulta.filter_by(estatus=request.form["estatus"])
+        consulta = consulta.filter(Edicto.estatus == request.form["estatus"])
     else:
-        consulta = consulta.filter_by(estatus="A")
+        consulta = consulta.filter(Edicto.estatus == "A")
     if "autoridad_id" in request.form:
         consulta = consulta.filter(Edicto.autoridad_id == request.form["autoridad_id"])
     elif "autoridad_clave" in request.form:
         autoridad_clave = safe_clave(request.form["autoridad_clave"])
         if autoridad_clave != "":
-            consulta = consulta.join(Autoridad).filter(Autoridad.clave.contains(autoridad_clave))
+            consulta = consulta.filter(Autoridad.clave.contains(autoridad_clave))
 
     if "fecha_desde" in request.form:
         consulta = consulta.filter(Edicto.fecha >= request.form["fecha_desde"])
     if "fecha_hasta" in request.form:
         consulta = consulta.filter(Edicto.fecha <= request.form["fecha_hasta"])
     if "descripcion" in request.form:
-        consulta = consulta.filter(Edicto.descripcion.like("%" + safe_string(request.form["descripcion"]) + "%"))
+        consulta = consulta.filter(search_contains(Edicto.descripcion, request.form["descripcion"]))
     if "expediente" in request.form:
         try:
             expediente = safe_expediente(request.form["expediente"])
-            consulta = consulta.filter_by(expediente=expediente)
+            consulta = consulta.filter(Edicto.expediente == expediente)
         except (IndexError, ValueError):
             pass
     if "numero_publicacion" in request.form:
-        consulta = consulta.filter(Edicto.numero_publicacion.contains(request.form["numero_publicacion"]))
-    registros = consulta.order_by(Edicto.fecha.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+        consulta = consulta.filter(search_contains(Edicto.numero_publicacion, request.form["numero_publicacion"]))
+    # Consultar solo las columnas necesarias en tuplas
+    columnas = (
+        Edicto.id,
+        Edicto.creado,
+        Edicto.fecha,
+        Edicto.descripcion,
+        Edicto.expediente,
+        Edicto.numero_publicacion,
+        Edicto.url,
+        Autoridad.clave.label("autoridad_clave"),
+    )
+    # Ordenar y paginar, por llave (fecha, id) si viene el cursor
+    registros, siguiente_cursor = paginate_datatable(
+        project_datatable(consulta, columnas), start, rows_per_page, Edicto.fecha, Edicto.id, get_datatable_cursor()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for edicto in registros:
         data.append(
             {
                 "creado": edicto.creado.strftime("%Y-%m-%d %H:%M:%S"),
-                "autoridad_clave": edicto.autoridad.clave,
+                "autoridad_clave": edicto.autoridad_clave,
                 "fecha": edicto.fecha.strftime("%Y-%m-%d %H:%M:%S"),
                 "detalle": {
                     "descripcion": edicto.descripcion,
@@ -198,7 +242,7 @@ def admin_datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, siguiente_cursor, total_is_exact=es_exacto)
 
 
 @edictos.route("/edictos")
@@ -220,13 +264,13 @@ def list_active():
     try:
         if "autoridad_id" in request.args:
             autoridad_id = int(request.args.get("autoridad_id"))
-            autoridad = Autoridad.query.get(autoridad_id)
+            autoridad = get_autoridad(autoridad_id)
         elif "autoridad_clave" in request.args:
             autoridad_clave = safe_clave(request.args.get("autoridad_clave"))
-            autoridad = Autoridad.query.filter_by(clave=autoridad_clave).first()
+            autoridad = get_autoridad_por_clave(autoridad_clave)
         if autoridad is not None:
-            filtros = {"estatus": "A", "autoridad_id": autoridad.id}
-            titulo = f"Edictos de {autoridad.descripcion_corta}"
+            filtros = {"estatus": "A", "autoridad_id": autoridad["id"]}
+            titulo = f"Edictos de {autoridad['descripcion_corta']}"
             mostrar_filtro_autoridad_clave = False
     except (TypeError, ValueError):
         pass
@@ -238,8 +282,9 @@ def list_active():
 
     # Si puede editar o crear, solo ve lo de su autoridad
     if titulo is None and (current_user.can_insert(MODULO) or current_user.can_edit(MODULO)):
-        filtros = {"estatus": "A", "autoridad_id": current_user.autoridad.id}
-        titulo = f"Edictos de {current_user.autoridad.descripcion_corta}"
+        autoridad_usuario = get_autoridad(current_user.autoridad_id)
+        filtros = {"estatus": "A", "autoridad_id": autoridad_usuario["id"]}
+        titulo = f"Edictos de {autoridad_usuario['descripcion_corta']}"
         mostrar_filtro_autoridad_clave = False
 
     # De lo contrario, es observador
@@ -280,13 +325,11 @@ def download():
         blob_name = get_blob_name_from_url(url)
         # Obtener tipo de media
         media_type = get_media_type_from_filename(blob_name)
-        # Obtener archivo
-        archivo = get_file_from_gcs(current_app.config["CLOUD_STORAGE_DEPOSITO_EDICTOS"], blob_name)
+        # Entregar archivo en partes
+        return deliver_file_from_storage(current_app.config["CLOUD_STORAGE_DEPOSITO_EDICTOS"], blob_name, media_type)
     except MyAnyError as error:
         flash(str(error), "warning")
         return redirect(url_for("edictos.list_active"))
-    # Entregar archivo
-    return current_app.response_class(archivo, mimetype=media_type)
 
 
 @edictos.route("/edictos/<int:edicto_id>")
@@ -400,32 +443,81 @@ def new():
         if es_valido is False:
             return render_template("edictos/new.jinja2", form=form)
 
-        # Insertar el registro en la base de datos
-        edicto = Edicto(
-            autoridad=autoridad,
-            fecha=hoy_date,
-            acuse_num=acuse_num,
-            descripcion=descripcion,
-            numero_publicacion="1",  # Primera publicación siempre es "1"
-        )
-        edicto.save()
-
-        # Insertar los acuses solo si la validación es exitosa
-        for fecha_acuse in fechas_acuses_list:
-
-            # Verificar que la fecha del acuse no sea la fecha de hoy
-            if fecha_acuse != hoy_date:
-                acuse = EdictoAcuse(
+        # Si hay directorio de subidas, guardar el archivo ahí, insertar en una sola transacción y subir en el fondo
+        subida_directorio = current_app.config.get("EDICTOS_SUBIDA_DIRECTORIO", "")
+        if subida_directorio != "":
+            try:
+                archivo_local = stage_upload(archivo.stream, subida_directorio, gcstorage.extension)
+            except MyUploadError:
+                flash("No se pudo guardar el archivo para subirlo.", "danger")
+                return render_template("edictos/new.jinja2", form=form)
+            with unit_of_work():
+                edicto = Edicto(
+                    autoridad=autoridad,
+                    fecha=hoy_date,
+                    acuse_num=acuse_num,
+                    descripcion=descripcion,
+                    numero_publicacion="1",  # Primera publicación siempre es "1"
+                    estatus="P",  # Pendiente, no aparece en los listados hasta que la tarea suba el archivo
+                )
+                edicto.save()
+                for fecha_acuse in fechas_acuses_list:
+                    if fecha_acuse != hoy_date:
+                        EdictoAcuse(edicto=edicto, fecha=fecha_acuse).save()
+            # Lanzar la tarea que sube, verifica y finaliza el edicto, su progreso se ve en tareas
+            try:
+                current_user.launch_task(
+                    comando="edictos.tasks.subir_archivo_edicto",
+                    mensaje=f"Subiendo el archivo del edicto {edicto.id}",
                     edicto_id=edicto.id,
-                    fecha=fecha_acuse,
+                    archivo_local=archivo_local,
                 )
-                acuse.save()
+            except RedisError:
+                # Dar de baja el edicto y sus acuses en una sola transacción y borrar el archivo guardado
+                with unit_of_work():
+                    edicto.cancelar()
+                Path(archivo_local).unlink(missing_ok=True)
+                flash("No se pudo lanzar la tarea para subir el archivo.", "danger")
+                return render_template("edictos/new.jinja2", form=form)
+            # Registrar en la bitácora solo si la tarea quedó en la cola
+            with unit_of_work():
+                bitacora = Bitacora(
+                    modulo_id=get_modulo_id(MODULO),
+                    usuario=current_user,
+                    descripcion=safe_message(f"Portal de Notarías nuevo edicto de {autoridad.clave} sobre {descripcion[:16]}"),
+                    url=url_for("edictos.detail", edicto_id=edicto.id),
+                )
+                registrar_auditoria(bitacora)
+            flash(f"{bitacora.descripcion}. El archivo se está subiendo en el fondo.", "success")
+            return redirect(bitacora.url)
+
+        # Insertar el edicto y sus acuses en una sola transacción, se confirma antes de subir el archivo
+        with unit_of_work():
+            edicto = Edicto(
+                autoridad=autoridad,
+                fecha=hoy_date,
+                acuse_num=acuse_num,
+                descripcion=descripcion,
+                numero_publicacion="1",  # Primera publicación siempre es "1"
+            )
+            edicto.save()
+
+            # Insertar los acuses solo si la validación es exitosa
+            for fecha_acuse in fechas_acuses_list:
+
+                # Verificar que la fecha del acuse no sea la fecha de hoy
+                if fecha_acuse != hoy_date:
+                    acuse = EdictoAcuse(
+                        edicto=edicto,
+                        fecha=fecha_acuse,
+                    )
+                    acuse.save()
 
         # Subir a Google Cloud Storage
         es_exitoso = True
         try:
             gcstorage.set_filename(hashed_id=edicto.encode_id(), description=descripcion)
-            gcstorage.upload(archivo.stream.read())
+            gcstorage.upload_stream(archivo.stream)
         except (MyFilenameError, MyNotAllowedExtensionError, MyUnknownExtensionError):
             flash("Tipo de archivo no permitido o desconocido.", "warning")
             es_exitoso = False
@@ -435,18 +527,19 @@ def new():
 
         # Si se sube con exito, actualizar el registro del edicto con el archivo y la URL y mostrar el detalle
         if es_exitoso:
-            edicto.archivo = gcstorage.filename
-            edicto.url = gcstorage.url
-            edicto.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(
-                    f"Portal de Notarías nuevo edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
-                ),
-                url=url_for("edictos.detail", edicto_id=edicto.id),
-            )
-            bitacora.save()
+            with unit_of_work():
+                edicto.archivo = gcstorage.filename
+                edicto.url = gcstorage.url
+                edicto.save()
+                bitacora = Bitacora(
+                    modulo_id=get_modulo_id(MODULO),
+                    usuario=current_user,
+                    descripcion=safe_message(
+                        f"Portal de Notarías nuevo edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
+                    ),
+                    url=url_for("edictos.detail", edicto_id=edicto.id),
+                )
+                registrar_auditoria(bitacora)
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
 
@@ -514,11 +607,8 @@ def edit(edicto_id):
             flash("La descripción es incorrecta.", "warning")
             es_valido = False
 
-        # Guardar cambios en el edicto
-        edicto.descripcion = descripcion
-        edicto.save()
-
-        # Actualizar los acuses
+        # Validar las fechas de los acuses
+        fechas_acuses = []
         for i, acuse in enumerate(acuses):
             if i + 2 <= 5:
                 fecha_acuse_field = getattr(form, f"fecha_acuse_{i + 2}")
@@ -531,21 +621,32 @@ def edit(edicto_id):
                     flash("La fecha de publicación no puede ser del pasado.", "warning")
                     es_valido = False
                     break
-                acuse.fecha = fecha_acuse
-                acuse.save()
+                fechas_acuses.append((acuse, fecha_acuse))
 
+        # Si NO es válido, volver a mostrar el formulario sin cambiar nada
         if not es_valido:
             return render_template("edictos/edit.jinja2", form=form, edicto=edicto)
-        # Registrar en la bitácora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(
-                f"Portal de Notarías editar edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
-            ),
-            url=url_for("edictos.detail", edicto_id=edicto.id),
-        )
-        bitacora.save()
+
+        # Guardar los cambios en el edicto, los acuses y la bitácora en una sola transacción
+        with unit_of_work():
+            edicto.descripcion = descripcion
+            edicto.save()
+
+            # Actualizar los acuses
+            for acuse, fecha_acuse in fechas_acuses:
+                acuse.fecha = fecha_acuse
+                acuse.save()
+
+            # Registrar en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(
+                    f"Portal de Notarías editar edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
+                ),
+                url=url_for("edictos.detail", edicto_id=edicto.id),
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
 
@@ -573,17 +674,17 @@ def delete(edicto_id):
 
     # Si es administrador, puede eliminar
     if current_user.can_admin(MODULO):
-        # Eliminar los edictos_acuses asociados
-        EdictoAcuse.query.filter_by(edicto_id=edicto.id).update({"estatus": "B"}, synchronize_session=False)
-        edicto.delete()
-        # Eliminar los edictos_acuses asociados
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Edicto {edicto.descripcion}"),
-            url=detalle_url,
-        )
-        bitacora.save()
+        # Eliminar con los edictos_acuses asociados, si estaba pendiente la tarea ya no lo finaliza
+        with unit_of_work():
+            edicto.cancelar()
+            # Registrar en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(f"Eliminado Edicto {edicto.descripcion}"),
+                url=detalle_url,
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
 
@@ -594,18 +695,18 @@ def delete(edicto_id):
 
     # Si fue creado hace más de LIMITE_DIAS_EDITAR
     if edicto.creado >= datetime.now(local_tz) - timedelta(days=LIMITE_DIAS_ELIMINAR):
-        # Eliminar los edictos_acuses asociados
-        EdictoAcuse.query.filter_by(edicto_id=edicto.id).update({"estatus": "B"}, synchronize_session=False)
-        edicto.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(
-                f"Portal de Notarías eliminar edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
-            ),
-            url=detalle_url,
-        )
-        bitacora.save()
+        # Eliminar con los edictos_acuses asociados, si estaba pendiente la tarea ya no lo finaliza
+        with unit_of_work():
+            edicto.cancelar()
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(
+                    f"Portal de Notarías eliminar edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
+                ),
+                url=detalle_url,
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     # No se puede eliminar
@@ -630,6 +731,23 @@ def recover(edicto_id):
         flash("No puede recuperar este Edicto porque ya existe uno activo con el mismo ID", "warning")
         return redirect(detalle_url)
 
+    # Evitar que se recupere uno que se dio de baja antes de que se subiera su archivo
+    if edicto.url == "":
+        flash("No puede recuperar este Edicto porque no tiene archivo", "warning")
+        return redirect(detalle_url)
+
+    # Evitar que choque con otra republicación activa del mismo original en la misma fecha (índice único)
+    if edicto.edicto_id_original > 0 and database.session.scalar(
+        select(Edicto.id)
+        .where(Edicto.edicto_id_original == edicto.edicto_id_original)
+        .where(Edicto.fecha == edicto.fecha)
+        .where(Edicto.estatus == "A")
+        .where(Edicto.id != edicto.id)
+        .limit(1)
+    ):
+        flash("No puede recuperar este Edicto porque ya hay otra publicación activa del mismo edicto en esa fecha", "warning")
+        return redirect(detalle_url)
+
     # Definir la descripción para la bitácora
     descripcion = safe_message(
         f"Portal de Notarías recuperar edicto de {edicto.autoridad.clave} sobre {edicto.descripcion[:16]}"
@@ -638,16 +756,17 @@ def recover(edicto_id):
     # Si es administrador, puede recuperar
     if current_user.can_admin(MODULO):
         # Recuperar los edictos_acuses asociados al edicto_id y cambiar su estatus a "A"
-        EdictoAcuse.query.filter_by(edicto_id=edicto.id).update({EdictoAcuse.estatus: "A"})
-        edicto.recover()
-        # Registrar en la bitácora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=descripcion,
-            url=detalle_url,
-        )
-        bitacora.save()
+        with unit_of_work():
+            EdictoAcuse.query.filter_by(edicto_id=edicto.id).update({EdictoAcuse.estatus: "A"})
+            edicto.recover()
+            # Registrar en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=descripcion,
+                url=detalle_url,
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
 
@@ -659,15 +778,16 @@ def recover(edicto_id):
     # Si fue creado hace menos del límite de días, puede recuperar
     if edicto.creado >= datetime.now(local_tz) - timedelta(days=LIMITE_DIAS_RECUPERAR):
         # Recuperar los edictos_acuses asociados al edicto_id y cambiar su estatus a "A"
-        EdictoAcuse.query.filter_by(edicto_id=edicto.id).update({EdictoAcuse.estatus: "A"})
-        edicto.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=descripcion,
-            url=detalle_url,
-        )
-        bitacora.save()
+        with unit_of_work():
+            EdictoAcuse.query.filter_by(edicto_id=edicto.id).update({EdictoAcuse.estatus: "A"})
+            edicto.recover()
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=descripcion,
+                url=detalle_url,
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
 
@@ -683,20 +803,17 @@ def view_file_pdf(edicto_id):
     # Consultar
     edicto = Edicto.query.get_or_404(edicto_id)
 
-    # Obtener el contenido del archivo
+    # Entregar el archivo en partes
     try:
-        archivo = get_file_from_gcs(
+        return deliver_file_from_storage(
             bucket_name=current_app.config["CLOUD_STORAGE_DEPOSITO_EDICTOS"],
             blob_name=get_blob_name_from_url(edicto.url),
+            mimetype="application/pdf",
         )
-    except (MyBucketNotFoundError, MyFileNotFoundError, MyNotValidParamError) as error:
+    except MyAnyError as error:
+        # También MySignedURLError en el modo firmado y MyMissingConfigurationError si falta configurar el depósito
         raise NotFound("No se encontró el archivo.") from error
 
-    # Entregar el archivo
-    response = make_response(archivo)
-    response.headers["Content-Type"] = "application/pdf"
-    return response
-
 
 @edictos.route("/edictos/tablero")
 @permission_required(MODULO, Permiso.VER)
@@ -708,19 +825,20 @@ def dashboard():
     titulo = "Tablero de Edictos"
 
     # Si la autoridad del usuario es jurisdiccional o es notaria, se impone
-    if current_user.autoridad.es_jurisdiccional or current_user.autoridad.es_notaria:
-        autoridad = current_user.autoridad
-        titulo = f"Tablero de Edictos de {autoridad.clave}"
+    autoridad_usuario = get_autoridad(current_user.autoridad_id)
+    if autoridad_usuario["es_jurisdiccional"] or autoridad_usuario["es_notaria"]:
+        autoridad = autoridad_usuario
+        titulo = f"Tablero de Edictos de {autoridad['clave']}"
 
     # Si aun no hay autoridad y viene autoridad_id o autoridad_clave en la URL
     if autoridad is None:
         try:
             if "autoridad_id" in request.args:
-                autoridad = Autoridad.query.get(int(request.args.get("autoridad_id")))
+                autoridad = get_autoridad(int(request.args.get("autoridad_id")))
             elif "autoridad_clave" in request.args:
-                autoridad = Autoridad.query.filter_by(clave=safe_clave(request.args.get("autoridad_clave"))).first()
+                autoridad = get_autoridad_por_clave(safe_clave(request.args.get("autoridad_clave")))
             if autoridad:
-                titulo = f"{titulo} de {autoridad.clave}"
+                titulo = f"{titulo} de {autoridad['clave']}"
         except (TypeError, ValueError):
             pass
 
@@ -787,7 +905,7 @@ def dashboard():
         autoridad=autoridad,
         filtros=json.dumps(
             {
-                "autoridad_id": autoridad.id,
+                "autoridad_id": autoridad["id"],
                 "fecha_desde": fecha_desde.strftime("%Y-%m-%d"),
                 "fecha_hasta": fecha_hasta.strftime("%Y-%m-%d"),
                 "estatus": "A",
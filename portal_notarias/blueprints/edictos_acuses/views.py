@@ -4,14 +4,14 @@ Edictos Acuses, vistas
 
 import json
 from datetime import datetime
+
 from flask import Blueprint, render_template, request, url_for
 from flask_login import login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
-
+from lib.datatables import eager_load_datatable, get_datatable_parameters, get_datatable_total, output_datatable_json
+from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
 from portal_notarias.blueprints.permisos.models import Permiso
 from portal_notarias.blueprints.usuarios.decorators import permission_required
-from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
 
 MODULO = "EDICTOS ACUSES"
 
@@ -38,8 +38,15 @@ def datatable_json():
         consulta = consulta.filter_by(estatus="A")
     if "edicto_id" in request.form:
         consulta = consulta.filter_by(edicto_id=request.form["edicto_id"])
-    registros = consulta.order_by(EdictoAcuse.fecha.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    # Ordenar y paginar, cargando los edictos en la misma consulta
+    registros = (
+        eager_load_datatable(consulta, EdictoAcuse.edicto)
+        .order_by(EdictoAcuse.fecha.desc())
+        .offset(start)
+        .limit(rows_per_page)
+        .all()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -62,7 +69,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @edictos_acuses.route("/edictos_acuses")
@@ -7,7 +7,7 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import get_datatable_parameters, get_datatable_total, output_datatable_json, project_datatable
 from lib.safe_string import safe_email
 from portal_notarias.blueprints.entradas_salidas.models import EntradaSalida
 from portal_notarias.blueprints.permisos.models import Permiso
@@ -31,26 +31,34 @@ def datatable_json():
     """DataTable JSON para listado de Entradas-Salidas"""
     # Tomar parámetros de Datatables
     draw, start, rows_per_page = get_datatable_parameters()
-    # Consultar
-    consulta = EntradaSalida.query
+    # Consultar, con la unión a usuarios para tomar su e-mail
+    consulta = EntradaSalida.query.join(Usuario)
     # Primero filtrar por columnas propias
     if "estatus" in request.form:
-        consulta = consulta.filter_by(estatus=request.form["estatus"])
+        consulta = consulta.filter(EntradaSalida.estatus == request.form["estatus"])
     else:
-        consulta = consulta.filter_by(estatus="A")
+        consulta = consulta.filter(EntradaSalida.estatus == "A")
     if "usuario_id" in request.form:
-        consulta = consulta.filter_by(usuario_id=request.form["usuario_id"])
+        consulta = consulta.filter(EntradaSalida.usuario_id == request.form["usuario_id"])
     # Luego filtrar por columnas de otras tablas
     if "usuario_email" in request.form:
         try:
             usuario_email = safe_email(request.form["usuario_email"], search_fragment=True)
             if usuario_email != "":
-                consulta = consulta.join(Usuario).filter(Usuario.email.contains(usuario_email))
+                consulta = consulta.filter(Usuario.email.contains(usuario_email))
         except ValueError:
             pass
+    # Consultar solo las columnas necesarias en tuplas
+    columnas = (
+        EntradaSalida.id,
+        EntradaSalida.creado,
+        EntradaSalida.tipo,
+        EntradaSalida.usuario_id,
+        Usuario.email.label("usuario_email"),
+    )
     # Ordenar y paginar
-    registros = consulta.order_by(EntradaSalida.id.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = project_datatable(consulta, columnas).order_by(EntradaSalida.id.desc()).offset(start).limit(rows_per_page).all()
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -59,13 +67,13 @@ def datatable_json():
                 "creado": resultado.creado.strftime("%Y-%m-%dT%H:%M:%S"),
                 "tipo": resultado.tipo,
                 "usuario": {
-                    "email": resultado.usuario.email,
+                    "email": resultado.usuario_email,
                     "url": url_for("usuarios.detail", usuario_id=resultado.usuario_id),
                 },
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @entradas_salidas.route("/entradas_salidas")
@@ -0,0 +1,32 @@
+"""
+Modulos, registro en memoria
+
+Los módulos casi nunca cambian, así que cada proceso los carga una sola vez con una consulta
+y después los busca por nombre o por id en un dict, sin ir a la base de datos.
+Al cambiar un módulo se incrementa su versión en Redis, ver lib/reference_cache.py
+"""
+
+from lib.reference_cache import ReferenceCache
+from portal_notarias.blueprints.modulos.models import Modulo
+
+modulos_referencia = ReferenceCache(
+    Modulo,
+    ("id", "nombre", "nombre_corto", "icono", "ruta", "en_navegacion", "en_portal_notarias", "estatus"),
+    unicos=("nombre",),
+)
+
+
+def get_modulos() -> dict:
+    """Entregar los módulos como dicts por id"""
+    return modulos_referencia.get_todos()
+
+
+def get_modulo(nombre: str):
+    """Entregar el módulo como dict por su nombre, o None si no existe"""
+    return modulos_referencia.get_por("nombre", nombre)
+
+
+def get_modulo_id(nombre: str):
+    """Entregar el id del módulo por su nombre, o None si no existe"""
+    modulo = get_modulo(nombre)
+    return modulo["id"] if modulo is not None else None
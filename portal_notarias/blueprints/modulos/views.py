@@ -7,7 +7,7 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import get_datatable_parameters, get_datatable_total, output_datatable_json
 from lib.safe_string import safe_string
 from portal_notarias.blueprints.modulos.models import Modulo
 from portal_notarias.blueprints.permisos.models import Permiso
@@ -45,7 +45,7 @@ def datatable_json():
             consulta = consulta.filter(Modulo.nombre.contains(nombre))
     # Ordenar y paginar
     registros = consulta.order_by(Modulo.nombre).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -65,7 +65,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @modulos.route("/modulos")
@@ -7,7 +7,7 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import eager_load_datatable, get_datatable_parameters, get_datatable_total, output_datatable_json
 from lib.safe_string import safe_string
 from portal_notarias.blueprints.modulos.models import Modulo
 from portal_notarias.blueprints.permisos.models import Permiso
@@ -62,8 +62,14 @@ def datatable_json():
         if modulo_nombre != "":
             consulta = consulta.filter(Modulo.nombre.contains(modulo_nombre))  # Antes se hizo el join(Modulo)
     # Ordenar y paginar
-    registros = consulta.order_by(Permiso.nombre).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = (
+        eager_load_datatable(consulta, Permiso.modulo, Permiso.rol)
+        .order_by(Permiso.nombre)
+        .offset(start)
+        .limit(rows_per_page)
+        .all()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -85,7 +91,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @permisos.route("/permisos")
@@ -0,0 +1,17 @@
+"""
+Roles, instantánea en memoria
+
+Los roles casi no cambian, cada proceso los carga una vez y los consulta en memoria.
+Al cambiar un rol se incrementa su versión en Redis, ver lib/reference_cache.py
+"""
+
+from lib.reference_cache import ReferenceCache
+from portal_notarias.blueprints.roles.models import Rol
+
+roles_referencia = ReferenceCache(Rol, ("id", "nombre", "estatus"), unicos=("nombre",))
+
+
+def get_roles_activos() -> list:
+    """Entregar los roles activos ordenados por nombre"""
+    roles = [rol for rol in roles_referencia.get_todos().values() if rol["estatus"] == "A"]
+    return sorted(roles, key=lambda rol: rol["nombre"])
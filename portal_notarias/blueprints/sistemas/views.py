@@ -7,10 +7,7 @@ from datetime import date
 from flask import Blueprint, redirect, render_template, send_from_directory
 from flask_login import current_user
 
-from portal_notarias.blueprints.autoridades.models import Autoridad
-from portal_notarias.blueprints.edictos.models import Edicto
-from portal_notarias.extensions import database
-from sqlalchemy import func
+from portal_notarias.blueprints.edictos.cache import get_edictos_dia
 
 ROLES_EDICTOS_NOTARIAS = ["ADMINISTRADOR", "NOTARIA"]
 MODULO = "SISTEMAS"
@@ -32,52 +29,26 @@ def start():
         # Calcular fecha actual
         fecha_actual = date.today()
 
-        # Consultar las cantidades de EDICTOS publicados en la fecha actual
-        edictos_usuario = (
-            database.session.query(
-                Edicto.id,
-                Edicto.fecha,
-                Edicto.descripcion,
-                func.count(Edicto.id).label("cantidad"),
-            )
-            .filter(func.date(Edicto.fecha) == fecha_actual)  # compara fechas
-            .filter(Edicto.estatus == "A")
-            .filter(Edicto.autoridad_id == current_user.autoridad.id)
-            .group_by(Edicto.id, Edicto.fecha, Edicto.descripcion)
-            .order_by(Edicto.descripcion)
-            .all()
-        )
-
-        # Mostrar todas las publicaciones
-        edictos_dia = (
-            database.session.query(
-                Edicto.id,
-                Edicto.fecha,
-                Edicto.descripcion,
-                Autoridad.clave,  # obtenemos la clave de la autoridad
-                func.count(Edicto.id).label("cantidad"),
-            )
-            .join(Autoridad, Edicto.autoridad_id == Autoridad.id)  # Hacer join con la tabla de autoridad
-            .filter(func.date(Edicto.fecha) == fecha_actual)
-            .filter(Edicto.estatus == "A")
-            .filter(Edicto.autoridad_id != current_user.autoridad.id)  # Excluir la autoridad del usuario actual
-            .group_by(Edicto.id, Edicto.fecha, Edicto.descripcion, Autoridad.clave)
-            .order_by(Edicto.descripcion)
-            .all()
-        )
+        # Tomar los edictos activos del día del resumen en cache, se consulta una sola vez para todos los usuarios
+        edictos_del_dia = get_edictos_dia(fecha_actual)
 
-        # Convertir a listas de tuplas con el nombre del área y la cantidad de procedimientos
+        # Separar en listas de tuplas los de la autoridad del usuario y los de las demás autoridades
+        autoridad_id = current_user.autoridad_id
         edictos_usuarios_lista = [
-            (edicto_id, fecha, descripcion, cantidad) for edicto_id, fecha, descripcion, cantidad in edictos_usuario
+            (edicto_id, fecha_actual, descripcion, 1)
+            for edicto_id, descripcion, edicto_autoridad_id, _ in edictos_del_dia
+            if edicto_autoridad_id == autoridad_id
         ]
         edictos_dia_lista = [
-            (edicto_id, fecha, descripcion, autoridad_clave, cantidad)
-            for edicto_id, fecha, descripcion, autoridad_clave, cantidad in edictos_dia
+            (edicto_id, fecha_actual, descripcion, autoridad_clave, 1)
+            for edicto_id, descripcion, edicto_autoridad_id, autoridad_clave in edictos_del_dia
+            if edicto_autoridad_id != autoridad_id
         ]
         return render_template(
             "sistemas/start.jinja2",
             mostrar_notaria=obtener_roles.intersection(ROLES_EDICTOS_NOTARIAS),
             es_notario=es_notario,  # determina si el usuario es notario
+            fecha_actual=fecha_actual,  # para las llaves del cache de fragmentos
             edictos_usuarios_lista=edictos_usuarios_lista,  # publicacion del usuario
             edictos_dia_lista=edictos_dia_lista,  # publicacion todos
         )
@@ -4,15 +4,17 @@ Tareas, vistas
 
 import json
 
-from flask import Blueprint, current_app, flash, make_response, redirect, render_template, request, url_for
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import get_datatable_parameters, get_datatable_total, output_datatable_json, project_datatable
 from lib.exceptions import MyAnyError
-from lib.google_cloud_storage import get_blob_name_from_url, get_file_from_gcs
+from lib.google_cloud_storage import get_blob_name_from_url
+from lib.stream_file import deliver_file_from_storage
 from portal_notarias.blueprints.permisos.models import Permiso
 from portal_notarias.blueprints.tareas.models import Tarea
 from portal_notarias.blueprints.usuarios.decorators import permission_required
+from portal_notarias.blueprints.usuarios.models import Usuario
 
 MODULO = "TAREAS"
 
@@ -44,9 +46,25 @@ def datatable_json():
         consulta = consulta.filter_by(comando=request.form["comando"])
     if "usuario_id" in request.form:
         consulta = consulta.filter_by(usuario_id=request.form["usuario_id"])
+    # Consultar solo las columnas necesarias en tuplas
+    columnas = (
+        Tarea.id,
+        Tarea.creado,
+        Tarea.comando,
+        Tarea.ha_terminado,
+        Tarea.mensaje,
+        Tarea.usuario_id,
+        Usuario.email.label("usuario_email"),
+    )
     # Ordenar y paginar
-    registros = consulta.order_by(Tarea.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = (
+        project_datatable(consulta, columnas, uniones=(Usuario,))
+        .order_by(Tarea.creado.desc())
+        .offset(start)
+        .limit(rows_per_page)
+        .all()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -60,7 +78,7 @@ def datatable_json():
                 "ha_terminado": resultado.ha_terminado,
                 "mensaje": resultado.mensaje,
                 "usuario": {
-                    "email": resultado.usuario.email,
+                    "email": resultado.usuario_email,
                     "url": (
                         url_for("usuarios.detail", usuario_id=resultado.usuario_id) if current_user.can_view("USUARIOS") else ""
                     ),
@@ -68,7 +86,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @tareas.route("/tareas")
@@ -129,18 +147,14 @@ def download_xlsx(tarea_id):
         flash("Esta tarea no tiene un archivo XLSX para descargar", "warning")
         return redirect(url_for("tareas.detail", tarea_id=tarea.id))
 
-    # Obtener el contenido del archivo desde Google Storage
+    # Descargar el archivo XLSX desde Google Storage
     try:
-        descarga_contenido = get_file_from_gcs(
+        return deliver_file_from_storage(
             bucket_name=current_app.config["CLOUD_STORAGE_DEPOSITO"],
             blob_name=get_blob_name_from_url(tarea.url),
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            download_name=descarga_nombre,
         )
     except MyAnyError as error:
         flash(str(error), "danger")
         return redirect(url_for("tareas.detail", tarea_id=tarea.id))
-
-    # Descargar un archivo XLSX
-    response = make_response(descarga_contenido)
-    response.headers["Content-Type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    response.headers["Content-Disposition"] = f"attachment; filename={descarga_nombre}"
-    return response
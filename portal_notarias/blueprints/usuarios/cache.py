@@ -0,0 +1,158 @@
+"""
+Usuarios, cache de permisos y de sesiones
+
+Los permisos y el menú principal de cada usuario se consultan con una sola consulta agrupada,
+los datos de los módulos salen del registro en memoria (modulos/cache.py),
+y se guardan en Redis con la llave permisos:{generacion}:{usuario_id} por PERMISOS_CACHE_TTL segundos.
+
+Para Flask-Login se guarda una instantánea compacta del usuario (id, email, estatus, autoridad_id y permisos)
+con la llave sesiones:{generacion}:{usuario_id} por SESIONES_CACHE_TTL segundos.
+
+- Al cambiar un usuario o un usuario-rol se borran las llaves de ese usuario
+- Al cambiar un rol, un permiso o un módulo se incrementa la generación, lo que invalida a todos
+- Si Redis no responde se consulta la base de datos
+"""
+
+import json
+from itertools import chain
+
+from flask import current_app, has_app_context
+from redis.exceptions import RedisError
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from portal_notarias.blueprints.modulos.cache import get_modulos
+from portal_notarias.blueprints.modulos.models import Modulo
+from portal_notarias.blueprints.permisos.models import Permiso
+from portal_notarias.blueprints.roles.models import Rol
+from portal_notarias.blueprints.usuarios_roles.models import UsuarioRol
+from portal_notarias.extensions import database
+
+PERMISOS_CACHE_TTL = 300  # Segundos
+PERMISOS_GENERACION_LLAVE = "permisos:generacion"
+SESIONES_CACHE_TTL = 60  # Segundos
+
+
+def consultar_permisos(usuario_id: int) -> dict:
+    """Consultar los niveles de un usuario con una sola consulta, los módulos salen del registro en memoria"""
+    renglones = database.session.execute(
+        select(Permiso.modulo_id, func.max(Permiso.nivel).label("nivel"))
+        .select_from(UsuarioRol)
+        .join(Permiso, Permiso.rol_id == UsuarioRol.rol_id)
+        .where(UsuarioRol.usuario_id == usuario_id)
+        .where(UsuarioRol.estatus == "A")
+        .where(Permiso.estatus == "A")
+        .group_by(Permiso.modulo_id)
+    ).all()
+    modulos = get_modulos()
+    permisos = {}
+    modulos_menu_principal = []
+    for renglon in renglones:
+        modulo = modulos.get(renglon.modulo_id)
+        if modulo is None:
+            continue
+        permisos[modulo["nombre"]] = renglon.nivel
+        if renglon.nivel > 0 and modulo["en_navegacion"] and modulo["en_portal_notarias"]:
+            modulos_menu_principal.append(
+                {
+                    "nombre": modulo["nombre"],
+                    "nombre_corto": modulo["nombre_corto"],
+                    "icono": modulo["icono"],
+                    "ruta": modulo["ruta"],
+                }
+            )
+    modulos_menu_principal.sort(key=lambda modulo: modulo["nombre_corto"])
+    return {"permisos": permisos, "modulos_menu_principal": modulos_menu_principal}
+
+
+def cache_llave(prefijo: str, usuario_id: int) -> str:
+    """Llave en Redis con la generación vigente"""
+    generacion = current_app.redis.get(PERMISOS_GENERACION_LLAVE)
+    return f"{prefijo}:{int(generacion or 0)}:{usuario_id}"
+
+
+def get_permisos(usuario_id: int) -> dict:
+    """Entregar los permisos y el menú principal desde Redis, o consultarlos y guardarlos"""
+    try:
+        llave = cache_llave("permisos", usuario_id)
+        guardado = current_app.redis.get(llave)
+        if guardado is not None:
+            return json.loads(guardado)
+    except RedisError:
+        return consultar_permisos(usuario_id)
+    resultado = consultar_permisos(usuario_id)
+    try:
+        current_app.redis.set(llave, json.dumps(resultado), ex=PERMISOS_CACHE_TTL)
+    except RedisError:
+        pass
+    return resultado
+
+
+def get_usuario_sesion(usuario_id: int):
+    """Entregar la instantánea del usuario para la sesión, o None si no está en Redis"""
+    try:
+        guardado = current_app.redis.get(cache_llave("sesiones", usuario_id))
+    except RedisError:
+        return None
+    if guardado is None:
+        return None
+    return json.loads(guardado)
+
+
+def set_usuario_sesion(usuario_id: int, instantanea: dict) -> None:
+    """Guardar la instantánea del usuario para la sesión"""
+    try:
+        current_app.redis.set(cache_llave("sesiones", usuario_id), json.dumps(instantanea), ex=SESIONES_CACHE_TTL)
+    except RedisError:
+        pass
+
+
+def invalidate_usuario_sesion(usuario_id: int) -> None:
+    """Invalidar la instantánea del usuario para la sesión, por ejemplo al salir"""
+    try:
+        current_app.redis.delete(cache_llave("sesiones", usuario_id))
+    except RedisError:
+        pass
+
+
+def invalidate_permisos(usuario_id: int = None) -> None:
+    """Invalidar los permisos y la sesión de un usuario, o de todos si no se da usuario_id"""
+    if not has_app_context():
+        return
+    try:
+        if usuario_id is None:
+            current_app.redis.incr(PERMISOS_GENERACION_LLAVE)
+        else:
+            current_app.redis.delete(cache_llave("permisos", usuario_id), cache_llave("sesiones", usuario_id))
+    except RedisError:
+        pass
+
+
+@event.listens_for(Session, "after_flush")
+def recolectar_cambios_permisos(session, flush_context):
+    """Tomar nota de los usuarios, usuarios-roles, roles, permisos y módulos que cambiaron"""
+    for registro in chain(session.new, session.dirty, session.deleted):
+        if isinstance(registro, UsuarioRol):
+            session.info.setdefault("permisos_usuarios_ids", set()).add(registro.usuario_id)
+        elif getattr(registro, "__tablename__", "") == "usuarios":  # Usuario, sin importarlo para no hacerlo circular
+            session.info.setdefault("permisos_usuarios_ids", set()).add(registro.id)
+        elif isinstance(registro, (Rol, Permiso, Modulo)):
+            session.info["permisos_todos"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidar_cambios_permisos(session):
+    """Al confirmar la transacción, invalidar los permisos afectados"""
+    usuarios_ids = session.info.pop("permisos_usuarios_ids", set())
+    if session.info.pop("permisos_todos", False):
+        invalidate_permisos()
+        return
+    for usuario_id in usuarios_ids:
+        invalidate_permisos(usuario_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def descartar_cambios_permisos(session):
+    """Al revertir la transacción, descartar las notas"""
+    session.info.pop("permisos_usuarios_ids", None)
+    session.info.pop("permisos_todos", None)
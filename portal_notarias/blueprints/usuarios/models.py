@@ -3,16 +3,20 @@ Usuarios, modelos
 """
 
 from datetime import datetime
+from functools import cached_property
 from typing import List, Optional
 
 from flask import current_app
 from flask_login import UserMixin
 from sqlalchemy import Enum, ForeignKey, String
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, make_transient_to_detached, mapped_column, relationship
+from sqlalchemy.orm.util import identity_key
 
+from lib.search import search_index
 from lib.universal_mixin import UniversalMixin
 from portal_notarias.blueprints.permisos.models import Permiso
 from portal_notarias.blueprints.tareas.models import Tarea
+from portal_notarias.blueprints.usuarios.cache import get_permisos, get_usuario_sesion, set_usuario_sesion
 from portal_notarias.blueprints.usuarios_roles.models import UsuarioRol
 from portal_notarias.extensions import database, pwd_context
 
@@ -20,6 +24,9 @@ from portal_notarias.extensions import database, pwd_context
 class Usuario(database.Model, UserMixin, UniversalMixin):
     """Usuario"""
 
+    # Columnas de la instantánea para la sesión, las demás se cargan al usarlas
+    COLUMNAS_SESION = ("id", "email", "estatus", "autoridad_id")
+
     WORKSPACES = {
         "BUSINESS STARTED": "Business Started",
         "BUSINESS STANDARD": "Business Standard",
@@ -71,56 +78,58 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     usuarios_roles: Mapped[List["UsuarioRol"]] = relationship("UsuarioRol", back_populates="usuario")
 
     # Propiedades
-    modulos_menu_principal_consultados = []
-    permisos_consultados = {}
-
     @property
     def nombre(self):
         """Junta nombres, apellido primero y apellido segundo"""
         return self.nombres + " " + self.apellido_paterno + " " + self.apellido_materno
 
+    @cached_property
+    def permisos_y_modulos(self):
+        """Permisos y menú principal desde el cache, se consulta una vez por instancia"""
+        return get_permisos(self.id)
+
     @property
     def modulos_menu_principal(self):
         """Elaborar listado con los modulos ordenados para el menu principal"""
-        if len(self.modulos_menu_principal_consultados) > 0:
-            return self.modulos_menu_principal_consultados
-        modulos = []
-        modulos_nombres = []
-        for usuario_rol in self.usuarios_roles:
-            if usuario_rol.estatus == "A":
-                for permiso in usuario_rol.rol.permisos:
-                    if (
-                        permiso.modulo.nombre not in modulos_nombres
-                        and permiso.estatus == "A"
-                        and permiso.nivel > 0
-                        and permiso.modulo.en_navegacion
-                        and permiso.modulo.en_portal_notarias
-                    ):
-                        modulos.append(permiso.modulo)
-                        modulos_nombres.append(permiso.modulo.nombre)
-        self.modulos_menu_principal_consultados = sorted(modulos, key=lambda x: x.nombre_corto)
-        return self.modulos_menu_principal_consultados
+        return self.permisos_y_modulos["modulos_menu_principal"]
 
     @property
     def permisos(self):
         """Entrega un diccionario con todos los permisos"""
-        if len(self.permisos_consultados) > 0:
-            return self.permisos_consultados
-        self.permisos_consultados = {}
-        for usuario_rol in self.usuarios_roles:
-            if usuario_rol.estatus == "A":
-                for permiso in usuario_rol.rol.permisos:
-                    if permiso.estatus == "A":
-                        etiqueta = permiso.modulo.nombre
-                        if etiqueta not in self.permisos_consultados or permiso.nivel > self.permisos_consultados[etiqueta]:
-                            self.permisos_consultados[etiqueta] = permiso.nivel
-        return self.permisos_consultados
+        return self.permisos_y_modulos["permisos"]
 
     @classmethod
     def find_by_identity(cls, identity):
         """Encontrar a un usuario por su correo electrónico"""
         return Usuario.query.filter(Usuario.email == identity).first()
 
+    @classmethod
+    def load_user(cls, uid):
+        """Cargar al usuario de la sesión desde su instantánea en el cache, o desde la base de datos"""
+        try:
+            usuario_id = int(uid)
+        except (TypeError, ValueError):
+            return None
+        # Si ya está en la sesión de SQLAlchemy, usarlo
+        usuario = database.session.identity_map.get(identity_key(cls, usuario_id))
+        if usuario is not None:
+            return usuario
+        # Si no está la instantánea, consultar y guardarla
+        instantanea = get_usuario_sesion(usuario_id)
+        if instantanea is None:
+            usuario = database.session.get(cls, usuario_id)
+            if usuario is not None:
+                instantanea = {columna: getattr(usuario, columna) for columna in cls.COLUMNAS_SESION}
+                instantanea["permisos_y_modulos"] = usuario.permisos_y_modulos
+                set_usuario_sesion(usuario_id, instantanea)
+            return usuario
+        # Reconstruir como persistente sin consultar, las columnas faltantes se cargan al usarlas
+        usuario = cls(**{columna: instantanea[columna] for columna in cls.COLUMNAS_SESION})
+        make_transient_to_detached(usuario)
+        database.session.add(usuario)
+        usuario.__dict__["permisos_y_modulos"] = instantanea["permisos_y_modulos"]
+        return usuario
+
     @property
     def is_active(self):
         """¿Es activo?"""
@@ -177,3 +186,12 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     def __repr__(self):
         """Representación"""
         return f"<Usuario {self.email}>"
+
+
+# Índices de trigramas para las búsquedas de texto
+search_index("usuarios_nombres_trgm_idx", Usuario.nombres)
+search_index("usuarios_apellido_paterno_trgm_idx", Usuario.apellido_paterno)
+search_index("usuarios_apellido_materno_trgm_idx", Usuario.apellido_materno)
+search_index("usuarios_curp_trgm_idx", Usuario.curp)
+search_index("usuarios_puesto_trgm_idx", Usuario.puesto)
+search_index("usuarios_email_trgm_idx", Usuario.email)
@@ -5,30 +5,46 @@ Usuarios, vistas
 import json
 import re
 from datetime import datetime
+from functools import lru_cache
 
-import google.auth.transport.requests
-import google.oauth2.id_token
 from flask import Blueprint, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
 from pytz import timezone
 
 from config.firebase import get_firebase_settings
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import get_datatable_parameters, get_datatable_total, output_datatable_json, project_datatable
 from lib.safe_next_url import safe_next_url
-from lib.safe_string import CONTRASENA_REGEXP, EMAIL_REGEXP, TOKEN_REGEXP, safe_email, safe_string
+from lib.safe_string import CONTRASENA_REGEXP, EMAIL_REGEXP, TOKEN_REGEXP, safe_email
+from lib.search import search_contains
+from portal_notarias.blueprints.autoridades.models import Autoridad
+from portal_notarias.blueprints.bitacoras.auditoria import registrar_auditoria
 from portal_notarias.blueprints.entradas_salidas.models import EntradaSalida
 from portal_notarias.blueprints.permisos.models import Permiso
+from portal_notarias.blueprints.usuarios.cache import invalidate_usuario_sesion
 from portal_notarias.blueprints.usuarios.decorators import anonymous_required, permission_required
 from portal_notarias.blueprints.usuarios.forms import AccesoForm
 from portal_notarias.blueprints.usuarios.models import Usuario
 
-HTTP_REQUEST = google.auth.transport.requests.Request()
-
 MODULO = "USUARIOS"
 
 usuarios = Blueprint("usuarios", __name__, template_folder="templates")
 
 
+@lru_cache()
+def get_http_request():
+    """Request de google-auth para verificar los tokens, se crea en el primer uso"""
+    import google.auth.transport.requests  # Es lento de importar, solo lo necesita el acceso por Firebase
+
+    return google.auth.transport.requests.Request()
+
+
+def verify_firebase_token(token: str):
+    """Verificar el token de Firebase Auth, entrega los claims"""
+    import google.oauth2.id_token  # Es lento de importar, solo lo necesita el acceso por Firebase
+
+    return google.oauth2.id_token.verify_firebase_token(token, get_http_request())
+
+
 @usuarios.route("/login", methods=["GET", "POST"])
 @anonymous_required()
 def login():
@@ -46,17 +62,19 @@ def login():
             # Entonces debe ingresar con Google/Microsoft/GitHub
             if re.fullmatch(TOKEN_REGEXP, token) is not None:
                 # Acceso por Firebase Auth
-                claims = google.oauth2.id_token.verify_firebase_token(token, HTTP_REQUEST)
+                claims = verify_firebase_token(token)
                 if claims:
                     email = claims.get("email", "Unknown")
                     usuario = Usuario.find_by_identity(email)
                     if usuario and usuario.authenticated(with_password=False):
                         if login_user(usuario, remember=True) and usuario.is_active:
-                            EntradaSalida(
-                                usuario_id=usuario.id,
-                                tipo="INGRESO",
-                                direccion_ip=request.remote_addr,
-                            ).save()
+                            registrar_auditoria(
+                                EntradaSalida(
+                                    usuario_id=usuario.id,
+                                    tipo="INGRESO",
+                                    direccion_ip=request.remote_addr,
+                                )
+                            )
                             if siguiente_url:
                                 return redirect(safe_next_url(siguiente_url))
                             return redirect(url_for("sistemas.start"))
@@ -78,11 +96,13 @@ def login():
                 usuario = Usuario.find_by_identity(identidad)
                 if usuario and usuario.authenticated(password=contrasena):
                     if login_user(usuario, remember=True) and usuario.is_active:
-                        EntradaSalida(
-                            usuario_id=usuario.id,
-                            tipo="INGRESO",
-                            direccion_ip=request.remote_addr,
-                        ).save()
+                        registrar_auditoria(
+                            EntradaSalida(
+                                usuario_id=usuario.id,
+                                tipo="INGRESO",
+                                direccion_ip=request.remote_addr,
+                            )
+                        )
                         if siguiente_url:
                             return redirect(safe_next_url(siguiente_url))
                         return redirect(url_for("sistemas.start"))
@@ -102,11 +122,14 @@ def login():
 @login_required
 def logout():
     """Salir del Sistema"""
-    EntradaSalida(
-        usuario_id=current_user.id,
-        tipo="SALIO",
-        direccion_ip=request.remote_addr,
-    ).save()
+    registrar_auditoria(
+        EntradaSalida(
+            usuario_id=current_user.id,
+            tipo="SALIO",
+            direccion_ip=request.remote_addr,
+        )
+    )
+    invalidate_usuario_sesion(current_user.id)
     logout_user()
     flash("Ha salido de este sistema.", "success")
     return redirect(url_for("usuarios.login"))
@@ -147,20 +170,38 @@ def datatable_json():
         consulta = consulta.filter(Usuario.autoridad_id != request.form["autoridad_id_diferente_a"])
     # Filtrar por las columnas de texto de Usuario
     if "nombres" in request.form:
-        consulta = consulta.filter(Usuario.nombres.contains(safe_string(request.form["nombres"])))
+        consulta = consulta.filter(search_contains(Usuario.nombres, request.form["nombres"]))
     if "apellido_paterno" in request.form:
-        consulta = consulta.filter(Usuario.apellido_paterno.contains(safe_string(request.form["apellido_paterno"])))
+        consulta = consulta.filter(search_contains(Usuario.apellido_paterno, request.form["apellido_paterno"]))
     if "apellido_materno" in request.form:
-        consulta = consulta.filter(Usuario.apellido_materno.contains(safe_string(request.form["apellido_materno"])))
+        consulta = consulta.filter(search_contains(Usuario.apellido_materno, request.form["apellido_materno"]))
     if "curp" in request.form:
-        consulta = consulta.filter(Usuario.curp.contains(safe_string(request.form["curp"])))
+        consulta = consulta.filter(search_contains(Usuario.curp, request.form["curp"]))
     if "puesto" in request.form:
-        consulta = consulta.filter(Usuario.puesto.contains(safe_string(request.form["puesto"])))
+        consulta = consulta.filter(search_contains(Usuario.puesto, request.form["puesto"]))
     if "email" in request.form:
-        consulta = consulta.filter(Usuario.email.contains(safe_email(request.form["email"], search_fragment=True)))
+        consulta = consulta.filter(search_contains(Usuario.email, safe_email(request.form["email"], search_fragment=True)))
+    # Consultar solo las columnas necesarias en tuplas
+    columnas = (
+        Usuario.id,
+        Usuario.email,
+        Usuario.nombres,
+        Usuario.apellido_paterno,
+        Usuario.apellido_materno,
+        Usuario.curp,
+        Usuario.puesto,
+        Usuario.autoridad_id,
+        Autoridad.clave.label("autoridad_clave"),
+    )
     # Ordenar y paginar
-    registros = consulta.order_by(Usuario.email).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = (
+        project_datatable(consulta, columnas, uniones=(Autoridad,))
+        .order_by(Usuario.email)
+        .offset(start)
+        .limit(rows_per_page)
+        .all()
+    )
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -170,11 +211,11 @@ def datatable_json():
                     "email": resultado.email,
                     "url": url_for("usuarios.detail", usuario_id=resultado.id),
                 },
-                "nombre": resultado.nombre,
+                "nombre": " ".join((resultado.nombres, resultado.apellido_paterno, resultado.apellido_materno)),
                 "curp": resultado.curp,
                 "puesto": resultado.puesto,
                 "autoridad": {
-                    "clave": resultado.autoridad.clave,
+                    "clave": resultado.autoridad_clave,
                     "url": (
                         url_for("autoridades.detail", autoridad_id=resultado.autoridad_id)
                         if current_user.can_view("AUTORIDADES")
@@ -184,7 +225,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @usuarios.route("/usuarios/select_json", methods=["GET", "POST"])
@@ -195,7 +236,7 @@ def select_json():
     if "searchString" in request.form:
         usuarios_email = safe_email(request.form["searchString"], search_fragment=True)
         if usuarios_email != "":
-            consulta = consulta.filter(Usuario.email.contains(usuarios_email))
+            consulta = consulta.filter(search_contains(Usuario.email, usuarios_email))
     resultados = []
     for usuario in consulta.order_by(Usuario.email).limit(20).all():
         resultados.append({"id": usuario.email, "text": usuario.email, "nombre": usuario.nombre})
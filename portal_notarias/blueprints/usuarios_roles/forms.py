@@ -6,7 +6,7 @@ from flask_wtf import FlaskForm
 from wtforms import SelectField, StringField, SubmitField
 from wtforms.validators import DataRequired
 
-from portal_notarias.blueprints.roles.models import Rol
+from portal_notarias.blueprints.roles.cache import get_roles_activos
 from portal_notarias.blueprints.usuarios.models import Usuario
 
 
@@ -35,4 +35,4 @@ class UsuarioRolNewWithUsuarioForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         """Inicializar y cargar opciones en rol"""
         super().__init__(*args, **kwargs)
-        self.rol.choices = [(r.id, r.nombre) for r in Rol.query.filter_by(estatus="A").order_by(Rol.nombre).all()]
+        self.rol.choices = [(rol["id"], rol["nombre"]) for rol in get_roles_activos()]
@@ -7,10 +7,12 @@ import json
 from flask import Blueprint, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from lib.datatables import get_datatable_parameters, output_datatable_json
+from lib.datatables import get_datatable_parameters, get_datatable_total, output_datatable_json, project_datatable
 from lib.safe_string import safe_email, safe_message, safe_string
+from lib.unit_of_work import unit_of_work
+from portal_notarias.blueprints.bitacoras.auditoria import registrar_auditoria
 from portal_notarias.blueprints.bitacoras.models import Bitacora
-from portal_notarias.blueprints.modulos.models import Modulo
+from portal_notarias.blueprints.modulos.cache import get_modulo_id
 from portal_notarias.blueprints.permisos.models import Permiso
 from portal_notarias.blueprints.roles.models import Rol
 from portal_notarias.blueprints.usuarios.decorators import permission_required
@@ -68,9 +70,22 @@ def datatable_json():
         consulta = consulta.order_by(Usuario.email)
     # Filtrar por los usuarios activos y por los roles activos
     consulta = consulta.filter(Usuario.estatus == "A").filter(Rol.estatus == "A")
+    # Consultar solo las columnas necesarias en tuplas
+    columnas = (
+        UsuarioRol.id,
+        UsuarioRol.estatus,
+        UsuarioRol.rol_id,
+        UsuarioRol.usuario_id,
+        Rol.nombre.label("rol_nombre"),
+        Usuario.email.label("usuario_email"),
+        Usuario.nombres.label("usuario_nombres"),
+        Usuario.apellido_paterno.label("usuario_apellido_paterno"),
+        Usuario.apellido_materno.label("usuario_apellido_materno"),
+        Usuario.puesto.label("usuario_puesto"),
+    )
     # Paginar
-    registros = consulta.offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros = project_datatable(consulta, columnas).offset(start).limit(rows_per_page).all()
+    total, es_exacto = get_datatable_total(consulta)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -81,15 +96,17 @@ def datatable_json():
                     "url": url_for("usuarios_roles.detail", usuario_rol_id=resultado.id),
                 },
                 "usuario": {
-                    "email": resultado.usuario.email,
+                    "email": resultado.usuario_email,
                     "url": (
                         url_for("usuarios.detail", usuario_id=resultado.usuario_id) if current_user.can_view("USUARIOS") else ""
                     ),
                 },
-                "usuario_nombre": resultado.usuario.nombre,
-                "usuario_puesto": resultado.usuario.puesto,
+                "usuario_nombre": " ".join(
+                    (resultado.usuario_nombres, resultado.usuario_apellido_paterno, resultado.usuario_apellido_materno)
+                ),
+                "usuario_puesto": resultado.usuario_puesto,
                 "rol": {
-                    "nombre": resultado.rol.nombre,
+                    "nombre": resultado.rol_nombre,
                     "url": url_for("roles.detail", rol_id=resultado.rol_id) if current_user.can_view("ROLES") else "",
                 },
                 "estatus": resultado.estatus,
@@ -105,7 +122,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, total_is_exact=es_exacto)
 
 
 @usuarios_roles.route("/usuarios_roles")
@@ -142,19 +159,20 @@ def new_with_rol(rol_id):
             else:
                 flash(f"Ya existe {rol.nombre} en {usuario.email}. Nada por hacer.", "warning")
             return redirect(url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol_existente.id))
-        usuario_rol = UsuarioRol(
-            rol=rol,
-            usuario=usuario,
-            descripcion=descripcion,
-        )
-        usuario_rol.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("roles.detail", rol_id=rol.id),
-        )
-        bitacora.save()
+        with unit_of_work():
+            usuario_rol = UsuarioRol(
+                rol=rol,
+                usuario=usuario,
+                descripcion=descripcion,
+            )
+            usuario_rol.save()
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("roles.detail", rol_id=rol.id),
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.rol_nombre.data = rol.nombre  # Solo lectura
@@ -184,19 +202,20 @@ def new_with_usuario(usuario_id):
             else:
                 flash(f"Ya existe {rol.nombre} en {usuario.email}. Nada por hacer.", "warning")
             return redirect(url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol_existente.id))
-        usuario_rol = UsuarioRol(
-            rol=rol,
-            usuario=usuario,
-            descripcion=descripcion,
-        )
-        usuario_rol.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("usuarios.detail", usuario_id=usuario.id),
-        )
-        bitacora.save()
+        with unit_of_work():
+            usuario_rol = UsuarioRol(
+                rol=rol,
+                usuario=usuario,
+                descripcion=descripcion,
+            )
+            usuario_rol.save()
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("usuarios.detail", usuario_id=usuario.id),
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.usuario_email.data = usuario.email  # Solo lectura
@@ -216,14 +235,15 @@ def delete(usuario_rol_id):
     """Eliminar Usuario-Rol"""
     usuario_rol = UsuarioRol.query.get_or_404(usuario_rol_id)
     if usuario_rol.estatus == "A":
-        usuario_rol.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
-        )
-        bitacora.save()
+        with unit_of_work():
+            usuario_rol.delete()
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(f"Eliminado Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id))
 
@@ -234,14 +254,15 @@ def recover(usuario_rol_id):
     """Recuperar Usuario-Rol"""
     usuario_rol = UsuarioRol.query.get_or_404(usuario_rol_id)
     if usuario_rol.estatus == "B":
-        usuario_rol.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
-        )
-        bitacora.save()
+        with unit_of_work():
+            usuario_rol.recover()
+            bitacora = Bitacora(
+                modulo_id=get_modulo_id(MODULO),
+                usuario=current_user,
+                descripcion=safe_message(f"Recuperado Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
+            )
+            registrar_auditoria(bitacora)
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id))
 
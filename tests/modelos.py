@@ -0,0 +1,35 @@
+"""
+Modelos para las pruebas
+
+Las relaciones entre modelos se declaran por nombre, SQLAlchemy solo las puede configurar
+si todos los modelos ya están importados, como sucede en la aplicación al registrar los blueprints.
+Las pruebas que usan los modelos de la aplicación importan este módulo.
+"""
+
+from portal_notarias.blueprints.autoridades.models import Autoridad
+from portal_notarias.blueprints.bitacoras.models import Bitacora
+from portal_notarias.blueprints.distritos.models import Distrito
+from portal_notarias.blueprints.edictos.models import Edicto
+from portal_notarias.blueprints.edictos_acuses.models import EdictoAcuse
+from portal_notarias.blueprints.entradas_salidas.models import EntradaSalida
+from portal_notarias.blueprints.modulos.models import Modulo
+from portal_notarias.blueprints.permisos.models import Permiso
+from portal_notarias.blueprints.roles.models import Rol
+from portal_notarias.blueprints.tareas.models import Tarea
+from portal_notarias.blueprints.usuarios.models import Usuario
+from portal_notarias.blueprints.usuarios_roles.models import UsuarioRol
+
+__all__ = [
+    "Autoridad",
+    "Bitacora",
+    "Distrito",
+    "Edicto",
+    "EdictoAcuse",
+    "EntradaSalida",
+    "Modulo",
+    "Permiso",
+    "Rol",
+    "Tarea",
+    "Usuario",
+    "UsuarioRol",
+]
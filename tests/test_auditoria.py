@@ -0,0 +1,233 @@
+"""
+Prueba auditoria
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import json
+import unittest
+
+from flask import Flask
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import func, select
+
+from lib.unit_of_work import unit_of_work
+from portal_notarias.blueprints.bitacoras.auditoria import (
+    AUDITORIA_GRUPO,
+    AUDITORIA_INTENTOS,
+    AUDITORIA_MUERTOS,
+    AUDITORIA_STREAM,
+    consumir_auditoria,
+    crear_grupo_auditoria,
+    registrar_auditoria,
+    reprocesar_muertos,
+)
+from portal_notarias.extensions import database
+from tests.modelos import Bitacora, EntradaSalida
+
+TABLAS = [Bitacora.__table__, EntradaSalida.__table__]
+
+
+def numero(identificador: bytes) -> int:
+    """Parte numérica de un identificador de stream"""
+    return int(identificador.split(b"-")[0])
+
+
+def como_bytes(valor) -> bytes:
+    """Redis sin decode_responses entrega bytes"""
+    return valor if isinstance(valor, bytes) else str(valor).encode()
+
+
+class TuberiaEnMemoria:
+    """Lo mínimo de una tubería de Redis, acumula y ejecuta al final"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.comandos = []
+
+    def xadd(self, *args, **kwargs):
+        self.comandos.append((args, kwargs))
+
+    def execute(self):
+        return [self.redis.xadd(*args, **kwargs) for args, kwargs in self.comandos]
+
+
+class RedisEnMemoria:
+    """Lo mínimo de los streams y grupos de consumidores de Redis que usa la auditoría"""
+
+    def __init__(self):
+        self.streams = {}  # nombre: {identificador: campos}
+        self.grupos = {}  # (stream, grupo): {"ultimo": número, "pendientes": {identificador: [consumidor, entregas]}}
+        self.contador = 0
+        self.falla = False
+
+    def pipeline(self):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        return TuberiaEnMemoria(self)
+
+    def xadd(self, nombre, campos, maxlen=None, approximate=True):
+        self.contador += 1
+        identificador = f"{self.contador}-0".encode()
+        self.streams.setdefault(nombre, {})[identificador] = {como_bytes(k): como_bytes(v) for k, v in campos.items()}
+        return identificador
+
+    def xgroup_create(self, nombre, grupo, id="0", mkstream=False):
+        if (nombre, grupo) in self.grupos:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(nombre, {})
+        self.grupos[(nombre, grupo)] = {"ultimo": 0, "pendientes": {}}
+
+    def xreadgroup(self, grupo, consumidor, streams, count=None, block=None):
+        respuesta = []
+        for nombre in streams:
+            estado = self.grupos[(nombre, grupo)]
+            nuevos = [(i, c) for i, c in self.streams[nombre].items() if numero(i) > estado["ultimo"]][:count]
+            for identificador, _ in nuevos:
+                estado["ultimo"] = numero(identificador)
+                estado["pendientes"][identificador] = [consumidor, 1]
+            if nuevos:
+                respuesta.append([nombre.encode(), nuevos])
+        return respuesta
+
+    def xpending_range(self, nombre, grupo, minimo, maximo, count, consumername=None):
+        return [
+            {"message_id": identificador, "consumer": dueño.encode(), "time_since_delivered": 0, "times_delivered": entregas}
+            for identificador, (dueño, entregas) in self.grupos[(nombre, grupo)]["pendientes"].items()
+            if consumername is None or dueño == consumername
+        ][:count]
+
+    def xclaim(self, nombre, grupo, consumidor, min_idle_time, identificadores):
+        pendientes = self.grupos[(nombre, grupo)]["pendientes"]
+        reclamados = []
+        for identificador in identificadores:
+            pendientes[identificador] = [consumidor, pendientes[identificador][1] + 1]
+            reclamados.append((identificador, self.streams[nombre].get(identificador)))
+        return reclamados
+
+    def xack(self, nombre, grupo, *identificadores):
+        for identificador in identificadores:
+            self.grupos[(nombre, grupo)]["pendientes"].pop(identificador, None)
+
+    def xdel(self, nombre, *identificadores):
+        for identificador in identificadores:
+            self.streams[nombre].pop(identificador, None)
+
+    def xrange(self, nombre, minimo="-", maximo="+"):
+        return [
+            (identificador, campos)
+            for identificador, campos in self.streams.get(nombre, {}).items()
+            if minimo == "-" or numero(minimo) <= numero(identificador) <= numero(maximo)
+        ]
+
+
+class TestAuditoria(unittest.TestCase):
+    """Pruebas de la auditoría en el fondo con un stream de Redis"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.config["AUDITORIA_EN_EL_FONDO"] = True
+        app.redis = RedisEnMemoria()
+        database.init_app(app)
+        self.redis = app.redis
+        self.contexto = app.app_context()
+        self.contexto.push()
+        database.metadata.create_all(database.engine, tables=TABLAS)
+        crear_grupo_auditoria()
+
+    def tearDown(self):
+        database.session.remove()
+        self.contexto.pop()
+
+    def bitacora(self, descripcion: str) -> Bitacora:
+        """Nueva bitácora sin guardar"""
+        return Bitacora(modulo_id=1, usuario_id=1, descripcion=descripcion, url="/edictos")
+
+    def descripciones(self) -> list:
+        """Descripciones de las bitácoras insertadas, en orden"""
+        return database.session.scalars(select(Bitacora.descripcion).order_by(Bitacora.id)).all()
+
+    def pendientes(self) -> int:
+        """Cantidad de mensajes leídos sin confirmar"""
+        return len(self.redis.xpending_range(AUDITORIA_STREAM, AUDITORIA_GRUPO, "-", "+", 100))
+
+    def test_grupo_una_sola_vez(self):
+        """Crear el grupo de nuevo no es un error"""
+        crear_grupo_auditoria()
+
+    def test_entrega_e_insercion(self):
+        """XADD y después el grupo entrega, inserta en orden y confirma"""
+        registrar_auditoria(self.bitacora("PRIMERA"))
+        registrar_auditoria(EntradaSalida(usuario_id=1, tipo="INGRESO", direccion_ip="127.0.0.1"))
+        registrar_auditoria(self.bitacora("SEGUNDA"))
+        self.assertEqual(self.descripciones(), [])
+        self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 3)
+        self.assertEqual(self.descripciones(), ["PRIMERA", "SEGUNDA"])
+        self.assertEqual(database.session.scalar(select(func.count(EntradaSalida.id))), 1)
+        self.assertEqual(self.pendientes(), 0)
+        self.assertEqual(self.redis.xrange(AUDITORIA_STREAM), [])
+        self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 0)
+
+    def test_reclamar_pendientes(self):
+        """Los leídos sin confirmar se reclaman (XCLAIM) antes de leer nuevos"""
+        registrar_auditoria(self.bitacora("LEIDA"))
+        self.redis.xreadgroup(AUDITORIA_GRUPO, "prueba", {AUDITORIA_STREAM: ">"}, count=10)  # Se cayó antes de insertar
+        registrar_auditoria(self.bitacora("NUEVA"))
+        self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 1)
+        self.assertEqual(self.descripciones(), ["LEIDA"])
+        self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 1)
+        self.assertEqual(self.descripciones(), ["LEIDA", "NUEVA"])
+        self.assertEqual(self.pendientes(), 0)
+
+    def test_evento_malo_no_detiene_el_lote(self):
+        """Si el lote falla se inserta de uno en uno, el evento malo queda pendiente"""
+        registrar_auditoria(self.bitacora("ANTES"))
+        self.redis.xadd(AUDITORIA_STREAM, {"evento": json.dumps({"tabla": "bitacoras", "creado": "2024-05-06T10:00:00"})})
+        registrar_auditoria(self.bitacora("DESPUES"))
+        self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 3)
+        self.assertEqual(self.descripciones(), ["ANTES", "DESPUES"])
+        self.assertEqual(self.pendientes(), 1)
+
+    def test_muertos_tras_los_intentos(self):
+        """Un pendiente entregado AUDITORIA_INTENTOS veces pasa al stream de muertos y deja de bloquear"""
+        self.redis.xadd(AUDITORIA_STREAM, {"evento": json.dumps({"tabla": "bitacoras", "creado": "no es fecha"})})
+        for _ in range(AUDITORIA_INTENTOS):
+            self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 1)
+            self.assertEqual(self.redis.xrange(AUDITORIA_MUERTOS), [])
+        self.assertEqual(self.pendientes(), 1)
+        registrar_auditoria(self.bitacora("SIGUIENTE"))
+        self.assertEqual(consumir_auditoria("prueba", bloquear_ms=None), 1)
+        self.assertEqual(self.pendientes(), 0)
+        self.assertEqual(len(self.redis.xrange(AUDITORIA_MUERTOS)), 1)
+        self.assertEqual(self.descripciones(), ["SIGUIENTE"])
+        self.assertEqual(reprocesar_muertos(), 1)
+        self.assertEqual(self.redis.xrange(AUDITORIA_MUERTOS), [])
+        self.assertEqual(len(self.redis.xrange(AUDITORIA_STREAM)), 1)
+
+    def test_unit_of_work_envia_al_confirmar(self):
+        """Dentro de unit_of_work los eventos se envían hasta el commit"""
+        with unit_of_work():
+            registrar_auditoria(self.bitacora("CONFIRMADA"))
+            self.assertEqual(self.redis.xrange(AUDITORIA_STREAM), [])
+        self.assertEqual(len(self.redis.xrange(AUDITORIA_STREAM)), 1)
+
+    def test_unit_of_work_descarta_al_revertir(self):
+        """Si el bloque se revierte los eventos se descartan"""
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                registrar_auditoria(self.bitacora("REVERTIDA"))
+                raise ValueError("Falla")
+        self.assertEqual(self.redis.xrange(AUDITORIA_STREAM), [])
+        with unit_of_work():
+            pass
+        self.assertEqual(self.redis.xrange(AUDITORIA_STREAM), [])
+
+    def test_sin_redis_inserta_de_inmediato(self):
+        """Si Redis no responde el evento se inserta en ese momento"""
+        self.redis.falla = True
+        registrar_auditoria(self.bitacora("SIN REDIS"))
+        self.assertEqual(self.descripciones(), ["SIN REDIS"])
+
+
+if __name__ == "__main__":
+    unittest.main()
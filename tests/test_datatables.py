@@ -0,0 +1,221 @@
+"""
+Prueba datatables
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import base64
+import unittest
+from datetime import date
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy.orm import Mapped, mapped_column
+
+from lib import datatables
+from lib.datatables import (
+    COUNT_CACHE_TTL,
+    COUNT_ESTIMATE_MIN,
+    conteos_cache,
+    decode_cursor,
+    encode_cursor,
+    get_datatable_total,
+    invalidate_datatable_totals,
+    paginate_datatable,
+)
+from lib.universal_mixin import UniversalMixin
+from portal_notarias.extensions import database
+
+
+class Renglon(database.Model, UniversalMixin):
+    """Modelo solo para las pruebas"""
+
+    __tablename__ = "pruebas_datatables"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    fecha: Mapped[date]
+
+
+class TestCursor(unittest.TestCase):
+    """Pruebas del cursor (fecha, id)"""
+
+    def test_ida_y_vuelta(self):
+        """Lo que se codifica se decodifica igual"""
+        self.assertEqual(decode_cursor(encode_cursor(date(2024, 5, 6), 123)), (date(2024, 5, 6), 123))
+
+    def test_basura(self):
+        """Un cursor que no es válido entrega None"""
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(""))
+        self.assertIsNone(decode_cursor("no es base64!"))
+        self.assertIsNone(decode_cursor("ñ"))
+        for texto in ("sin-separador", "2024-05-06:abc", "2024-13-01:1", "2024-05-06:1:2"):
+            self.assertIsNone(decode_cursor(base64.urlsafe_b64encode(texto.encode()).decode()))
+
+
+class TestPaginateDatatable(unittest.TestCase):
+    """Pruebas de la paginación por llave"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        database.init_app(app)
+        self.contexto = app.app_context()
+        self.contexto.push()
+        Renglon.__table__.create(database.engine)
+        # Varios renglones con la misma fecha, el id desempata
+        for fecha in (
+            date(2024, 5, 6),
+            date(2024, 5, 7),
+            date(2024, 5, 7),
+            date(2024, 5, 7),
+            date(2024, 5, 8),
+            date(2024, 5, 7),
+        ):
+            database.session.add(Renglon(fecha=fecha))
+        database.session.commit()
+        self.esperados = [(date(2024, 5, 8), 5), (date(2024, 5, 7), 6), (date(2024, 5, 7), 4)]
+        self.esperados += [(date(2024, 5, 7), 3), (date(2024, 5, 7), 2), (date(2024, 5, 6), 1)]
+
+    def tearDown(self):
+        database.session.remove()
+        self.contexto.pop()
+
+    def paginar(self, cursor=None, start=0):
+        """Paginar de dos en dos"""
+        return paginate_datatable(Renglon.query, start, 2, Renglon.fecha, Renglon.id, cursor)
+
+    def test_por_llave_igual_que_por_desplazamiento(self):
+        """Con el cursor se recorren todos los renglones una sola vez, en el mismo orden que por desplazamiento"""
+        por_llave = []
+        registros, siguiente = self.paginar()
+        por_llave += [(registro.fecha, registro.id) for registro in registros]
+        while siguiente is not None:
+            registros, siguiente = self.paginar(decode_cursor(siguiente))
+            por_llave += [(registro.fecha, registro.id) for registro in registros]
+        self.assertEqual(por_llave, self.esperados)
+        por_desplazamiento = []
+        for start in range(0, 6, 2):
+            registros, _ = self.paginar(start=start)
+            por_desplazamiento += [(registro.fecha, registro.id) for registro in registros]
+        self.assertEqual(por_desplazamiento, self.esperados)
+
+    def test_frontera_con_la_misma_fecha(self):
+        """Si el cursor cae a media fecha se continúa con los id menores de esa fecha"""
+        registros, siguiente = self.paginar((date(2024, 5, 7), 4))
+        self.assertEqual([(registro.fecha, registro.id) for registro in registros], self.esperados[3:5])
+        self.assertEqual(decode_cursor(siguiente), (date(2024, 5, 7), 2))
+
+    def test_ultima_pagina_sin_cursor(self):
+        """Si la página no se llena no hay siguiente cursor"""
+        registros, siguiente = self.paginar((date(2024, 5, 7), 2))
+        self.assertEqual([registro.id for registro in registros], [1])
+        self.assertIsNone(siguiente)
+
+
+class TestGetDatatableTotal(unittest.TestCase):
+    """Pruebas del conteo con cache y del cambio entre estimado y exacto"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        for endpoint in ("edictos.datatable_json", "tareas.datatable_json"):
+            app.add_url_rule(f"/{endpoint.replace('.', '/')}", endpoint=endpoint, methods=["POST"])
+        database.init_app(app)
+        self.app = app
+        self.contexto = app.app_context()
+        self.contexto.push()
+        Renglon.__table__.create(database.engine)
+        for dia in range(1, 4):
+            database.session.add(Renglon(fecha=date(2024, 5, dia)))
+        database.session.commit()
+        conteos_cache.clear()
+        self.ahora = 1000.0
+        self.reloj = mock.patch.object(datatables.time, "monotonic", lambda: self.ahora)
+        self.reloj.start()
+
+    def tearDown(self):
+        self.reloj.stop()
+        conteos_cache.clear()
+        database.session.remove()
+        self.contexto.pop()
+
+    def contar(self, endpoint="edictos/datatable_json", **filtros):
+        """Pedir el total como lo hace un listado"""
+        with self.app.test_request_context(f"/{endpoint}", method="POST", data={"draw": "1", **filtros}):
+            return get_datatable_total(Renglon.query.filter_by(estatus="A"))
+
+    def agregar(self):
+        """Agregar un renglón más"""
+        database.session.add(Renglon(fecha=date(2024, 5, 9)))
+        database.session.commit()
+
+    def como_postgresql(self, estimado: int):
+        """Hacer creer que la base de datos es PostgreSQL con el estimado dado"""
+        dialecto = mock.patch.object(database.engine.dialect, "name", "postgresql")
+        estimar = mock.patch.object(datatables, "estimate_count", return_value=estimado)
+        return dialecto, estimar
+
+    def test_exacto_en_sqlite(self):
+        """Fuera de PostgreSQL se cuenta exacto"""
+        self.assertEqual(self.contar(), (3, True))
+
+    def test_estimado_grande(self):
+        """Sin filtros y con un estimado grande se entrega el estimado"""
+        dialecto, estimar = self.como_postgresql(COUNT_ESTIMATE_MIN)
+        with dialecto, estimar:
+            self.assertEqual(self.contar(estatus="A"), (COUNT_ESTIMATE_MIN, False))
+
+    def test_estimado_chico(self):
+        """Con un estimado menor a COUNT_ESTIMATE_MIN se cuenta exacto"""
+        dialecto, estimar = self.como_postgresql(COUNT_ESTIMATE_MIN - 1)
+        with dialecto, estimar:
+            self.assertEqual(self.contar(), (3, True))
+
+    def test_con_filtros_no_se_estima(self):
+        """Con filtros además del estatus se cuenta exacto, sin estimar"""
+        dialecto, estimar = self.como_postgresql(COUNT_ESTIMATE_MIN)
+        with dialecto, estimar as estimate_count:
+            self.assertEqual(self.contar(descripcion="NOTARIA"), (3, True))
+            estimate_count.assert_not_called()
+
+    def test_vence_con_el_ttl(self):
+        """El conteo se conserva COUNT_CACHE_TTL segundos y después se cuenta de nuevo"""
+        self.assertEqual(self.contar(), (3, True))
+        self.agregar()
+        self.ahora += COUNT_CACHE_TTL - 1
+        self.assertEqual(self.contar(), (3, True))
+        self.ahora += 1
+        self.assertEqual(self.contar(), (4, True))
+
+    def test_por_firma_de_filtros(self):
+        """Cada combinación de filtros tiene su conteo"""
+        self.assertEqual(self.contar(), (3, True))
+        self.agregar()
+        self.assertEqual(self.contar(descripcion="NOTARIA"), (4, True))
+        self.assertEqual(self.contar(), (3, True))
+
+    def test_invalidar_por_blueprint(self):
+        """Invalidar los conteos de un blueprint no toca los de los demás"""
+        self.contar()
+        self.contar("tareas/datatable_json")
+        self.agregar()
+        invalidate_datatable_totals("edictos")
+        self.assertEqual(self.contar(), (4, True))
+        self.assertEqual(self.contar("tareas/datatable_json"), (3, True))
+
+    def test_lleno_quita_el_mas_antiguo(self):
+        """Con el cache lleno se quitan los vencidos o el más antiguo, no todos"""
+        with mock.patch.object(datatables, "COUNT_CACHE_MAX", 2):
+            self.contar(descripcion="UNO")
+            self.ahora += 10
+            self.contar(descripcion="DOS")
+            self.ahora += 10
+            self.contar(descripcion="TRES")
+            self.assertEqual([dict(firma[1])["descripcion"] for firma in conteos_cache], ["DOS", "TRES"])
+            self.ahora += COUNT_CACHE_TTL - 5  # Vence DOS, TRES todavía no
+            self.contar(descripcion="CUATRO")
+            self.assertEqual([dict(firma[1])["descripcion"] for firma in conteos_cache], ["TRES", "CUATRO"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+Prueba edictos cache
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+from datetime import date
+
+from flask import Flask, render_template_string
+from redis.exceptions import RedisError
+from sqlalchemy import event, update
+
+from lib.unit_of_work import unit_of_work
+from portal_notarias.blueprints.edictos.cache import (
+    ACUSES_MAX_AGE,
+    EDICTOS_DIA_GENERACION_LLAVE,
+    acuse_etag,
+    cache_llave,
+    entregar_acuse,
+    get_edictos_dia,
+)
+from portal_notarias.extensions import database
+from tests.modelos import Autoridad, Distrito, Edicto, EdictoAcuse
+
+TABLAS = [Distrito.__table__, Autoridad.__table__, Edicto.__table__, EdictoAcuse.__table__]
+
+
+class RedisEnMemoria:
+    """Lo mínimo de Redis que usan los caches de edictos"""
+
+    def __init__(self):
+        self.datos = {}
+        self.falla = False
+
+    def get(self, llave):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        return self.datos.get(llave)
+
+    def set(self, llave, valor, ex=None):
+        self.datos[llave] = valor
+
+    def delete(self, *llaves):
+        for llave in llaves:
+            self.datos.pop(llave, None)
+
+    def incr(self, llave):
+        self.datos[llave] = int(self.datos.get(llave, 0)) + 1
+
+    def mget(self, *llaves):
+        return [self.datos.get(llave) for llave in llaves]
+
+    def hget(self, llave, campo):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        return self.datos.get(llave, {}).get(campo)
+
+    def hset(self, llave, campo, valor):
+        self.datos.setdefault(llave, {})[campo] = valor
+
+    def expire(self, llave, segundos):
+        pass
+
+
+class PruebasEdictos(unittest.TestCase):
+    """Aplicación con SQLite, un Redis en memoria, una autoridad y dos edictos"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        self.app = app
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.redis = RedisEnMemoria()
+        database.init_app(app)
+        self.redis = app.redis
+        self.contexto = app.app_context()
+        self.contexto.push()
+        database.metadata.create_all(database.engine, tables=TABLAS)
+        distrito = Distrito(clave="SLT", nombre="SALTILLO", nombre_corto="Saltillo", es_distrito_judicial=True)
+        self.autoridad = Autoridad(
+            distrito=distrito,
+            clave="NOT1",
+            datawarehouse_id=0,
+            descripcion="NOTARIA 1",
+            descripcion_corta="N1",
+            es_notaria=True,
+            directorio_edictos="not1",
+        )
+        database.session.add(Edicto(autoridad=self.autoridad, fecha=date(2024, 5, 6), descripcion="PRIMERO"))
+        database.session.add(Edicto(autoridad=self.autoridad, fecha=date(2024, 5, 7), descripcion="OTRO DIA"))
+        database.session.commit()
+        self.autoridad_id = self.autoridad.id
+        self.redis.datos.clear()
+        self.consultas = 0
+        event.listen(database.engine, "before_cursor_execute", self.contar_consulta)
+
+    def tearDown(self):
+        event.remove(database.engine, "before_cursor_execute", self.contar_consulta)
+        database.session.remove()
+        self.contexto.pop()
+
+    def contar_consulta(self, *args):
+        """Contar las consultas a la base de datos"""
+        self.consultas += 1
+
+
+class TestEdictosDia(PruebasEdictos):
+    """Pruebas del resumen en cache de los edictos del día"""
+
+    def descripciones(self, fecha: date = date(2024, 5, 6)) -> list:
+        """Descripciones de los edictos del día"""
+        return [edicto[1] for edicto in get_edictos_dia(fecha)]
+
+    def test_una_sola_consulta(self):
+        """El resumen se consulta una vez y después sale de Redis"""
+        self.assertEqual(get_edictos_dia(date(2024, 5, 6)), [[1, "PRIMERO", self.autoridad_id, "NOT1"]])
+        self.assertEqual(self.consultas, 1)
+        self.assertEqual(self.descripciones(), ["PRIMERO"])
+        self.assertEqual(self.consultas, 1)
+
+    def test_nuevo_invalida_su_fecha(self):
+        """Al insertar un edicto se borra la llave de su fecha, no la de las demás"""
+        self.descripciones()
+        self.descripciones(date(2024, 5, 7))
+        with unit_of_work():
+            Edicto(autoridad_id=self.autoridad_id, fecha=date(2024, 5, 6), descripcion="SEGUNDO").save()
+            self.assertEqual(self.descripciones(), ["PRIMERO"])  # Hasta el commit
+        self.assertNotIn(cache_llave(date(2024, 5, 6)), self.redis.datos)
+        self.assertIn(cache_llave(date(2024, 5, 7)), self.redis.datos)
+        self.assertEqual(self.descripciones(), ["PRIMERO", "SEGUNDO"])
+
+    def test_eliminar_invalida(self):
+        """Al eliminar un edicto ya no aparece en el resumen"""
+        self.descripciones()
+        database.session.get(Edicto, 1).delete()
+        self.assertEqual(self.descripciones(), [])
+
+    def test_rollback_no_invalida(self):
+        """Si la transacción se revierte la llave se conserva"""
+        self.descripciones()
+        database.session.get(Edicto, 1).descripcion = "CAMBIADO"
+        database.session.flush()
+        database.session.rollback()
+        database.session.commit()
+        self.assertIn(cache_llave(date(2024, 5, 6)), self.redis.datos)
+
+    def test_en_bloque_incrementa_la_generacion(self):
+        """Un UPDATE en bloque sobre edictos invalida todas las fechas"""
+        self.descripciones()
+        database.session.execute(update(Edicto).where(Edicto.id == 2).values(fecha=date(2024, 5, 6)))
+        database.session.commit()
+        self.assertEqual(self.redis.datos[EDICTOS_DIA_GENERACION_LLAVE], 1)
+        self.assertEqual(self.descripciones(), ["OTRO DIA", "PRIMERO"])
+
+    def test_sin_redis(self):
+        """Si Redis no responde se consulta la base de datos"""
+        self.redis.falla = True
+        self.assertEqual(self.descripciones(), ["PRIMERO"])
+        self.assertEqual(self.descripciones(), ["PRIMERO"])
+        self.assertEqual(self.consultas, 2)
+
+
+class TestAcuses(PruebasEdictos):
+    """Pruebas de los acuses con ETag y su cache en Redis"""
+
+    def setUp(self):
+        super().setUp()
+        self.generados = 0
+
+    def generar(self) -> dict:
+        """Generar el acuse como lo hacen checkout y checkout_notaria"""
+        self.generados += 1
+        edicto = database.session.get(Edicto, 1)
+        html = render_template_string("<h1>{{ edicto.descripcion }}</h1>", edicto=edicto)
+        return {"etag": acuse_etag(html, edicto.id, edicto.modificado), "html": html}
+
+    def pedir(self, etag: str = None, edicto_acuse_id: int = 0):
+        """Pedir el acuse, con If-None-Match si se da el etag"""
+        encabezados = {"If-None-Match": f'"{etag}"'} if etag else {}
+        with self.app.test_request_context("/edictos/acuses/x", headers=encabezados):
+            return entregar_acuse(1, edicto_acuse_id, self.generar)
+
+    def test_etag_y_304(self):
+        """Se entrega con ETag y Cache-Control privado, con If-None-Match igual se responde 304 sin generar"""
+        respuesta = self.pedir()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.get_data(as_text=True), "<h1>PRIMERO</h1>")
+        self.assertTrue(respuesta.cache_control.private)
+        self.assertEqual(respuesta.cache_control.max_age, ACUSES_MAX_AGE)
+        etag, _ = respuesta.get_etag()
+        respuesta = self.pedir(etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(self.pedir("otro").status_code, 200)
+        self.assertEqual(self.generados, 1)
+
+    def test_cambio_del_edicto(self):
+        """Al confirmar un cambio del edicto el acuse se genera de nuevo con otro ETag"""
+        etag, _ = self.pedir().get_etag()
+        database.session.get(Edicto, 1).descripcion = "CAMBIADO"
+        database.session.commit()
+        respuesta = self.pedir(etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.get_data(as_text=True), "<h1>CAMBIADO</h1>")
+        self.assertEqual(self.generados, 2)
+
+    def test_cambio_de_un_acuse(self):
+        """Al cambiar un acuse se invalidan los acuses de su edicto"""
+        database.session.add(EdictoAcuse(edicto_id=1, fecha=date(2024, 5, 13)))
+        database.session.commit()
+        self.pedir(edicto_acuse_id=1)
+        database.session.get(EdictoAcuse, 1).fecha = date(2024, 5, 20)
+        database.session.commit()
+        self.pedir(edicto_acuse_id=1)
+        self.assertEqual(self.generados, 2)
+
+    def test_cambio_de_autoridad_o_distrito(self):
+        """Al cambiar la autoridad o el distrito cambian sus versiones y el acuse se genera de nuevo"""
+        self.pedir()
+        database.session.get(Autoridad, self.autoridad_id).descripcion = "NOTARIA UNO"
+        database.session.commit()
+        self.pedir()
+        self.assertEqual(self.generados, 2)
+        database.session.get(Distrito, 1).nombre_corto = "Saltillo, Coah."
+        database.session.commit()
+        self.pedir()
+        self.pedir()
+        self.assertEqual(self.generados, 3)
+
+    def test_sin_redis(self):
+        """Si Redis no responde el acuse se genera en cada petición"""
+        self.redis.falla = True
+        self.assertEqual(self.pedir().status_code, 200)
+        self.assertEqual(self.pedir().status_code, 200)
+        self.assertEqual(self.generados, 2)
+
+    def test_acuse_etag(self):
+        """El ETag cambia con las partes o con el HTML"""
+        self.assertEqual(acuse_etag("<p>", 1, "2024-05-06"), acuse_etag("<p>", 1, "2024-05-06"))
+        self.assertNotEqual(acuse_etag("<p>", 1, "2024-05-06"), acuse_etag("<p>", 1, "2024-05-07"))
+        self.assertNotEqual(acuse_etag("<p>", 1, "2024-05-06"), acuse_etag("<b>", 1, "2024-05-06"))
+        self.assertEqual(len(acuse_etag("<p>", 1)), 32)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Prueba fragment_cache
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+
+from flask import Flask, render_template_string
+from redis.exceptions import RedisError
+
+from lib.fragment_cache import FragmentCacheExtension, invalidate_fragments
+
+
+class RedisEnMemoria:
+    """Lo mínimo de Redis que usa el cache de fragmentos"""
+
+    def __init__(self):
+        self.datos = {}
+        self.falla = False
+
+    def get(self, llave):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        valor = self.datos.get(llave)
+        return valor.encode("utf-8") if isinstance(valor, str) else valor
+
+    def set(self, llave, valor, ex=None):
+        self.datos[llave] = valor
+
+    def incr(self, llave):
+        self.datos[llave] = str(int(self.datos.get(llave, 0)) + 1)
+
+
+PLANTILLA = '{% cache "edictos", "dia", fecha, autoridad_id %}<b>{{ contador() }}</b>{% endcache %}'
+
+
+class TestFragmentCache(unittest.TestCase):
+    """Pruebas del cache de fragmentos de plantillas"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.redis = RedisEnMemoria()
+        self.app.jinja_env.add_extension(FragmentCacheExtension)
+        self.contexto = self.app.app_context()
+        self.contexto.push()
+        self.veces = 0
+
+    def tearDown(self):
+        self.contexto.pop()
+
+    def contador(self):
+        """Contar cuántas veces se genera el bloque"""
+        self.veces += 1
+        return self.veces
+
+    def render(self, autoridad_id=1):
+        return render_template_string(PLANTILLA, contador=self.contador, fecha="2024-01-02", autoridad_id=autoridad_id)
+
+    def test_genera_una_vez(self):
+        """El bloque se genera una vez y después sale de Redis sin escaparse"""
+        self.assertEqual(self.render(), "<b>1</b>")
+        self.assertEqual(self.render(), "<b>1</b>")
+        self.assertIn("fragmentos:edictos:0:dia:2024-01-02:1", self.app.redis.datos)
+
+    def test_llaves_distintas(self):
+        """Cada llave explícita tiene su propio fragmento"""
+        self.assertEqual(self.render(1), "<b>1</b>")
+        self.assertEqual(self.render(2), "<b>2</b>")
+
+    def test_invalidar(self):
+        """Al invalidar el espacio se vuelve a generar"""
+        self.render()
+        invalidate_fragments("edictos")
+        self.assertEqual(self.render(), "<b>2</b>")
+
+    def test_sin_redis(self):
+        """Si Redis falla se genera como siempre"""
+        self.app.redis.falla = True
+        self.assertEqual(self.render(), "<b>1</b>")
+        self.assertEqual(self.render(), "<b>2</b>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Prueba google_cloud_storage
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import base64
+import hashlib
+import io
+import os
+import unittest
+from unittest import mock
+
+import google_crc32c
+
+from lib import google_cloud_storage
+
+
+def crear_cliente():
+    """Cliente falso que entrega un bucket distinto por nombre"""
+    cliente = mock.MagicMock()
+    cliente.bucket.side_effect = lambda nombre: mock.MagicMock(name=nombre)
+    return cliente
+
+
+class TestStoragePool(unittest.TestCase):
+    """Pruebas del cliente y los buckets compartidos por proceso"""
+
+    def setUp(self):
+        google_cloud_storage.reset_storage_pool()
+        parche = mock.patch("google.cloud.storage.Client", side_effect=crear_cliente)
+        self.client_class = parche.start()
+        self.addCleanup(parche.stop)
+        self.addCleanup(google_cloud_storage.reset_storage_pool)
+
+    def test_reutiliza_cliente_y_bucket(self):
+        """Se crea un solo cliente y un bucket por nombre, sin pedir sus metadatos"""
+        primero = google_cloud_storage.get_bucket_from_gcs("deposito")
+        segundo = google_cloud_storage.get_bucket_from_gcs("deposito")
+        otro = google_cloud_storage.get_bucket_from_gcs("otro")
+        self.assertIs(primero, segundo)
+        self.assertIsNot(primero, otro)
+        self.assertEqual(self.client_class.call_count, 1)
+        cliente = google_cloud_storage.get_storage_client()
+        self.assertEqual(cliente.bucket.call_count, 2)
+        cliente.get_bucket.assert_not_called()
+
+    def test_nuevo_cliente_en_otro_proceso(self):
+        """Si cambia el PID, como en el hijo de un fork, se crea otro cliente"""
+        primero = google_cloud_storage.get_storage_client()
+        with mock.patch.object(google_cloud_storage.os, "getpid", return_value=os.getpid() + 1):
+            segundo = google_cloud_storage.get_storage_client()
+        self.assertIsNot(primero, segundo)
+        self.assertEqual(self.client_class.call_count, 2)
+
+
+class TestHashingReader(unittest.TestCase):
+    """Pruebas de las sumas de verificación al leer en partes"""
+
+    def test_reintento_no_suma_dos_veces(self):
+        """Si se regresa a reintentar una parte, las sumas son las del contenido completo"""
+        contenido = os.urandom(10000)
+        reader = google_cloud_storage.HashingReader(io.BytesIO(contenido))
+        reader.read(4096)
+        reader.read(4096)
+        reader.seek(4096)  # Reintentar la segunda parte
+        while reader.read(4096):
+            pass
+        self.assertEqual(reader.md5_hash, base64.b64encode(hashlib.md5(contenido).digest()).decode("ascii"))
+        self.assertEqual(reader.crc32c_hash, base64.b64encode(google_crc32c.Checksum(contenido).digest()).decode("ascii"))
+
+
+if __name__ == "__main__":
+    unittest.main()
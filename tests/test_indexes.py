@@ -0,0 +1,63 @@
+"""
+Prueba indexes
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, create_engine, text
+from sqlalchemy.dialects import postgresql
+
+from lib.indexes import create_index, create_index_statements
+from lib.search import search_index
+
+metadata = MetaData()
+cosas = Table(
+    "pruebas_indexes", metadata, Column("id", Integer, primary_key=True), Column("nombre", String), Column("estatus", String)
+)
+INDICE = Index("pruebas_indexes_estatus_id_idx", cosas.c.estatus, cosas.c.id)
+INDICE_TRGM = search_index("pruebas_indexes_nombre_trgm_idx", cosas.c.nombre)
+
+
+class ConexionPostgreSQL:
+    """Conexión falsa de PostgreSQL que responde indisvalid"""
+
+    dialect = postgresql.dialect()
+
+    def __init__(self, indisvalid):
+        self.indisvalid = indisvalid
+
+    def execute(self, *args):
+        return type("Resultado", (), {"scalar": lambda _: self.indisvalid})()
+
+
+class TestIndexes(unittest.TestCase):
+    """Pruebas de la creación de índices fuera de create_all"""
+
+    def test_crear_si_falta(self):
+        """Se crea el índice que falta y la segunda vez ya no hay sentencias"""
+        engine = create_engine("sqlite://")
+        cosas.create(engine)
+        with engine.connect() as conexion:
+            conexion.exec_driver_sql("DROP INDEX pruebas_indexes_estatus_id_idx")
+            conexion.commit()
+        self.assertEqual(len(create_index(engine, INDICE)), 1)
+        self.assertEqual(create_index(engine, INDICE), [])
+        with engine.connect() as conexion:
+            self.assertEqual(
+                conexion.execute(text("SELECT count(*) FROM sqlite_master WHERE name = :n"), {"n": INDICE.name}).scalar(), 1
+            )
+
+    def test_postgresql_concurrently(self):
+        """En PostgreSQL se crea CONCURRENTLY, con pg_trgm antes si es de trigramas y eliminando el INVALID"""
+        sentencias = create_index_statements(ConexionPostgreSQL(None), INDICE_TRGM)
+        self.assertEqual(sentencias[0], "CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        self.assertTrue(sentencias[1].startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS pruebas_indexes_nombre_trgm_idx"))
+        self.assertIn("gin_trgm_ops", sentencias[1])
+        sentencias = create_index_statements(ConexionPostgreSQL(False), INDICE)
+        self.assertEqual(sentencias[0], "DROP INDEX CONCURRENTLY IF EXISTS pruebas_indexes_estatus_id_idx")
+        self.assertEqual(create_index_statements(ConexionPostgreSQL(True), INDICE), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Prueba reference_cache
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+
+from flask import Flask
+from redis.exceptions import RedisError
+from sqlalchemy import event, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from lib import reference_cache
+from lib.reference_cache import ReferenceCache
+from lib.universal_mixin import UniversalMixin
+from portal_notarias.extensions import database
+
+
+class Clave(database.Model, UniversalMixin):
+    """Modelo solo para las pruebas"""
+
+    __tablename__ = "pruebas_reference_cache"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    clave: Mapped[str]
+
+
+class RedisEnMemoria:
+    """Lo mínimo de Redis que usa la instantánea"""
+
+    def __init__(self):
+        self.datos = {}
+        self.falla = False
+
+    def get(self, llave):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        return self.datos.get(llave)
+
+    def incr(self, llave):
+        self.datos[llave] = int(self.datos.get(llave, 0)) + 1
+
+
+class TestReferenceCache(unittest.TestCase):
+    """Pruebas de la instantánea en memoria con versión en Redis"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.redis = RedisEnMemoria()
+        database.init_app(app)
+        self.redis = app.redis
+        self.contexto = app.app_context()
+        self.contexto.push()
+        Clave.__table__.create(database.engine)
+        for clave in ("SLT-J1-CIV", "SLT-J2-FAM", "TRC-J1-CIV"):
+            database.session.add(Clave(clave=clave))
+        database.session.commit()
+        self.referencia = ReferenceCache(Clave, ("id", "clave", "estatus"), unicos=("clave",), buscables=("clave",))
+        self.consultas = 0
+        event.listen(database.engine, "before_cursor_execute", self.contar_consulta)
+
+    def tearDown(self):
+        event.remove(database.engine, "before_cursor_execute", self.contar_consulta)
+        reference_cache.REFERENCIAS.pop(Clave.__tablename__, None)
+        database.session.remove()
+        self.contexto.pop()
+
+    def contar_consulta(self, *args):
+        """Contar las consultas a la base de datos"""
+        self.consultas += 1
+
+    def test_una_sola_consulta(self):
+        """Se carga una vez y después todo sale de memoria"""
+        self.assertEqual(self.referencia.get(1)["clave"], "SLT-J1-CIV")
+        self.assertEqual(self.referencia.get_por("clave", "TRC-J1-CIV")["id"], 3)
+        self.assertIsNone(self.referencia.get(9))
+        self.assertEqual(self.consultas, 1)
+
+    def test_buscar_como_contains(self):
+        """Buscar encuentra el texto en cualquier parte de la clave, ordenados por id"""
+        self.assertEqual([renglon["id"] for renglon in self.referencia.buscar("clave", "J1")], [1, 3])
+        self.assertEqual([renglon["id"] for renglon in self.referencia.buscar("clave", "FAM")], [2])
+        self.assertEqual(self.referencia.buscar("clave", "XYZ"), [])
+        self.assertEqual(len(self.referencia.buscar("clave", "")), 3)
+
+    def test_invalidar_al_confirmar(self):
+        """Al confirmar un cambio se incrementa la versión y se vuelve a cargar"""
+        self.referencia.get(1)
+        database.session.get(Clave, 1).clave = "SLT-J9-CIV"
+        database.session.commit()
+        self.assertEqual(self.redis.datos[self.referencia.version_llave], 1)
+        self.assertEqual(self.referencia.get(1)["clave"], "SLT-J9-CIV")
+
+    def test_invalidar_en_bloque(self):
+        """Un UPDATE en bloque también incrementa la versión"""
+        database.session.execute(update(Clave).values(estatus="B"))
+        database.session.commit()
+        self.assertEqual(self.redis.datos[self.referencia.version_llave], 1)
+
+    def test_rollback_no_invalida(self):
+        """Al revertir no cambia la versión"""
+        database.session.add(Clave(clave="NUEVA"))
+        database.session.flush()
+        database.session.rollback()
+        self.assertNotIn(self.referencia.version_llave, self.redis.datos)
+
+    def test_otro_proceso(self):
+        """Si otro proceso incrementa la versión, se recarga al verificar"""
+        self.referencia.get(1)
+        database.session.execute(update(Clave).where(Clave.id == 1).values(clave="OTRA"))  # Sin pasar por este proceso
+        self.redis.incr(self.referencia.version_llave)
+        self.assertEqual(self.referencia.get(1)["clave"], "SLT-J1-CIV")  # Aún no toca verificar
+        self.referencia.verificado -= reference_cache.REFERENCIAS_VERIFICAR_SEGUNDOS
+        self.assertEqual(self.referencia.get(1)["clave"], "OTRA")
+
+    def test_sin_redis(self):
+        """Si Redis no responde se carga y se conserva lo cargado"""
+        self.redis.falla = True
+        self.assertEqual(self.referencia.get(2)["clave"], "SLT-J2-FAM")
+        self.referencia.verificado -= reference_cache.REFERENCIAS_VERIFICAR_SEGUNDOS
+        self.assertEqual(self.referencia.get(2)["clave"], "SLT-J2-FAM")
+        self.assertEqual(self.consultas, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+Prueba republicacion
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+from datetime import date
+
+from flask import Flask
+from sqlalchemy import select, text
+
+from lib.unit_of_work import unit_of_work
+from portal_notarias.blueprints.edictos import republicacion
+from portal_notarias.blueprints.edictos.republicacion import (
+    REPUBLICACIONES_INDICE,
+    autoridades_con_acuses,
+    depurar_republicaciones,
+    republicar_edictos,
+    republicar_rango,
+)
+from portal_notarias.extensions import database
+from tests.modelos import Autoridad, Distrito, Edicto, EdictoAcuse
+from tests.test_edictos_cache import RedisEnMemoria
+
+TABLAS = [Distrito.__table__, Autoridad.__table__, Edicto.__table__, EdictoAcuse.__table__]
+
+
+class TestRepublicacion(unittest.TestCase):
+    """Pruebas de la republicación por conjuntos"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.redis = RedisEnMemoria()  # Los listeners de edictos/cache.py invalidan al confirmar
+        database.init_app(app)
+        self.contexto = app.app_context()
+        self.contexto.push()
+        database.metadata.create_all(database.engine, tables=TABLAS)
+        republicacion.republicaciones_indice["existe"] = False
+        distrito = Distrito(clave="SLT", nombre="SALTILLO", nombre_corto="Saltillo", es_distrito_judicial=True)
+        self.autoridad = Autoridad(
+            distrito=distrito,
+            clave="NOT1",
+            datawarehouse_id=0,
+            descripcion="NOTARIA 1",
+            descripcion_corta="N1",
+            es_notaria=True,
+            directorio_edictos="not1",
+        )
+        database.session.add(self.autoridad)
+        database.session.commit()
+
+    def tearDown(self):
+        republicacion.republicaciones_indice["existe"] = False
+        database.session.remove()
+        self.contexto.pop()
+
+    def crear_original(self, descripcion: str, fechas_acuses: list, estatus: str = "A") -> int:
+        """Crear un edicto original con sus acuses, entrega su id"""
+        edicto = Edicto(autoridad=self.autoridad, fecha=date(2024, 5, 1), descripcion=descripcion, estatus=estatus)
+        database.session.add(edicto)
+        for fecha in fechas_acuses:
+            database.session.add(EdictoAcuse(edicto=edicto, fecha=fecha))
+        database.session.commit()
+        return edicto.id
+
+    def republicar(self, fecha: date) -> dict:
+        """Republicar la fecha en una sola transacción"""
+        with unit_of_work():
+            return republicar_edictos(fecha)
+
+    def publicaciones(self, original_id: int) -> list:
+        """Entregar (fecha, numero_publicacion) de las republicaciones activas del original"""
+        return database.session.execute(
+            select(Edicto.fecha, Edicto.numero_publicacion)
+            .where(Edicto.edicto_id_original == original_id)
+            .where(Edicto.id != original_id)
+            .where(Edicto.estatus == "A")
+            .order_by(Edicto.fecha)
+        ).all()
+
+    def test_numero_publicacion(self):
+        """Cada republicación lleva el siguiente número, el original cuenta como la primera"""
+        original_id = self.crear_original("EDICTO", [date(2024, 5, 6), date(2024, 5, 13)])
+        resultado = self.republicar(date(2024, 5, 6))
+        self.assertEqual(len(resultado["insertados"]), 1)
+        self.assertEqual(resultado["actualizados"], 1)
+        self.assertEqual(database.session.get(Edicto, original_id).edicto_id_original, original_id)
+        self.republicar(date(2024, 5, 13))
+        self.assertEqual(self.publicaciones(original_id), [(date(2024, 5, 6), "2"), (date(2024, 5, 13), "3")])
+
+    def test_volver_a_republicar(self):
+        """Republicar de nuevo la misma fecha no inserta nada, con ON CONFLICT"""
+        self.assertTrue(republicacion.republicaciones_indice_existe())
+        self.crear_original("EDICTO", [date(2024, 5, 6)])
+        self.crear_original("OTRO", [date(2024, 5, 6)])
+        self.assertEqual(len(self.republicar(date(2024, 5, 6))["insertados"]), 2)
+        resultado = self.republicar(date(2024, 5, 6))
+        self.assertEqual(resultado["insertados"], [])
+        self.assertEqual(resultado["omitidos"], 2)
+
+    def test_sin_indice(self):
+        """Sin el índice único se consultan antes las que ya existen"""
+        database.session.execute(text(f"DROP INDEX {REPUBLICACIONES_INDICE}"))
+        database.session.commit()
+        self.assertFalse(republicacion.republicaciones_indice_existe())
+        original_id = self.crear_original("EDICTO", [date(2024, 5, 6)])
+        self.assertEqual(len(self.republicar(date(2024, 5, 6))["insertados"]), 1)
+        resultado = self.republicar(date(2024, 5, 6))
+        self.assertEqual(resultado["insertados"], [])
+        self.assertEqual(resultado["omitidos"], 1)
+        self.assertEqual(self.publicaciones(original_id), [(date(2024, 5, 6), "2")])
+
+    def test_no_republica_eliminados_ni_pendientes(self):
+        """Los originales eliminados o pendientes de subir su archivo no se republican"""
+        self.crear_original("ELIMINADO", [date(2024, 5, 6)], estatus="B")
+        self.crear_original("PENDIENTE", [date(2024, 5, 6)], estatus="P")
+        self.assertEqual(self.republicar(date(2024, 5, 6))["insertados"], [])
+
+    def test_depurar_conserva_el_menor_id(self):
+        """Al depurar los duplicados se conserva la republicación de menor id"""
+        database.session.execute(text(f"DROP INDEX {REPUBLICACIONES_INDICE}"))
+        original_id = self.crear_original("EDICTO", [])
+        ids = []
+        for _ in range(3):
+            duplicado = Edicto(
+                autoridad=self.autoridad, fecha=date(2024, 5, 6), descripcion="EDICTO", edicto_id_original=original_id
+            )
+            database.session.add(duplicado)
+            database.session.flush()
+            ids.append(duplicado.id)
+        database.session.commit()
+        with unit_of_work():
+            self.assertEqual(depurar_republicaciones(), 2)
+        estatus = dict(database.session.execute(select(Edicto.id, Edicto.estatus).where(Edicto.id.in_(ids))).all())
+        self.assertEqual(estatus, {ids[0]: "A", ids[1]: "B", ids[2]: "B"})
+
+    def test_rango_en_orden(self):
+        """En un rango las fechas se recorren en orden, así los números de publicación quedan consecutivos"""
+        fechas = [date(2024, 5, 13), date(2024, 5, 6), date(2024, 5, 20)]
+        original_id = self.crear_original("EDICTO", fechas)
+        self.crear_original("ELIMINADO", [date(2024, 5, 6)], estatus="B")
+        self.assertEqual(autoridades_con_acuses(date(2024, 5, 1), date(2024, 5, 31)), [self.autoridad.id])
+        totales = republicar_rango(date(2024, 5, 1), date(2024, 5, 31), self.autoridad.id)
+        self.assertEqual(totales["fechas"], 31)
+        self.assertEqual(totales["insertados"], 3)
+        self.assertEqual(
+            self.publicaciones(original_id),
+            [(date(2024, 5, 6), "2"), (date(2024, 5, 13), "3"), (date(2024, 5, 20), "4")],
+        )
+        totales = republicar_rango(date(2024, 5, 1), date(2024, 5, 31), self.autoridad.id)
+        self.assertEqual(totales["insertados"], 0)
+        self.assertEqual(totales["omitidos"], 3)
+
+    def test_rango_probar(self):
+        """Al probar un rango no se cambia la base de datos"""
+        original_id = self.crear_original("EDICTO", [date(2024, 5, 6)])
+        totales = republicar_rango(date(2024, 5, 6), date(2024, 5, 6), self.autoridad.id, probar=True)
+        self.assertEqual(totales["insertados"], 1)
+        self.assertEqual(self.publicaciones(original_id), [])
+
+    def test_sin_acuses_en_el_rango(self):
+        """Las autoridades sin originales activos con acuses en el rango no se reparten"""
+        self.crear_original("ELIMINADO", [date(2024, 5, 6)], estatus="B")
+        self.assertEqual(autoridades_con_acuses(date(2024, 5, 1), date(2024, 5, 31)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+Prueba search
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+
+from lib.search import search_contains, search_index
+
+tabla = Table("edictos", MetaData(), Column("id", Integer, primary_key=True), Column("descripcion", String(256)))
+indice = search_index("edictos_descripcion_trgm_idx", tabla.c.descripcion)
+
+
+class TestSearch(unittest.TestCase):
+    """Pruebas de las búsquedas con índices de trigramas"""
+
+    def test_indice_postgresql(self):
+        """El índice es GIN de trigramas sobre la columna normalizada"""
+        sql = str(CreateIndex(indice).compile(dialect=postgresql.dialect()))
+        self.assertIn("USING gin", sql)
+        self.assertIn("translate(upper(descripcion)", sql)
+        self.assertIn("gin_trgm_ops", sql)
+
+    def test_filtro_usa_la_misma_expresion(self):
+        """El filtro normaliza la columna igual que el índice y el texto como safe_string con save_enie"""
+        filtro = search_contains(tabla.c.descripcion, "  peña   ámbito ")
+        compilado = filtro.compile(dialect=postgresql.dialect())
+        self.assertIn("translate(upper(edictos.descripcion)", str(compilado))
+        self.assertIn("PEÑA AMBITO", compilado.params.values())
+
+    def test_filtro_otras_bases_de_datos(self):
+        """En otras bases de datos solo se convierte a mayúsculas"""
+        sql = str(search_contains(tabla.c.descripcion, "x").compile(dialect=sqlite.dialect()))
+        self.assertIn("upper(edictos.descripcion)", sql)
+        self.assertNotIn("translate", sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Prueba secret_manager
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from cryptography.fernet import Fernet
+
+from config import secret_manager
+from config.secret_manager import get_secrets
+
+
+class Respuesta:
+    """Respuesta de access_secret_version"""
+
+    def __init__(self, valor: str):
+        self.payload = type("Payload", (), {"data": valor.encode("UTF-8")})()
+
+
+class ClienteFalso:
+    """Lo mínimo del cliente de Secret Manager, cuenta las llamadas y los hilos"""
+
+    def __init__(self, faltantes=()):
+        self.faltantes = faltantes
+        self.llamadas = 0
+        self.hilos = set()
+
+    def access_secret_version(self, name):
+        self.llamadas += 1
+        self.hilos.add(threading.get_ident())
+        secreto = name.split("/")[3]
+        if secreto in self.faltantes:
+            raise RuntimeError("No existe")
+        return Respuesta(f"valor de {secreto}")
+
+
+class TestSecretManager(unittest.TestCase):
+    """Pruebas de la carga de secretos"""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.originales = (secret_manager.PROJECT_ID, secret_manager.SECRETS_CACHE_KEY, secret_manager.SECRETS_CACHE_DIRECTORIO)
+        secret_manager.PROJECT_ID = "proyecto"
+        secret_manager.SECRETS_CACHE_KEY = ""
+        secret_manager.SECRETS_CACHE_DIRECTORIO = self.directorio.name
+
+    def tearDown(self):
+        secret_manager.PROJECT_ID, secret_manager.SECRETS_CACHE_KEY, secret_manager.SECRETS_CACHE_DIRECTORIO = self.originales
+        self.directorio.cleanup()
+
+    def test_local(self):
+        """Sin PROJECT_ID se toman las variables de entorno"""
+        secret_manager.PROJECT_ID = ""
+        os.environ["PRUEBA_SECRETO"] = "local"
+        self.assertEqual(get_secrets(["prueba_secreto"], "pjecz"), {"prueba_secreto": "local"})
+
+    def test_todos_con_prefijo(self):
+        """Se piden todos con el mismo cliente"""
+        cliente = ClienteFalso()
+        secretos = get_secrets(["host", "salt", "redis_url"], "pjecz", client=cliente)
+        self.assertEqual(secretos["salt"], "valor de pjecz_salt")
+        self.assertEqual(cliente.llamadas, 3)
+
+    def test_ignorar_errores(self):
+        """Con ignore_errors el que falla es texto vacío, sin él se levanta la excepción"""
+        self.assertEqual(get_secrets(["a", "b"], "", ignore_errors=True, client=ClienteFalso(faltantes=("b",)))["b"], "")
+        with self.assertRaises(RuntimeError):
+            get_secrets(["a", "b"], "", client=ClienteFalso(faltantes=("b",)))
+
+    def test_cache_cifrado(self):
+        """Con llave el segundo arranque sale del cache cifrado, sin llamadas"""
+        secret_manager.SECRETS_CACHE_KEY = Fernet.generate_key().decode()
+        get_secrets(["host", "salt"], "pjecz", client=ClienteFalso())
+        archivos = os.listdir(self.directorio.name)
+        self.assertEqual(len(archivos), 1)
+        ruta = os.path.join(self.directorio.name, archivos[0])
+        self.assertEqual(os.stat(ruta).st_mode & 0o777, 0o600)
+        with open(ruta, "rb") as archivo:
+            self.assertNotIn(b"valor de", archivo.read())
+        cliente = ClienteFalso()
+        self.assertEqual(get_secrets(["host", "salt"], "pjecz", client=cliente)["host"], "valor de pjecz_host")
+        self.assertEqual(cliente.llamadas, 0)
+
+    def test_cache_no_guarda_faltantes(self):
+        """Si uno falla no se guarda el cache, para volver a pedirlo"""
+        secret_manager.SECRETS_CACHE_KEY = Fernet.generate_key().decode()
+        get_secrets(["a", "b"], "", ignore_errors=True, client=ClienteFalso(faltantes=("b",)))
+        self.assertEqual(os.listdir(self.directorio.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
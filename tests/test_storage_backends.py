@@ -0,0 +1,226 @@
+"""
+Prueba storage_backends
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import io
+import os
+import tempfile
+import threading
+import unittest
+from abc import ABC, abstractmethod
+from pathlib import Path
+from unittest import mock
+
+from lib import storage_backends
+from lib.exceptions import MyFileNotFoundError, MyNotValidParamError
+from lib.storage_backends import CACHE_EVICT_INTERVAL, CachedBackend, LocalBackend, MemoryBackend
+
+CONTENIDO = bytes(range(256)) * 50
+
+
+class PruebasDeposito(ABC):
+    """Pruebas comunes para cada depósito, no es un TestCase para que no se recolecte sola"""
+
+    @abstractmethod
+    def crear_backend(self):
+        """Crear el depósito a probar"""
+
+    def setUp(self):
+        self.backend = self.crear_backend()
+
+    def test_escribir_y_leer(self):
+        """Lo que se escribe se lee igual y el URL tiene la forma de Google Cloud Storage"""
+        url = self.backend.write("deposito", "edictos/2024/05/archivo 1.pdf", CONTENIDO, "application/pdf")
+        self.assertEqual(url, "https://storage.googleapis.com/deposito/edictos/2024/05/archivo%201.pdf")
+        self.assertEqual(self.backend.read("deposito", "edictos/2024/05/archivo 1.pdf"), CONTENIDO)
+        self.assertTrue(self.backend.exists("deposito", "edictos/2024/05/archivo 1.pdf"))
+
+    def test_escribir_en_partes(self):
+        """Se puede escribir desde un objeto tipo archivo"""
+        self.backend.write_stream("deposito", "b.pdf", io.BytesIO(CONTENIDO), "application/pdf")
+        self.assertEqual(self.backend.read("deposito", "b.pdf"), CONTENIDO)
+
+    def test_partes(self):
+        """Las partes de un rango se leen completas y en orden"""
+        self.backend.write("deposito", "a.pdf", CONTENIDO, "application/pdf")
+        info = self.backend.get_info("deposito", "a.pdf")
+        self.assertEqual(info.size, len(CONTENIDO))
+        partes = list(self.backend.iter_chunks("deposito", info, 100, 5000, chunk_size=1024))
+        self.assertEqual(len(partes), 5)
+        self.assertEqual(b"".join(partes), CONTENIDO[100:5000])
+
+    def test_etag_cambia_al_reescribir(self):
+        """Al reescribir cambia el ETag"""
+        self.backend.write("deposito", "a.pdf", CONTENIDO, "application/pdf")
+        antes = self.backend.get_info("deposito", "a.pdf").etag
+        self.backend.write("deposito", "a.pdf", CONTENIDO[:10], "application/pdf")
+        self.assertNotEqual(self.backend.get_info("deposito", "a.pdf").etag, antes)
+
+    def test_no_existe(self):
+        """Si no existe causa MyFileNotFoundError"""
+        self.assertFalse(self.backend.exists("deposito", "no-existe.pdf"))
+        with self.assertRaises(MyFileNotFoundError):
+            self.backend.get_info("deposito", "no-existe.pdf")
+
+    def test_eliminar(self):
+        """Al eliminar deja de existir, eliminar lo que no existe no causa error"""
+        self.backend.write("deposito", "a.pdf", CONTENIDO, "application/pdf")
+        self.backend.delete("deposito", "a.pdf")
+        self.assertFalse(self.backend.exists("deposito", "a.pdf"))
+        self.backend.delete("deposito", "a.pdf")
+
+    def test_sin_firma(self):
+        """Si no puede firmar URL causa MyNotValidParamError"""
+        self.assertFalse(self.backend.can_sign)
+        with self.assertRaises(MyNotValidParamError):
+            self.backend.get_signed_url("deposito", "a.pdf", 60)
+
+
+class TestLocalBackend(PruebasDeposito, unittest.TestCase):
+    """Pruebas del depósito en el disco"""
+
+    def crear_backend(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        return LocalBackend(directorio.name)
+
+    def test_no_sale_del_directorio(self):
+        """No se permite salir del directorio con .."""
+        with self.assertRaises(MyNotValidParamError):
+            self.backend.write("deposito", "../../fuera.pdf", CONTENIDO, "application/pdf")
+
+
+class TestMemoryBackend(PruebasDeposito, unittest.TestCase):
+    """Pruebas del depósito en memoria"""
+
+    def crear_backend(self):
+        return MemoryBackend()
+
+
+class OrigenContado(MemoryBackend):
+    """Depósito en memoria que cuenta las lecturas"""
+
+    def __init__(self):
+        super().__init__()
+        self.lecturas = 0
+
+    def iter_chunks(self, bucket_name, info, start, stop, chunk_size=1024):
+        self.lecturas += 1
+        return super().iter_chunks(bucket_name, info, start, stop, chunk_size)
+
+
+class TestCachedBackend(unittest.TestCase):
+    """Pruebas del cache en el disco"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        self.origen = OrigenContado()
+        self.cache = CachedBackend(self.origen, directorio.name, max_bytes=4 * len(CONTENIDO))
+
+    def archivos(self):
+        """Archivos en el cache, sin los temporales"""
+        return [path for path in self.directorio.glob("*/*") if not path.name.startswith(".")]
+
+    def test_segunda_lectura_desde_el_disco(self):
+        """La primera lectura completa llena el cache, las siguientes no consultan al depósito"""
+        self.cache.write("deposito", "a.pdf", CONTENIDO, "application/pdf")
+        self.assertEqual(self.cache.read("deposito", "a.pdf"), CONTENIDO)
+        self.assertEqual(self.cache.read("deposito", "a.pdf"), CONTENIDO)
+        info = self.cache.get_info("deposito", "a.pdf")
+        self.assertEqual(b"".join(self.cache.iter_chunks("deposito", info, 10, 20)), CONTENIDO[10:20])
+        self.assertEqual(self.origen.lecturas, 1)
+        self.assertEqual(len(self.archivos()), 1)
+
+    def test_nueva_generacion(self):
+        """Al reemplazar el archivo cambia la llave y se lee el contenido nuevo"""
+        self.cache.write("deposito", "a.pdf", CONTENIDO, "application/pdf")
+        self.cache.read("deposito", "a.pdf")
+        self.cache.write("deposito", "a.pdf", CONTENIDO[:100], "application/pdf")
+        self.assertEqual(self.cache.read("deposito", "a.pdf"), CONTENIDO[:100])
+
+    def test_entrega_interrumpida_no_deja_archivos(self):
+        """Si se interrumpe la entrega no queda nada en el cache"""
+        self.cache.write("deposito", "a.pdf", CONTENIDO, "application/pdf")
+        info = self.cache.get_info("deposito", "a.pdf")
+        partes = self.cache.iter_chunks("deposito", info, 0, info.size)
+        next(partes)
+        partes.close()
+        self.assertEqual(list(self.directorio.glob("*/*")), [])
+
+    def test_desaloja_los_menos_usados(self):
+        """Al pasar del máximo se borran los menos usados"""
+        for numero in range(5):
+            self.cache.write("deposito", f"{numero}.pdf", CONTENIDO, "application/pdf")
+            antes = set(self.archivos())
+            self.cache.read("deposito", f"{numero}.pdf")
+            for path in set(self.archivos()) - antes:
+                os.utime(path, ns=(numero * 10**9, numero * 10**9))  # El último uso va en orden
+        self.assertLessEqual(sum(path.stat().st_size for path in self.archivos()), 4 * len(CONTENIDO))
+        self.assertEqual(self.origen.lecturas, 5)
+        self.cache.read("deposito", "4.pdf")  # El más reciente sigue en el cache
+        self.assertEqual(self.origen.lecturas, 5)
+        self.cache.read("deposito", "0.pdf")  # El más antiguo fue desalojado
+        self.assertEqual(self.origen.lecturas, 6)
+
+    def test_revisa_el_directorio_solo_al_pasar_del_maximo(self):
+        """No se revisa el directorio en cada archivo guardado, solo en el primero y al pasar del máximo"""
+        ahora = [1000.0]
+        revisiones = []
+        evict = self.cache.evict
+        with mock.patch.object(storage_backends.time, "monotonic", lambda: ahora[0]):
+            with mock.patch.object(self.cache, "evict", lambda: revisiones.append(1) or evict()):
+                for numero in range(4):
+                    self.cache.write("deposito", f"{numero}.pdf", CONTENIDO, "application/pdf")
+                    self.cache.read("deposito", f"{numero}.pdf")
+                self.assertEqual(len(revisiones), 1)
+                self.cache.write("deposito", "4.pdf", CONTENIDO, "application/pdf")
+                self.cache.read("deposito", "4.pdf")
+                self.assertEqual(len(revisiones), 2)
+                self.assertLessEqual(sum(path.stat().st_size for path in self.archivos()), 4 * len(CONTENIDO))
+                self.cache.write("deposito", "5.pdf", CONTENIDO[:10], "application/pdf")
+                self.cache.read("deposito", "5.pdf")
+                self.assertEqual(len(revisiones), 2)
+                ahora[0] += CACHE_EVICT_INTERVAL  # Otros workers pudieron llenarlo
+                self.cache.write("deposito", "6.pdf", CONTENIDO[:10], "application/pdf")
+                self.cache.read("deposito", "6.pdf")
+                self.assertEqual(len(revisiones), 3)
+
+    def test_metadatos_llenos_quita_el_mas_antiguo(self):
+        """Con los metadatos llenos se quita el más antiguo, no todos"""
+        for numero in range(3):
+            self.cache.write("deposito", f"{numero}.pdf", CONTENIDO[:10], "application/pdf")
+        with mock.patch.object(storage_backends, "CACHE_INFO_MAX", 2):
+            for numero in range(3):
+                self.cache.get_info("deposito", f"{numero}.pdf")
+        self.assertEqual(list(self.cache.infos), [("deposito", "1.pdf"), ("deposito", "2.pdf")])
+
+    def test_metadatos_con_hilos(self):
+        """Varios hilos consultan y olvidan metadatos a la vez sin errores"""
+        for numero in range(20):
+            self.cache.write("deposito", f"{numero}.pdf", CONTENIDO[:10], "application/pdf")
+        errores = []
+
+        def trabajar(inicio):
+            try:
+                for vuelta in range(200):
+                    nombre = f"{(inicio + vuelta) % 20}.pdf"
+                    self.cache.get_info("deposito", nombre)
+                    self.cache.forget_info("deposito", nombre)
+            except Exception as error:
+                errores.append(error)
+
+        with mock.patch.object(storage_backends, "CACHE_INFO_MAX", 8):
+            hilos = [threading.Thread(target=trabajar, args=(inicio,)) for inicio in range(8)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        self.assertEqual(errores, [])
+        self.assertLessEqual(len(self.cache.infos), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Prueba stream_file
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import os
+import unittest
+from datetime import datetime, timezone
+
+from flask import Flask
+
+from lib.stream_file import deliver_file_from_storage, stream_file_response
+
+CONTENIDO = bytes(range(256)) * 40
+ETAG = "CJ3a0aSk4YQDEAE="
+ACTUALIZADO = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+app = Flask(__name__)
+app.config.update(CLOUD_STORAGE_ENTREGA="FIRMADO", CLOUD_STORAGE_URL_FIRMADO_SEGUNDOS=60)
+
+
+@app.route("/archivo")
+def archivo():
+    """Entregar el contenido de prueba, registrando los rangos leídos"""
+    return stream_file_response(len(CONTENIDO), ETAG, ACTUALIZADO, "application/pdf", leer)
+
+
+@app.route("/firmado")
+def firmado():
+    """Entregar redirigiendo al URL del emulador"""
+    return deliver_file_from_storage("deposito", "edictos/2024/archivo 1.pdf", "application/pdf")
+
+
+lecturas = []
+
+
+def leer(start, stop):
+    """Leer en partes de 1000 bytes"""
+    lecturas.append((start, stop))
+    for posicion in range(start, stop, 1000):
+        yield CONTENIDO[posicion : min(posicion + 1000, stop)]
+
+
+class TestStreamFile(unittest.TestCase):
+    """Pruebas de la entrega de archivos en partes"""
+
+    def setUp(self):
+        lecturas.clear()
+        self.client = app.test_client()
+
+    def test_completo(self):
+        """Sin encabezados se entrega completo con ETag y Last-Modified"""
+        respuesta = self.client.get("/archivo")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data, CONTENIDO)
+        self.assertEqual(respuesta.headers["Accept-Ranges"], "bytes")
+        self.assertEqual(respuesta.headers["ETag"], f'"{ETAG}"')
+        self.assertEqual(respuesta.headers["Content-Length"], str(len(CONTENIDO)))
+
+    def test_rango(self):
+        """Con Range se entrega solo la parte solicitada"""
+        respuesta = self.client.get("/archivo", headers={"Range": "bytes=1500-2599"})
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta.data, CONTENIDO[1500:2600])
+        self.assertEqual(respuesta.headers["Content-Range"], f"bytes 1500-2599/{len(CONTENIDO)}")
+        self.assertEqual(lecturas, [(1500, 2600)])
+
+    def test_rango_no_satisfacible(self):
+        """Un rango fuera del archivo contesta 416"""
+        respuesta = self.client.get("/archivo", headers={"Range": f"bytes={len(CONTENIDO) + 10}-"})
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(lecturas, [])
+
+    def test_if_range_distinto(self):
+        """Si If-Range no coincide se entrega completo"""
+        respuesta = self.client.get("/archivo", headers={"Range": "bytes=0-9", "If-Range": '"otro"'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data), len(CONTENIDO))
+
+    def test_condicionales_sin_descargar(self):
+        """If-None-Match e If-Modified-Since contestan 304 sin leer el archivo"""
+        respuesta = self.client.get("/archivo", headers={"If-None-Match": f'"{ETAG}"'})
+        self.assertEqual(respuesta.status_code, 304)
+        respuesta = self.client.get("/archivo", headers={"If-Modified-Since": "Wed, 01 May 2024 12:30:15 GMT"})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(lecturas, [])
+
+    def test_firmado_con_emulador(self):
+        """En modo FIRMADO se redirige sin pasar los bytes por el worker, con el emulador no hay firma"""
+        os.environ["STORAGE_EMULATOR_HOST"] = "http://127.0.0.1:4443"
+        try:
+            respuesta = self.client.get("/firmado")
+        finally:
+            del os.environ["STORAGE_EMULATOR_HOST"]
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(
+            respuesta.headers["Location"],
+            "http://127.0.0.1:4443/download/storage/v1/b/deposito/o/edictos%2F2024%2Farchivo%201.pdf?alt=media",
+        )
+        self.assertIn("no-store", respuesta.headers["Cache-Control"])
+
+
+if __name__ == "__main__":
+    unittest.main()
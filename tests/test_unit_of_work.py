@@ -0,0 +1,95 @@
+"""
+Prueba unit_of_work
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Mapped, mapped_column
+
+from lib.unit_of_work import in_unit_of_work, unit_of_work
+from lib.universal_mixin import UniversalMixin
+from portal_notarias.extensions import database
+
+
+class Cosa(database.Model, UniversalMixin):
+    """Modelo solo para las pruebas"""
+
+    __tablename__ = "pruebas_unit_of_work"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    nombre: Mapped[str]
+
+
+class TestUnitOfWork(unittest.TestCase):
+    """Pruebas de las transacciones con un solo commit"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        database.init_app(app)
+        self.contexto = app.app_context()
+        self.contexto.push()
+        Cosa.__table__.create(database.engine)
+        self.commits = 0
+        event.listen(database.session(), "after_commit", self.contar_commit)
+
+    def tearDown(self):
+        database.session.remove()
+        self.contexto.pop()
+
+    def contar_commit(self, session):
+        """Contar los commits de la sesión"""
+        self.commits += 1
+
+    def test_save_sin_bloque_confirma(self):
+        """Sin bloque cada save() hace su commit"""
+        Cosa(nombre="A").save()
+        Cosa(nombre="B").save()
+        self.assertEqual(self.commits, 2)
+
+    def test_un_solo_commit(self):
+        """Dentro del bloque, varios save() y delete() confirman una sola vez al salir"""
+        with unit_of_work():
+            uno = Cosa(nombre="A").save()
+            Cosa(nombre="B").save()
+            database.session.flush()
+            self.assertIsNotNone(uno.id)
+            uno.delete()
+            self.assertTrue(in_unit_of_work())
+            self.assertEqual(self.commits, 0)
+        self.assertFalse(in_unit_of_work())
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(Cosa.query.filter_by(estatus="A").count(), 1)
+
+    def test_anidados(self):
+        """Solo el bloque exterior confirma"""
+        with unit_of_work():
+            with unit_of_work():
+                Cosa(nombre="A").save()
+            self.assertEqual(self.commits, 0)
+        self.assertEqual(self.commits, 1)
+
+    def test_excepcion_revierte(self):
+        """Si hay una excepción se revierte todo"""
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                Cosa(nombre="A").save()
+                database.session.flush()
+                raise ValueError("Falla")
+        self.assertFalse(in_unit_of_work())
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(Cosa.query.count(), 0)
+
+    def test_probar_revierte(self):
+        """Con commit=False se revierte al salir"""
+        with unit_of_work(commit=False):
+            Cosa(nombre="A").save()
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(Cosa.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
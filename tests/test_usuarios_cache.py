@@ -0,0 +1,200 @@
+"""
+Prueba usuarios cache
+    Para hacer la prueba ejecute el comando `pytest` en la raíz del proyecto
+"""
+
+import unittest
+
+from flask import Flask
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+
+from portal_notarias.blueprints.modulos.cache import modulos_referencia
+from portal_notarias.blueprints.usuarios.cache import (
+    PERMISOS_GENERACION_LLAVE,
+    cache_llave,
+    get_permisos,
+    get_usuario_sesion,
+)
+from portal_notarias.extensions import database
+from tests.modelos import Modulo, Permiso, Rol, Usuario, UsuarioRol
+
+TABLAS = [Modulo.__table__, Rol.__table__, Permiso.__table__, Usuario.__table__, UsuarioRol.__table__]
+
+
+class RedisEnMemoria:
+    """Lo mínimo de Redis que usan los caches de permisos y de sesiones"""
+
+    def __init__(self):
+        self.datos = {}
+        self.falla = False
+
+    def get(self, llave):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        return self.datos.get(llave)
+
+    def set(self, llave, valor, ex=None):
+        if self.falla:
+            raise RedisError("Sin conexión")
+        self.datos[llave] = valor
+
+    def delete(self, *llaves):
+        for llave in llaves:
+            self.datos.pop(llave, None)
+
+    def incr(self, llave):
+        self.datos[llave] = int(self.datos.get(llave, 0)) + 1
+
+
+class TestUsuariosCache(unittest.TestCase):
+    """Pruebas de los caches de permisos y de la instantánea del usuario"""
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.redis = RedisEnMemoria()
+        database.init_app(app)
+        self.redis = app.redis
+        self.contexto = app.app_context()
+        self.contexto.push()
+        database.metadata.create_all(database.engine, tables=TABLAS)
+        modulos_referencia.version = None  # Otra prueba pudo cargar otros módulos
+        edictos = Modulo(
+            nombre="EDICTOS", nombre_corto="Edictos", icono="x", ruta="/edictos", en_navegacion=True, en_portal_notarias=True
+        )
+        notarias = Rol(nombre="NOTARIAS")
+        database.session.add(Permiso(rol=notarias, modulo=edictos, nombre="NOTARIAS puede EDICTOS", nivel=Permiso.CREAR))
+        self.usuarios_ids = []
+        for numero in (1, 2):
+            usuario = Usuario(
+                autoridad_id=1,
+                email=f"notaria{numero}@pjecz.gob.mx",
+                nombres="NOTARIA",
+                apellido_paterno=str(numero),
+                apellido_materno="",
+                workspace="EXTERNO",
+            )
+            database.session.add(UsuarioRol(rol=notarias, usuario=usuario, descripcion="NOTARIAS"))
+            database.session.flush()
+            self.usuarios_ids.append(usuario.id)
+        database.session.commit()
+        self.rol_id = notarias.id
+        database.session.remove()
+        self.redis.datos.clear()  # Sin las generaciones y versiones que incrementaron las inserciones
+        self.consultas = 0
+        event.listen(database.engine, "before_cursor_execute", self.contar_consulta)
+
+    def tearDown(self):
+        event.remove(database.engine, "before_cursor_execute", self.contar_consulta)
+        modulos_referencia.version = None
+        database.session.remove()
+        self.contexto.pop()
+
+    def contar_consulta(self, *args):
+        """Contar las consultas a la base de datos"""
+        self.consultas += 1
+
+    def en_cache(self, prefijo: str, usuario_id: int) -> bool:
+        """¿Está la llave del usuario en Redis?"""
+        return cache_llave(prefijo, usuario_id) in self.redis.datos
+
+    def test_permisos_desde_redis(self):
+        """Los permisos se consultan una vez y después salen de Redis"""
+        usuario_id = self.usuarios_ids[0]
+        permisos = get_permisos(usuario_id)
+        self.assertEqual(permisos["permisos"], {"EDICTOS": Permiso.CREAR})
+        self.assertEqual([modulo["nombre"] for modulo in permisos["modulos_menu_principal"]], ["EDICTOS"])
+        self.assertTrue(self.en_cache("permisos", usuario_id))
+        self.consultas = 0
+        self.assertEqual(get_permisos(usuario_id), permisos)
+        self.assertEqual(self.consultas, 0)
+
+    def test_permisos_sin_redis(self):
+        """Si Redis no responde los permisos se consultan"""
+        self.redis.falla = True
+        self.assertEqual(get_permisos(self.usuarios_ids[1])["permisos"], {"EDICTOS": Permiso.CREAR})
+
+    def test_generacion_al_cambiar_un_rol(self):
+        """Al cambiar un rol se incrementa la generación y cambian las llaves de todos"""
+        usuario_id = self.usuarios_ids[0]
+        get_permisos(usuario_id)
+        llave = cache_llave("permisos", usuario_id)
+        database.session.get(Rol, self.rol_id).nombre = "NOTARIOS"
+        database.session.commit()
+        self.assertEqual(self.redis.datos[PERMISOS_GENERACION_LLAVE], 1)
+        self.assertNotEqual(cache_llave("permisos", usuario_id), llave)
+        self.assertFalse(self.en_cache("permisos", usuario_id))
+
+    def test_usuario_rol_invalida_solo_a_su_usuario(self):
+        """Al cambiar un usuario-rol se borran las llaves de ese usuario, no las de los demás"""
+        uno, dos = self.usuarios_ids
+        for usuario_id in self.usuarios_ids:
+            Usuario.load_user(usuario_id)
+        database.session.remove()
+        self.assertTrue(self.en_cache("permisos", uno) and self.en_cache("sesiones", uno))
+        usuario_rol = database.session.query(UsuarioRol).filter_by(usuario_id=uno).one()
+        usuario_rol.delete()
+        self.assertFalse(self.en_cache("permisos", uno))
+        self.assertFalse(self.en_cache("sesiones", uno))
+        self.assertTrue(self.en_cache("permisos", dos) and self.en_cache("sesiones", dos))
+        self.assertNotIn(PERMISOS_GENERACION_LLAVE, self.redis.datos)
+
+    def test_usuario_invalida_su_sesion(self):
+        """Al cambiar un usuario se borra su instantánea"""
+        usuario_id = self.usuarios_ids[0]
+        Usuario.load_user(usuario_id)
+        database.session.remove()
+        self.assertTrue(self.en_cache("sesiones", usuario_id))
+        database.session.get(Usuario, usuario_id).estatus = "B"
+        database.session.flush()
+        self.assertTrue(self.en_cache("sesiones", usuario_id))  # Hasta el commit
+        database.session.commit()
+        self.assertFalse(self.en_cache("sesiones", usuario_id))
+
+    def test_rollback_descarta(self):
+        """Si la transacción se revierte no se invalida, tampoco en el siguiente commit"""
+        usuario_id = self.usuarios_ids[0]
+        Usuario.load_user(usuario_id)
+        database.session.remove()
+        database.session.get(Usuario, usuario_id).estatus = "B"
+        database.session.flush()
+        database.session.rollback()
+        database.session.commit()
+        self.assertTrue(self.en_cache("sesiones", usuario_id))
+        self.assertTrue(self.en_cache("permisos", usuario_id))
+
+    def test_load_user_desde_la_instantanea(self):
+        """Con la instantánea el usuario se reconstruye como persistente sin consultar"""
+        usuario_id = self.usuarios_ids[0]
+        self.assertEqual(Usuario.load_user(str(usuario_id)).email, "notaria1@pjecz.gob.mx")
+        self.assertEqual(get_usuario_sesion(usuario_id)["email"], "notaria1@pjecz.gob.mx")
+        database.session.remove()
+        self.consultas = 0
+        usuario = Usuario.load_user(str(usuario_id))
+        self.assertEqual(self.consultas, 0)
+        self.assertTrue(inspect(usuario).persistent)
+        self.assertTrue(usuario.is_active)
+        self.assertTrue(usuario.can_insert("EDICTOS"))
+        self.assertFalse(usuario.can_admin("EDICTOS"))
+        self.assertEqual(self.consultas, 0)
+        self.assertIs(Usuario.load_user(usuario_id), usuario)  # Ya está en la sesión
+        self.assertEqual(usuario.apellido_paterno, "1")  # Las columnas faltantes se cargan al usarlas
+        self.assertEqual(self.consultas, 1)
+
+    def test_load_user_sin_redis(self):
+        """Si Redis no responde el usuario se consulta"""
+        self.redis.falla = True
+        usuario = Usuario.load_user(self.usuarios_ids[1])
+        self.assertEqual(usuario.email, "notaria2@pjecz.gob.mx")
+        self.assertTrue(usuario.can_view("EDICTOS"))
+
+    def test_load_user_no_valido(self):
+        """Un uid que no es número o que no existe entrega None"""
+        self.assertIsNone(Usuario.load_user("abc"))
+        self.assertIsNone(Usuario.load_user(None))
+        self.assertIsNone(Usuario.load_user(999))
+
+
+if __name__ == "__main__":
+    unittest.main()